@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Any
+from pydantic import TypeAdapter
 from app.models.schemas import (
-    Chat, ChatCreate, ChatUpdate, Message, MessageCreate,
+    Chat, ChatCreate, ChatSummary, ChatUpdate, Message, MessageCreate,
     Agent, AgentCreate, AgentUpdate, LLMResponse, CapsuleCreate, StakingCreate
 )
 from app.services.agent_service import AgentService
-from app.services.llm_service import LLMService
+from app.services.llm_service import get_llm_service
 from app.services.capsule_service import CapsuleService
 from app.services.wallet_service import WalletService
 from app.core.auth_dependencies import get_wallet_address
+from app.core.config import settings
 from datetime import datetime
 import logging
 import json
@@ -18,6 +20,20 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+_CHAT = TypeAdapter(Chat)
+_CHATS = TypeAdapter(List[Chat])
+_CHAT_SUMMARIES = TypeAdapter(List[ChatSummary])
+_MESSAGES = TypeAdapter(List[Message])
+
+
+def _trusted_json(adapter: TypeAdapter, content: Any, headers: Dict[str, str]) -> Response:
+    """
+    Serialize models hydrated from our own storage straight to JSON
+    (returning them would make FastAPI dump them to dicts and validate every
+    message again against response_model, which dominates long chats)
+    """
+    return Response(content=adapter.dump_json(content), media_type="application/json", headers=headers)
+
 
 @router.get("/", response_model=List[Agent])
 async def list_agents(wallet_address: Optional[str] = Depends(get_wallet_address)):
@@ -55,9 +71,23 @@ async def update_agent(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.get("/deletions/{job_id}")
+async def get_deletion_job(job_id: str, wallet_address: Optional[str] = Depends(get_wallet_address)):
+    """Progress of a background agent deletion"""
+    if not wallet_address:
+        raise HTTPException(status_code=401, detail="Wallet address required")
+    
+    job = await AgentService().get_deletion_job(job_id, wallet_address)
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
+
+
 @router.delete("/{agent_id}")
 async def delete_agent(
     agent_id: str, 
+    response: Response,
+    background: bool = Query(False, description="Return immediately with a job id and delete chats in the background"),
     wallet_address: Optional[str] = Depends(get_wallet_address)
 ):
     """Delete an agent/LLM configuration and all associated chats"""
@@ -67,6 +97,10 @@ async def delete_agent(
     service = AgentService()
     
     try:
+        if background:
+            job = await service.start_agent_deletion(agent_id, wallet_address)
+            response.status_code = 202
+            return {"success": True, "message": "Agent deletion started", "job_id": job["job_id"], "job": job}
         await service.delete_agent(agent_id, wallet_address)
         return {"success": True, "message": "Agent deleted successfully"}
     except Exception as e:
@@ -75,10 +109,42 @@ async def delete_agent(
 
 
 @router.get("/{agent_id}/chats", response_model=List[Chat])
-async def list_chats(agent_id: str, wallet_address: Optional[str] = Depends(get_wallet_address)):
-    """List all chats for an agent"""
+async def list_chats(
+    agent_id: str,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size (omit for all chats)"),
+    wallet_address: Optional[str] = Depends(get_wallet_address)
+):
+    """
+    List chats for an agent, most recently active first
+    When more chats remain, the cursor for the next page is returned in the X-Next-Cursor header
+    """
     service = AgentService()
-    return await service.get_agent_chats(agent_id, wallet_address)
+    try:
+        chats, next_cursor = await service.get_agent_chats_page(agent_id, wallet_address, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _trusted_json(_CHATS, chats, {"X-Next-Cursor": next_cursor} if next_cursor else {})
+
+
+@router.get("/{agent_id}/chats/summaries", response_model=List[ChatSummary])
+async def list_chat_summaries(
+    agent_id: str,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size (omit for all chats)"),
+    wallet_address: Optional[str] = Depends(get_wallet_address)
+):
+    """
+    List chat metadata (name, last message, message count, timestamp) for an agent,
+    most recently active first, without reading any messages - for chat sidebars
+    Pagination works as in GET /{agent_id}/chats
+    """
+    service = AgentService()
+    try:
+        chats, next_cursor = await service.get_agent_chats_page(agent_id, wallet_address, cursor, limit, summary=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _trusted_json(_CHAT_SUMMARIES, chats, {"X-Next-Cursor": next_cursor} if next_cursor else {})
 
 
 @router.post("/{agent_id}/chats", response_model=Chat)
@@ -98,13 +164,26 @@ async def create_chat(agent_id: str, chat: ChatCreate, wallet_address: Optional[
 
 
 @router.get("/{agent_id}/chats/{chat_id}", response_model=Chat)
-async def get_chat(agent_id: str, chat_id: str, wallet_address: Optional[str] = Depends(get_wallet_address)):
-    """Get a specific chat with messages"""
+async def get_chat(
+    agent_id: str,
+    chat_id: str,
+    limit: Optional[int] = Query(None, ge=0, le=500, description="Recent messages to include (default MESSAGE_PAGE_SIZE)"),
+    wallet_address: Optional[str] = Depends(get_wallet_address)
+):
+    """
+    Get a specific chat with its most recent messages
+    When older messages exist, X-Prev-Cursor holds the `before` value for GET .../messages
+    """
     service = AgentService()
-    chat = await service.get_chat(chat_id, wallet_address)
+    chat = await service.get_chat(
+        chat_id, wallet_address, message_limit=settings.MESSAGE_PAGE_SIZE if limit is None else limit
+    )
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return chat
+    headers = {}
+    if chat.messages and chat.messages[0].seq:
+        headers["X-Prev-Cursor"] = str(chat.messages[0].seq)
+    return _trusted_json(_CHAT, chat, headers)
 
 
 @router.put("/{agent_id}/chats/{chat_id}", response_model=Chat)
@@ -131,11 +210,11 @@ async def send_message(
         raise HTTPException(status_code=401, detail="Wallet address required")
     
     service = AgentService()
-    llm_service = LLMService()
+    llm_service = get_llm_service()
     
-    # Get chat history
+    # Get recent chat history (older turns are covered by the chat's rolling summary)
     # logger.debug(f"Looking up chat {chat_id} for wallet {wallet_address}")
-    chat = await service.get_chat(chat_id, wallet_address)
+    chat = await service.get_chat(chat_id, wallet_address, message_limit=settings.CONTEXT_HISTORY_MESSAGES)
     if not chat:
         # logger.warning(f"Chat {chat_id} not found for wallet {wallet_address}")
         raise HTTPException(status_code=404, detail=f"Chat not found (chat_id: {chat_id}, wallet: {wallet_address})")
@@ -152,10 +231,12 @@ async def send_message(
         raise HTTPException(status_code=404, detail=f"Agent not found (agent_id: {actual_agent_id})")
     
     # Save user message first
-    user_msg = await service.add_message(chat_id, message, wallet_address)
+    user_msg = await service.add_message(chat_id, message, wallet_address, tier=chat.tier)
     
     # Get LLM response with memory integration
-    messages_history = [{"role": m.role.value, "content": m.content} for m in chat.messages]
+    messages_history = [
+        {"role": m.role.value, "content": m.content, "seq": m.seq, "tokens": m.tokens} for m in chat.messages
+    ]
     messages_history.append({"role": message.role.value, "content": message.content})
     
     try:
@@ -175,12 +256,16 @@ async def send_message(
             chat_id=chat_id,  # Pass chat_id for memory retrieval
             memory_size=memory_size,  # Pass memory_size setting
             capsule_id=capsule_id,  # Pass capsule_id for memory scope isolation
-            web_search_enabled=web_search_enabled  # Pass web_search_enabled flag
+            web_search_enabled=web_search_enabled,  # Pass web_search_enabled flag
+            summary=chat.summary,  # Rolling summary of turns outside the context window
+            summary_seq=chat.summary_seq,
+            on_summary=lambda summary, seq: service.update_chat_summary(chat_id, wallet_address, summary, seq),
+            load_history=lambda after, before: service.get_history_range(chat_id, wallet_address, after, before)
         )
         
         # Save assistant message
         assistant_msg = MessageCreate(role="assistant", content=response.content)
-        await service.add_message(chat_id, assistant_msg, wallet_address)
+        await service.add_message(chat_id, assistant_msg, wallet_address, tier=chat.tier)
         
         return response
     except Exception as e:
@@ -201,11 +286,11 @@ async def send_message_stream(
         raise HTTPException(status_code=401, detail="Wallet address required")
     
     service = AgentService()
-    llm_service = LLMService()
+    llm_service = get_llm_service()
     
-    # Get chat history
+    # Get recent chat history (older turns are covered by the chat's rolling summary)
     # logger.debug(f"Looking up chat {chat_id} for wallet {wallet_address}")
-    chat = await service.get_chat(chat_id, wallet_address)
+    chat = await service.get_chat(chat_id, wallet_address, message_limit=settings.CONTEXT_HISTORY_MESSAGES)
     if not chat:
         # logger.warning(f"Chat {chat_id} not found for wallet {wallet_address}")
         raise HTTPException(status_code=404, detail=f"Chat not found (chat_id: {chat_id}, wallet: {wallet_address})")
@@ -221,10 +306,12 @@ async def send_message_stream(
         raise HTTPException(status_code=404, detail=f"Agent not found (agent_id: {actual_agent_id})")
     
     # Save user message first
-    user_msg = await service.add_message(chat_id, message, wallet_address)
+    user_msg = await service.add_message(chat_id, message, wallet_address, tier=chat.tier)
     
     # Get LLM response with memory integration
-    messages_history = [{"role": m.role.value, "content": m.content} for m in chat.messages]
+    messages_history = [
+        {"role": m.role.value, "content": m.content, "seq": m.seq, "tokens": m.tokens} for m in chat.messages
+    ]
     messages_history.append({"role": message.role.value, "content": message.content})
     
     # Get memory_size and capsule_id from chat
@@ -242,7 +329,11 @@ async def send_message_stream(
                 chat_id=chat_id,
                 memory_size=memory_size,
                 capsule_id=capsule_id,
-                web_search_enabled=web_search_enabled
+                web_search_enabled=web_search_enabled,
+                summary=chat.summary,
+                summary_seq=chat.summary_seq,
+                on_summary=lambda summary, seq: service.update_chat_summary(chat_id, wallet_address, summary, seq),
+                load_history=lambda after, before: service.get_history_range(chat_id, wallet_address, after, before)
             ):
                 full_content += chunk
                 # Send chunk as SSE
@@ -251,7 +342,7 @@ async def send_message_stream(
             # Save assistant message after streaming completes
             if full_content:
                 assistant_msg = MessageCreate(role="assistant", content=full_content)
-                await service.add_message(chat_id, assistant_msg, wallet_address)
+                await service.add_message(chat_id, assistant_msg, wallet_address, tier=chat.tier)
             
             # Send completion signal
             yield f"data: {json.dumps({'done': True})}\n\n"
@@ -274,14 +365,28 @@ async def send_message_stream(
 async def get_messages(
     agent_id: str,
     chat_id: str,
+    before: Optional[int] = Query(None, ge=0, description="Only messages older than this seq (X-Prev-Cursor)"),
+    after: Optional[int] = Query(None, ge=-1, description="Only messages newer than this seq (X-Next-Cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (default MESSAGE_PAGE_SIZE)"),
     wallet_address: Optional[str] = Depends(get_wallet_address)
 ):
-    """Get all messages for a chat"""
+    """
+    Get one page of a chat's messages, oldest first (the most recent page by default)
+    X-Prev-Cursor / X-Next-Cursor hold the `before` / `after` values for the adjacent pages
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
     service = AgentService()
-    chat = await service.get_chat(chat_id, wallet_address)
-    if not chat:
+    page = await service.get_messages_page(chat_id, wallet_address, before, after, limit)
+    if page is None:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return chat.messages
+    messages, older, newer = page
+    headers = {}
+    if older is not None:
+        headers["X-Prev-Cursor"] = str(older)
+    if newer is not None:
+        headers["X-Next-Cursor"] = str(newer)
+    return _trusted_json(_MESSAGES, messages, headers)
 
 
 @router.get("/{agent_id}/chats/{chat_id}/memories")
@@ -295,10 +400,10 @@ async def get_chat_memories(
         raise HTTPException(status_code=401, detail="Wallet address required")
     
     service = AgentService()
-    llm_service = LLMService()
+    llm_service = get_llm_service()
     
     # Verify chat exists and belongs to user
-    chat = await service.get_chat(chat_id, wallet_address)
+    chat = await service.get_chat(chat_id, wallet_address, message_limit=0)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
@@ -0,0 +1,28 @@
+"""
+API endpoints for cache observability
+"""
+from fastapi import APIRouter, Depends
+from app.core.auth_dependencies import require_admin_token
+from app.services.cache_service import cache_service
+from app.services.spill_store import local_store
+from app.services.tiered_repository import repository_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", dependencies=[Depends(require_admin_token)])
+async def get_cache_metrics():
+    """Cache, local store and storage tier stats (per-key-family counters need CACHE_METRICS_ENABLED=true)"""
+    return {
+        **cache_service.metrics_snapshot(),
+        "local_store": local_store.stats(),
+        "repositories": repository_metrics.snapshot(),
+    }
+
+
+@router.delete("/metrics", dependencies=[Depends(require_admin_token)])
+async def reset_cache_metrics():
+    """Reset the per-key-family and per-tier counters"""
+    cache_service.reset_metrics()
+    repository_metrics.reset()
+    return {"message": "Cache metrics reset"}
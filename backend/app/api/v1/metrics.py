@@ -0,0 +1,39 @@
+"""
+API endpoints for LLM request path observability
+"""
+from fastapi import APIRouter, Depends
+from app.core.auth_dependencies import require_admin_token
+from app.services.completion_cache import completion_cache
+from app.services.http_clients import provider_clients
+from app.services.llm_service import created_llm_service
+from app.services.memory_ingestion import memory_ingestion
+from app.services.pregeneration import pregeneration
+
+router = APIRouter()
+
+
+@router.get("", dependencies=[Depends(require_admin_token)])
+async def get_metrics():
+    """LLM provider client, context, retrieval, completion cache and memory ingestion stats"""
+    # No LLMService (or memory client) is built just to report metrics
+    llm_service = created_llm_service()
+    return {
+        "llm_http": provider_clients.stats(),
+        "llm_context": llm_service.context_builder.stats() if llm_service else {},
+        "llm_retrieval": pregeneration.stats(),
+        "completion_cache": completion_cache.stats(),
+        "memory_ingestion": memory_ingestion.stats(),
+    }
+
+
+@router.delete("", dependencies=[Depends(require_admin_token)])
+async def reset_metrics():
+    """Reset the LLM request path counters"""
+    provider_clients.reset_stats()
+    llm_service = created_llm_service()
+    if llm_service:
+        llm_service.context_builder.reset_stats()
+    pregeneration.reset_stats()
+    completion_cache.reset_stats()
+    memory_ingestion.reset_stats()
+    return {"message": "Metrics reset"}
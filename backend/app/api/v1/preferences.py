@@ -26,7 +26,7 @@ async def get_preferences(wallet_address: Optional[str] = Depends(get_wallet_add
     if not wallet_address:
         raise HTTPException(status_code=401, detail="Wallet address required")
     
-    preferences = cache_service.get_user_preferences(wallet_address)
+    preferences = await cache_service.get_user_preferences(wallet_address)
     return UserPreferences(**preferences)
 
 
@@ -43,11 +43,11 @@ async def update_preferences(
         raise HTTPException(status_code=401, detail="Wallet address required")
     
     # Get existing preferences and merge
-    existing = cache_service.get_user_preferences(wallet_address)
+    existing = await cache_service.get_user_preferences(wallet_address)
     updated = {**existing, **preferences.model_dump(exclude_none=True)}
     
     # Save to cache (30 days TTL)
-    cache_service.set_user_preferences(wallet_address, updated)
+    await cache_service.set_user_preferences(wallet_address, updated)
     
     return UserPreferences(**updated)
 
@@ -62,7 +62,7 @@ async def clear_preferences(wallet_address: Optional[str] = Depends(get_wallet_a
         raise HTTPException(status_code=401, detail="Wallet address required")
     
     key = f"user:preferences:{wallet_address}"
-    cache_service.delete(key)
+    await cache_service.adelete(key)
     
     return {"message": "Preferences cleared"}
 
@@ -1,8 +1,11 @@
 """
 FastAPI dependency functions for authentication
 """
-from fastapi import Header
+from fastapi import Header, HTTPException
 from typing import Optional
+import hmac
+
+from app.core.config import settings
 
 
 def get_wallet_address(x_wallet_address: Optional[str] = Header(None)) -> Optional[str]:
@@ -17,3 +20,19 @@ def get_wallet_address(x_wallet_address: Optional[str] = Header(None)) -> Option
     """
     return x_wallet_address
 
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    FastAPI dependency guarding operator routes (metrics) with METRICS_ADMIN_TOKEN.
+    
+    Args:
+        x_admin_token: Token from X-Admin-Token header
+        
+    Raises:
+        HTTPException: 404 if no token is configured (routes disabled), 403 if
+            the header is missing or doesn't match
+    """
+    if not settings.METRICS_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.METRICS_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
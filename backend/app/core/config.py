@@ -96,12 +96,80 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str = os.getenv("VITE_SUPABASE_PUBLISHABLE_DEFAULT_KEY", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
     
+    # Storage backend: "supabase" or "sqlite" (local file, for single-node deployments)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "solmind.db")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    
     # LLM API Keys
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
+    OPENROUTER_BASE_URL: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+    # Pooled keep-alive connections to LLM providers (HTTP/2 when the h2 package is installed)
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+    LLM_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+    LLM_READ_TIMEOUT_SECONDS: float = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "60"))
     
+    # Conversation context per turn: input token budget (per-model overrides as
+    # "model=tokens,prefix/*=tokens"), recent messages loaded, rolling summary of older turns
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+    CONTEXT_MODEL_BUDGETS: str = os.getenv("CONTEXT_MODEL_BUDGETS", "")
+    CONTEXT_HISTORY_MESSAGES: int = int(os.getenv("CONTEXT_HISTORY_MESSAGES", "200"))
+    CONTEXT_SUMMARY_ENABLED: bool = os.getenv("CONTEXT_SUMMARY_ENABLED", "true").lower() == "true"
+    CONTEXT_SUMMARY_MIN_TOKENS: int = int(os.getenv("CONTEXT_SUMMARY_MIN_TOKENS", "400"))
+    CONTEXT_SUMMARY_MAX_WORDS: int = int(os.getenv("CONTEXT_SUMMARY_MAX_WORDS", "200"))
+
+    # Memory / web search retrieval before each completion: run concurrently on a
+    # bounded thread pool, each with its own timeout (a timed out stage adds no context)
+    RETRIEVAL_MAX_WORKERS: int = int(os.getenv("RETRIEVAL_MAX_WORKERS", "16"))
+    MEMORY_RETRIEVAL_TIMEOUT_SECONDS: float = float(os.getenv("MEMORY_RETRIEVAL_TIMEOUT_SECONDS", "3"))
+    WEB_SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "8"))
+
+    # Completion cache for agents with completion_cache on: exact prompt matches, plus
+    # optionally near-identical questions by embedding similarity (semantic tier)
+    COMPLETION_CACHE_ENABLED: bool = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+    COMPLETION_CACHE_TTL_SECONDS: int = int(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "3600"))
+    COMPLETION_CACHE_SEMANTIC: bool = os.getenv("COMPLETION_CACHE_SEMANTIC", "false").lower() == "true"
+    COMPLETION_CACHE_SIMILARITY_THRESHOLD: float = float(os.getenv("COMPLETION_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+    COMPLETION_CACHE_EMBEDDING_MODEL: str = os.getenv("COMPLETION_CACHE_EMBEDDING_MODEL", "openai/text-embedding-3-small")
+    COMPLETION_CACHE_EMBEDDING_DIMENSIONS: int = int(os.getenv("COMPLETION_CACHE_EMBEDDING_DIMENSIONS", "256"))
+    COMPLETION_CACHE_EMBEDDING_TIMEOUT_SECONDS: float = float(os.getenv("COMPLETION_CACHE_EMBEDDING_TIMEOUT_SECONDS", "2"))
+    COMPLETION_CACHE_SEMANTIC_MAX_SCOPES: int = int(os.getenv("COMPLETION_CACHE_SEMANTIC_MAX_SCOPES", "1024"))
+
     # Mem0 Platform API Key (for hosted memory service)
     MEM0_API_KEY: str = os.getenv("MEM0_API_KEY", "")
     
+    # Background memory storage after each response: bounded queue (a full queue makes
+    # the request wait up to the enqueue timeout, then drops the turn), retries, shutdown drain
+    MEMORY_INGESTION_ENABLED: bool = os.getenv("MEMORY_INGESTION_ENABLED", "true").lower() == "true"
+    MEMORY_INGESTION_QUEUE_SIZE: int = int(os.getenv("MEMORY_INGESTION_QUEUE_SIZE", "1000"))
+    MEMORY_INGESTION_WORKERS: int = int(os.getenv("MEMORY_INGESTION_WORKERS", "2"))
+    MEMORY_INGESTION_MAX_ATTEMPTS: int = int(os.getenv("MEMORY_INGESTION_MAX_ATTEMPTS", "4"))
+    MEMORY_INGESTION_ENQUEUE_TIMEOUT_SECONDS: float = float(os.getenv("MEMORY_INGESTION_ENQUEUE_TIMEOUT_SECONDS", "0.5"))
+    MEMORY_INGESTION_SHUTDOWN_TIMEOUT_SECONDS: float = float(os.getenv("MEMORY_INGESTION_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+    
+    # Read-through caching of Supabase capsule/marketplace queries (seconds)
+    CAPSULE_CACHE_TTL_SECONDS: int = int(os.getenv("CAPSULE_CACHE_TTL_SECONDS", "60"))
+    MARKETPLACE_CACHE_TTL_SECONDS: int = int(os.getenv("MARKETPLACE_CACHE_TTL_SECONDS", "30"))
+    
+    # Token for the metrics routes (X-Admin-Token header); unset = the routes are disabled
+    METRICS_ADMIN_TOKEN: str = os.getenv("METRICS_ADMIN_TOKEN", "")
+    
+    # Messages returned per page when a chat is opened (older ones load with ?before=)
+    MESSAGE_PAGE_SIZE: int = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+    
+    # In-process cache of agent configs (with API keys) for the send-message path (0 = off)
+    AGENT_CONFIG_CACHE_TTL_SECONDS: int = int(os.getenv("AGENT_CONFIG_CACHE_TTL_SECONDS", "30"))
+    AGENT_CONFIG_CACHE_MAX_ENTRIES: int = int(os.getenv("AGENT_CONFIG_CACHE_MAX_ENTRIES", "1024"))
+    
+    # Chat deletion: concurrent memory deletes, chats per Supabase/Redis batch, background job retention
+    DELETE_CONCURRENCY: int = int(os.getenv("DELETE_CONCURRENCY", "8"))
+    DELETE_BATCH_SIZE: int = int(os.getenv("DELETE_BATCH_SIZE", "200"))
+    DELETION_JOB_TTL_SECONDS: int = int(os.getenv("DELETION_JOB_TTL_SECONDS", "3600"))
+    
     # Solana
     SOLANA_RPC_URL: str = os.getenv("SOLANA_RPC_URL", "https://api.devnet.solana.com")
     SOLANA_NETWORK: str = os.getenv("SOLANA_NETWORK", "devnet")
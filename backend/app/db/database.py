@@ -1,16 +1,23 @@
 from supabase import create_client, Client
 from app.core.config import settings
-from typing import Optional
+from app.db.sqlite_store import SQLiteStore
+from typing import Optional, Union
 
 _supabase: Optional[Client] = None
+_sqlite: Optional[SQLiteStore] = None
 
 
-def get_supabase() -> Optional[Client]:
+def get_supabase() -> Optional[Union[Client, SQLiteStore]]:
     """
     Get Supabase client. Returns None if Supabase is not configured or invalid.
     This allows the app to run with in-memory storage for development.
     Uses service role key if available, otherwise falls back to anon key.
+    With STORAGE_BACKEND=sqlite, returns the local SQLite store instead
+    (same query interface).
     """
+    if settings.STORAGE_BACKEND == "sqlite":
+        return get_local_db()
+    
     global _supabase
     if _supabase is None:
         if not settings.SUPABASE_URL:
@@ -56,6 +63,26 @@ def get_supabase() -> Optional[Client]:
     return _supabase
 
 
+def get_local_db() -> Optional[SQLiteStore]:
+    """The SQLite store when STORAGE_BACKEND=sqlite (None otherwise, or if the file can't be opened)"""
+    global _sqlite
+    if _sqlite is None and settings.STORAGE_BACKEND == "sqlite":
+        try:
+            _sqlite = SQLiteStore(settings.SQLITE_PATH, settings.SQLITE_BUSY_TIMEOUT_MS)
+        except Exception as e:
+            print(f"⚠️  SQLite storage unavailable ({settings.SQLITE_PATH}): {e}")
+            return None
+    return _sqlite
+
+
+def is_no_rows_error(error: Exception) -> bool:
+    """
+    True if a Supabase error just means `.single()` matched no rows
+    (PostgREST code PGRST116), as opposed to a failed query
+    """
+    return getattr(error, "code", None) == "PGRST116" or "PGRST116" in str(error)
+
+
 async def init_db():
     """Initialize database connection and create tables if needed"""
     supabase = get_supabase()
@@ -76,7 +103,10 @@ async def init_db():
         # Test connection by checking if agents table exists
         supabase.table("agents").select("id").limit(1).execute()
         # print("✅ Database connection established")
-        print("✅ Supabase connected")
+        if isinstance(supabase, SQLiteStore):
+            print(f"✅ SQLite storage at {supabase.path}")
+        else:
+            print("✅ Supabase connected")
     except Exception as e:
         # print("=" * 60)
         # print("⚠️  WARNING: Supabase connection test failed!")
@@ -0,0 +1,567 @@
+"""
+Embedded SQLite storage backend for single-node deployments
+
+Selected with STORAGE_BACKEND=sqlite: get_supabase() then returns a
+SQLiteStore instead of a Supabase client, so agents, capsules, staking and
+earnings persist in a local file with no external services. SQLiteStore
+answers the subset of the Supabase query builder the services use
+(select/insert/update/delete with eq, neq, gt(e), lt(e), in_, ilike, or_,
+order, limit, range and single, plus the write_behind_increment rpc),
+returning the same response shape and the same PGRST116 error for
+`.single()` misses.
+
+When Redis isn't available either, AgentService also keeps chats and
+messages here (see append_message / message_page) instead of in per-worker
+memory.
+
+- WAL mode: readers never block the writer, and every uvicorn worker on the
+  host opens the same file, so they share one consistent store
+- Queries are parameterized and built in a fixed shape per call site, so
+  sqlite3's per-connection statement cache reuses the prepared statements
+- Tables and indexes mirror supabase/migrations; messages also carry a
+  per-chat seq column used for cursor pagination. Foreign keys are left out
+  because journaled writes (see write_behind) reach the database per entity,
+  not in cross-table order
+
+Settings:
+    STORAGE_BACKEND: supabase (default) or sqlite
+    SQLITE_PATH: database file (default solmind.db)
+    SQLITE_BUSY_TIMEOUT_MS: how long a writer waits for another worker's lock (default 5000)
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple
+import json
+import os
+import re
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  display_name TEXT NOT NULL,
+  platform TEXT NOT NULL,
+  api_key_configured BOOLEAN DEFAULT 0,
+  model TEXT,
+  user_wallet TEXT,
+  api_key TEXT,
+  completion_cache BOOLEAN DEFAULT 0,
+  created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_agents_user_wallet ON agents(user_wallet);
+
+CREATE TABLE IF NOT EXISTS chats (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  memory_size TEXT NOT NULL,
+  last_message TEXT,
+  timestamp TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  message_count INTEGER DEFAULT 0,
+  agent_id TEXT,
+  capsule_id TEXT,
+  user_wallet TEXT,
+  web_search_enabled BOOLEAN DEFAULT 0,
+  summary TEXT,
+  summary_seq INTEGER,
+  last_activity TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_chats_agent_wallet ON chats(agent_id, user_wallet, timestamp DESC);
+
+CREATE TABLE IF NOT EXISTS messages (
+  id TEXT PRIMARY KEY,
+  chat_id TEXT NOT NULL,
+  seq INTEGER NOT NULL,
+  role TEXT NOT NULL,
+  content TEXT NOT NULL,
+  tokens INTEGER,
+  timestamp TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_chat_seq ON messages(chat_id, seq);
+
+CREATE TABLE IF NOT EXISTS capsules (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  description TEXT,
+  category TEXT,
+  creator_wallet TEXT NOT NULL,
+  price_per_query NUMERIC DEFAULT 0,
+  stake_amount NUMERIC DEFAULT 0,
+  reputation NUMERIC DEFAULT 0,
+  query_count INTEGER DEFAULT 0,
+  rating NUMERIC DEFAULT 0,
+  created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+  metadata JSONB
+);
+CREATE INDEX IF NOT EXISTS idx_capsules_creator_wallet ON capsules(creator_wallet);
+CREATE INDEX IF NOT EXISTS idx_capsules_category ON capsules(category);
+CREATE INDEX IF NOT EXISTS idx_capsules_query_count ON capsules(query_count DESC);
+
+CREATE TABLE IF NOT EXISTS staking (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  capsule_id TEXT NOT NULL,
+  wallet_address TEXT NOT NULL,
+  stake_amount NUMERIC NOT NULL,
+  staked_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_staking_capsule_id ON staking(capsule_id);
+CREATE INDEX IF NOT EXISTS idx_staking_wallet_address ON staking(wallet_address);
+
+CREATE TABLE IF NOT EXISTS earnings (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  wallet_address TEXT NOT NULL,
+  capsule_id TEXT,
+  amount NUMERIC NOT NULL,
+  created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_earnings_wallet_address ON earnings(wallet_address);
+CREATE INDEX IF NOT EXISTS idx_earnings_capsule_id ON earnings(capsule_id);
+
+CREATE TABLE IF NOT EXISTS write_behind_ops (
+  op_id TEXT PRIMARY KEY,
+  applied_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+"""
+
+# Columns added after a table was first created: (table, column, definition),
+# added to existing database files on open
+ADDED_COLUMNS = [
+    ("agents", "completion_cache", "BOOLEAN DEFAULT 0"),
+    ("chats", "summary", "TEXT"),
+    ("chats", "summary_seq", "INTEGER"),
+    ("messages", "tokens", "INTEGER"),
+    ("chats", "last_activity", "TIMESTAMP"),
+]
+
+# PostgREST filter operators accepted inside or_() strings
+_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "ilike": "LIKE"}
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class SQLiteError(Exception):
+    """Query error shaped like postgrest's APIError (code + message)"""
+
+    def __init__(self, message: str, code: str = "SQLITE"):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class SQLiteResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class SQLiteQuery:
+    """One table query, built like the Supabase/postgrest builder and run by execute()"""
+
+    def __init__(self, store: "SQLiteStore", table: str):
+        if table not in store.columns:
+            raise SQLiteError(f"relation \"{table}\" does not exist", "42P01")
+        self._store = store
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._payload: Any = None
+        self._where: List[str] = []
+        self._params: List[Any] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+        self._single = False
+
+    # Actions
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "SQLiteQuery":
+        self._action = "select"
+        if columns.strip() != "*":
+            self._columns = ", ".join(self._column(name.strip()) for name in columns.split(","))
+        return self
+
+    def insert(self, rows: Any) -> "SQLiteQuery":
+        self._action = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values: dict) -> "SQLiteQuery":
+        self._action = "update"
+        self._payload = values
+        return self
+
+    def delete(self) -> "SQLiteQuery":
+        self._action = "delete"
+        return self
+
+    # Filters
+
+    def eq(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "=", value)
+
+    def neq(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "!=", value)
+
+    def gt(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, ">", value)
+
+    def gte(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, ">=", value)
+
+    def lt(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "<", value)
+
+    def lte(self, column: str, value: Any) -> "SQLiteQuery":
+        return self._filter(column, "<=", value)
+
+    def ilike(self, column: str, pattern: str) -> "SQLiteQuery":
+        # SQLite's LIKE is already case-insensitive for ASCII
+        return self._filter(column, "LIKE", pattern.replace("*", "%"))
+
+    def in_(self, column: str, values: List[Any]) -> "SQLiteQuery":
+        values = list(values)
+        if not values:
+            self._where.append("0")
+            return self
+        self._where.append(f"{self._column(column)} IN ({', '.join('?' * len(values))})")
+        self._params.extend(self._store.encode(value) for value in values)
+        return self
+
+    def or_(self, filters: str) -> "SQLiteQuery":
+        """PostgREST or syntax: 'name.ilike.%sol%,description.ilike.%sol%'"""
+        clauses = []
+        for condition in filters.split(","):
+            parts = condition.split(".", 2)
+            if len(parts) != 3 or parts[1] not in _OPERATORS:
+                raise SQLiteError(f"unsupported or_ filter '{condition}'", "PGRST100")
+            column, operator, value = parts
+            if operator == "ilike":
+                value = value.replace("*", "%")
+            clauses.append(f"{self._column(column)} {_OPERATORS[operator]} ?")
+            self._params.append(value)
+        self._where.append(f"({' OR '.join(clauses)})")
+        return self
+
+    # Modifiers
+
+    def order(self, column: str, desc: bool = False) -> "SQLiteQuery":
+        self._order.append(f"{self._column(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count: int) -> "SQLiteQuery":
+        self._limit = int(count)
+        return self
+
+    def range(self, start: int, end: int) -> "SQLiteQuery":
+        """Rows start..end inclusive, like postgrest"""
+        self._offset = int(start)
+        self._limit = max(0, int(end) - int(start) + 1)
+        return self
+
+    def single(self) -> "SQLiteQuery":
+        self._single = True
+        return self
+
+    # Execution
+
+    def execute(self) -> SQLiteResponse:
+        if self._action == "insert":
+            rows = self._store.run_many(self._insert_statements(), self._table)
+        else:
+            sql, params = self._statement()
+            rows = self._store.run(sql, params, self._table)
+        if not self._single:
+            return SQLiteResponse(rows)
+        if len(rows) != 1:
+            raise SQLiteError(
+                f"JSON object requested, multiple (or no) rows returned ({len(rows)} rows)", "PGRST116"
+            )
+        return SQLiteResponse(rows[0])
+
+    def _statement(self) -> Tuple[str, List[Any]]:
+        where = f" WHERE {' AND '.join(self._where)}" if self._where else ""
+        params = list(self._params)
+        if self._action == "select":
+            sql = f"SELECT {self._columns} FROM {self._table}{where}"
+            if self._order:
+                sql += f" ORDER BY {', '.join(self._order)}"
+            if self._single and self._limit is None:
+                sql += " LIMIT 2"  # Enough to tell one row from many
+            elif self._limit is not None:
+                sql += " LIMIT ?"
+                params.append(self._limit)
+                if self._offset:
+                    sql += " OFFSET ?"
+                    params.append(self._offset)
+            return sql, params
+        if self._action == "update":
+            assignments = [f"{self._column(column)} = ?" for column in self._payload]
+            values = [self._store.encode(value) for value in self._payload.values()]
+            return f"UPDATE {self._table} SET {', '.join(assignments)}{where} RETURNING *", values + params
+        return f"DELETE FROM {self._table}{where} RETURNING *", params
+
+    def _insert_statements(self) -> List[Tuple[str, List[Any]]]:
+        statements = []
+        for row in self._payload:
+            columns = [self._column(column) for column in row]
+            statements.append((
+                f"INSERT INTO {self._table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))}) RETURNING *",
+                [self._store.encode(value) for value in row.values()]
+            ))
+        return statements
+
+    def _filter(self, column: str, operator: str, value: Any) -> "SQLiteQuery":
+        if value is None and operator in ("=", "!="):
+            self._where.append(f"{self._column(column)} IS {'NOT ' if operator == '!=' else ''}NULL")
+            return self
+        self._where.append(f"{self._column(column)} {operator} ?")
+        self._params.append(self._store.encode(value))
+        return self
+
+    def _column(self, name: str) -> str:
+        # Identifiers are interpolated into SQL, so only known columns get through
+        if not _IDENTIFIER.match(name) or name not in self._store.columns[self._table]:
+            raise SQLiteError(f"column {self._table}.{name} does not exist", "42703")
+        return name
+
+
+class SQLiteCall:
+    """A pending rpc() call, executed like a query"""
+
+    def __init__(self, call):
+        self._call = call
+
+    def execute(self) -> SQLiteResponse:
+        return SQLiteResponse(self._call())
+
+
+class SQLiteStore:
+    """
+    Local SQLite database with a Supabase-compatible query interface
+
+    Usage:
+        store = SQLiteStore("solmind.db")
+        store.table("capsules").select("*").eq("id", capsule_id).single().execute().data
+
+    Args:
+        path: Database file (created with the schema on first use)
+        busy_timeout_ms: How long a write waits for another connection's lock
+    """
+
+    def __init__(self, path: str = "solmind.db", busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        # One connection per thread (requests run on the event loop thread,
+        # write-behind flushes and memory deletions in worker threads)
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        for table, column, definition in ADDED_COLUMNS:
+            existing = {info[1] for info in connection.execute(f"PRAGMA table_info({table})").fetchall()}
+            if column not in existing:
+                try:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                except sqlite3.OperationalError as e:
+                    # Another worker opening the file added it first
+                    if "duplicate column" not in str(e):
+                        raise
+        self.columns: Dict[str, Set[str]] = {}
+        self.booleans: Dict[str, Set[str]] = {}
+        self.json_columns: Dict[str, Set[str]] = {}
+        for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            info = connection.execute(f"PRAGMA table_info({table})").fetchall()
+            self.columns[table] = {column[1] for column in info}
+            self.booleans[table] = {column[1] for column in info if column[2].upper() == "BOOLEAN"}
+            self.json_columns[table] = {column[1] for column in info if column[2].upper() == "JSONB"}
+
+    def table(self, name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, name)
+
+    def rpc(self, name: str, params: dict) -> SQLiteCall:
+        """The database functions from supabase/migrations the services call"""
+        if name != "write_behind_increment":
+            raise SQLiteError(f"function {name} does not exist", "42883")
+        return SQLiteCall(lambda: self.write_behind_increment(**params))
+
+    # ============================================
+    # Execution
+    # ============================================
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout_ms / 1000,
+                isolation_level=None,  # Autocommit; multi-statement writes use explicit transactions
+                check_same_thread=False,
+                cached_statements=256,
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            self._local.connection = connection
+        return connection
+
+    def run(self, sql: str, params: List[Any], table: Optional[str] = None) -> List[dict]:
+        """Run one statement and return its rows (decoded as rows of table, if given)"""
+        try:
+            cursor = self._connection().execute(sql, params)
+            return [self._decode(row, table) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise SQLiteError(str(e), _error_code(e)) from e
+
+    def run_many(self, statements: List[Tuple[str, List[Any]]], table: Optional[str] = None) -> List[dict]:
+        """Run statements in one transaction (all or nothing) and return every returned row"""
+        connection = self._connection()
+        rows: List[dict] = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    rows.extend(self._decode(row, table) for row in connection.execute(sql, params).fetchall())
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            raise SQLiteError(str(e), _error_code(e)) from e
+        return rows
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Enum):
+            return value.value
+        return value
+
+    def _decode(self, row: sqlite3.Row, table: Optional[str]) -> dict:
+        data = dict(row)
+        if table is None:
+            return data
+        for column in self.booleans[table]:
+            if data.get(column) is not None:
+                data[column] = bool(data[column])
+        for column in self.json_columns[table]:
+            if isinstance(data.get(column), str):
+                try:
+                    data[column] = json.loads(data[column])
+                except ValueError:
+                    pass
+        return data
+
+    def write_behind_increment(
+        self,
+        p_table: str,
+        p_column: str,
+        p_match: dict,
+        p_values: dict,
+        p_ops: List[dict]
+    ) -> int:
+        """
+        Same contract as the Supabase function: add the amounts of the operations
+        not applied before (by op ID) to p_column in one transaction
+        Raises:
+            SQLiteError: If no row matches (code P0002)
+        """
+        query = self.table(p_table)
+        column = query._column(p_column)
+        assignments = [f"{column} = COALESCE({column}, 0) + ?"]
+        assignments.extend(f"{query._column(name)} = ?" for name in p_values)
+        conditions = [f"{query._column(name)} = ?" for name in p_match]
+        connection = self._connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                amount = 0
+                for op in p_ops:
+                    inserted = connection.execute(
+                        "INSERT OR IGNORE INTO write_behind_ops (op_id) VALUES (?)", [op["id"]]
+                    ).rowcount
+                    if inserted:
+                        amount += op["amount"]
+                updated = connection.execute(
+                    f"UPDATE {p_table} SET {', '.join(assignments)} WHERE {' AND '.join(conditions)}",
+                    [amount, *(self.encode(value) for value in p_values.values()), *(self.encode(value) for value in p_match.values())]
+                ).rowcount
+                if not updated:
+                    raise SQLiteError(f"no {p_table} row matches {p_match}", "P0002")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            raise SQLiteError(str(e), _error_code(e)) from e
+        return updated
+
+    # ============================================
+    # Chats and messages (used when Redis isn't available)
+    # ============================================
+
+    def append_message(self, message: dict, last_message: str, activity: str):
+        """
+        Append a message to its chat and bump the chat's counters and last_activity in one transaction
+        The message's seq is the next free position in the chat, assigned under the write lock
+        """
+        self.run_many([
+            (
+                "INSERT INTO messages (id, chat_id, seq, role, content, tokens, timestamp) "
+                "SELECT ?, ?, COALESCE(MAX(seq) + 1, 0), ?, ?, ?, ? FROM messages WHERE chat_id = ? RETURNING seq",
+                [
+                    message["id"], message["chat_id"], message["role"], message["content"],
+                    message.get("tokens"), message["timestamp"], message["chat_id"]
+                ]
+            ),
+            (
+                "UPDATE chats SET message_count = message_count + 1, last_message = ?, last_activity = ? "
+                "WHERE id = ? RETURNING id",
+                [last_message, activity, message["chat_id"]]
+            ),
+        ])
+
+    def message_page(
+        self,
+        chat_id: str,
+        limit: Optional[int],
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[dict], int, int]:
+        """
+        One page of a chat's messages, oldest first (same contract as CacheService.get_message_page)
+        Args:
+            limit: Page size (None = every message)
+        Returns:
+            (messages, seq of the first one, total)
+        """
+        last = self.run("SELECT MAX(seq) AS last FROM messages WHERE chat_id = ?", [chat_id])
+        total = 0 if not last or last[0]["last"] is None else last[0]["last"] + 1
+        if limit is None:
+            first, end = 0, total
+        elif after is not None:
+            first, end = after + 1, after + 1 + limit
+        elif before is not None:
+            first, end = max(0, before - limit), max(0, before)
+        else:
+            first, end = max(0, total - limit), total
+        first = max(0, first)
+        if end <= first:
+            return [], first, total
+        rows = self.run(
+            "SELECT id, role, content, tokens, timestamp FROM messages WHERE chat_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            [chat_id, first, end]
+        )
+        return rows, first, total
+
+
+def _error_code(error: sqlite3.Error) -> str:
+    if isinstance(error, sqlite3.IntegrityError):
+        return "23505" if "UNIQUE" in str(error) else "23502"
+    return "SQLITE"
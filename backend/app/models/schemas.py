@@ -21,6 +21,8 @@ class Message(BaseModel):
     role: MessageRole
     content: str
     timestamp: Optional[datetime] = None
+    seq: Optional[int] = None  # Position in the chat (0 = first message), used as the page cursor
+    tokens: Optional[int] = Field(None, exclude=True)  # Token count cached at write time, for the context builder
 
 
 class MessageCreate(BaseModel):
@@ -41,6 +43,24 @@ class Chat(BaseModel):
     capsule_id: Optional[str] = None  # Capsule scope for memory isolation
     user_wallet: Optional[str] = None
     web_search_enabled: bool = False  # Enable web search via Tavily
+    # Rolling summary of turns that no longer fit the context budget (internal, not returned)
+    summary: Optional[str] = Field(None, exclude=True)
+    summary_seq: Optional[int] = Field(None, exclude=True)  # Last message seq folded into the summary
+    tier: Optional[str] = Field(None, exclude=True)  # Storage tier the chat was loaded from (internal)
+
+
+class ChatSummary(BaseModel):
+    """Chat metadata without messages (for chat lists)"""
+    id: str
+    name: str
+    memory_size: MemorySize
+    last_message: Optional[str] = None
+    timestamp: datetime
+    message_count: int
+    agent_id: Optional[str] = None
+    capsule_id: Optional[str] = None
+    user_wallet: Optional[str] = None
+    web_search_enabled: bool = False
 
 
 class ChatCreate(BaseModel):
@@ -67,6 +87,7 @@ class Agent(BaseModel):
     model: Optional[str] = None
     user_wallet: Optional[str] = None
     api_key: Optional[str] = None  # Only included when needed, not in responses
+    completion_cache: Optional[bool] = False  # Replay cached answers to repeated questions (None on older rows)
 
 
 class AgentCreate(BaseModel):
@@ -75,11 +96,13 @@ class AgentCreate(BaseModel):
     platform: str
     api_key: str
     model: Optional[str] = None
+    completion_cache: bool = False
 
 
 class AgentUpdate(BaseModel):
     display_name: Optional[str] = None
     model: Optional[str] = None
+    completion_cache: Optional[bool] = None
 
 
 # Capsule Models
@@ -1,127 +1,83 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple, Union
 from datetime import datetime
+from pydantic import TypeAdapter
+import asyncio
 import uuid
-from app.db.database import get_supabase
-from app.models.schemas import Chat, ChatCreate, ChatUpdate, Message, MessageCreate, Agent, AgentCreate, AgentUpdate, AgentUpdate
-from app.services.cache_service import cache_service
+from app.core.config import settings
+from app.models.schemas import Chat, ChatCreate, ChatSummary, ChatUpdate, Message, MessageCreate, Agent, AgentCreate, AgentUpdate
+from app.services.cache_service import cache_service, decode_chat_cursor
+from app.services.context_builder import count_tokens
+from app.services.local_cache import LocalCache
+from app.services.memory_ingestion import memory_ingestion
+from app.services.repositories import AgentListRepository, AgentRepository, ChatRepository, MessageRepository
+
+_MESSAGE_LIST = TypeAdapter(List[Message])
 
 
 class AgentService:
-    # Class-level storage for in-memory agents and chats (persists across requests)
-    _in_memory_agents: dict = {}
-    _in_memory_chats: dict = {}
-    _in_memory_messages: dict = {}
-    
-    def __init__(self):
-        self.supabase = get_supabase()
-    
-    def _check_supabase(self):
-        """Helper to check if Supabase is available, raises exception if not"""
-        if not self.supabase:
-            raise Exception("Supabase not configured")
+    # Agents, agent lists, chats and messages are read and written through
+    # tiered repositories (local / Redis / database) - see app.services.repositories
+    _agents = AgentRepository()
+    _agent_lists = AgentListRepository()
+    _chats = ChatRepository()
+    _messages = MessageRepository()
+    # Background agent deletions running in this process (their status is in
+    # cache_service under deletion_job:{id}, so any worker can report it)
+    _deletion_tasks: set = set()
+    # Agent configs including API keys, so the send path resolves an agent
+    # without a Supabase round trip. Process memory only - never written to
+    # Redis - and dropped on update/delete; other workers catch up within the TTL
+    _agent_configs: Optional[LocalCache] = (
+        LocalCache(settings.AGENT_CONFIG_CACHE_MAX_ENTRIES, settings.AGENT_CONFIG_CACHE_TTL_SECONDS)
+        if settings.AGENT_CONFIG_CACHE_TTL_SECONDS > 0 else None
+    )
     
     async def get_user_agents(self, wallet_address: Optional[str]) -> List[Agent]:
         """Get all agents for a user (without API keys) - loads from Redis first"""
-        agents = []
-        
-        # Try Redis first (primary storage)
-        if wallet_address and cache_service.redis_available:
-            try:
-                redis_agents = cache_service.get_user_agents(wallet_address)
-                if redis_agents:
-                    agents = [Agent(**agent_data) for agent_data in redis_agents]
-                    # print(f"✅ Loaded {len(agents)} agents from Redis")
-            except Exception as e:
-                # print(f"⚠️  Error loading agents from Redis: {e}")
-                pass
-        
-        # Fallback to Supabase if Redis has no agents
-        if not agents:
-            try:
-                self._check_supabase()
-                query = self.supabase.table("agents").select("id, name, display_name, platform, api_key_configured, model, user_wallet")
-                if wallet_address:
-                    query = query.eq("user_wallet", wallet_address)
-                
-                result = query.execute()
-                for row in result.data:
-                    agent = Agent(**row)
-                    agent.api_key = None  # Don't expose API key
-                    agents.append(agent)
-                
-                # Save to Redis for future use
-                if wallet_address and cache_service.redis_available and agents:
-                    try:
-                        agents_data = [
-                            {
-                                "id": a.id,
-                                "name": a.name,
-                                "display_name": a.display_name,
-                                "platform": a.platform,
-                                "api_key_configured": a.api_key_configured,
-                                "model": a.model,
-                                "user_wallet": a.user_wallet
-                            }
-                            for a in agents
-                        ]
-                        cache_service.set_user_agents(wallet_address, agents_data)
-                        # print(f"✅ Synced {len(agents)} agents from Supabase to Redis")
-                    except Exception as e:
-                        # print(f"⚠️  Error syncing agents to Redis: {e}")
-                        pass
-            except Exception as e:
-                # print(f"⚠️  Error fetching agents from Supabase: {e}")
-                pass
-                # Check in-memory storage as last resort
-                for agent_id, agent_data in AgentService._in_memory_agents.items():
-                    if not wallet_address or agent_data.get("user_wallet") == wallet_address:
-                        agent = Agent(**agent_data)
-                        agent.api_key = None  # Don't expose API key
-                        agents.append(agent)
-        
         # No default agents - users must add their own
-        return agents
+        result = await AgentService._agent_lists.list(wallet_address)
+        return [Agent(**agent_data) for agent_data in result.value or []]
     
     async def get_agent(self, agent_id: str, wallet_address: Optional[str]) -> Optional[Agent]:
         """Get a specific agent with API key (for internal use)"""
         # No default agents - check user's agents only
         
-        # Check in-memory storage (for custom agents) - has API key
-        if agent_id in AgentService._in_memory_agents:
-            return Agent(**AgentService._in_memory_agents[agent_id])
-        
-        # Try Supabase for all agents (including custom) - has API key stored
-        try:
-            self._check_supabase()
-            query = self.supabase.table("agents").select("*").eq("id", agent_id)
-            if wallet_address:
-                query = query.eq("user_wallet", wallet_address)
-            
-            result = query.single().execute()
-            if result.data:
-                return Agent(**result.data)
-        except Exception as e:
-            # Supabase query failed, continue to other sources
-            # print(f"Error fetching agent from Supabase: {e}")
-            pass
-        
-        # Check Redis for custom agents (if wallet_address provided) - no API key here
-        if wallet_address and cache_service.redis_available and agent_id.startswith("custom-"):
-            try:
-                agents_data = cache_service.get_user_agents(wallet_address)
-                for agent_data in agents_data:
-                    if agent_data.get("id") == agent_id:
-                        # Try to get API key from in-memory if available
-                        if agent_id in AgentService._in_memory_agents:
-                            return Agent(**AgentService._in_memory_agents[agent_id])
-                        # Otherwise return without API key (will cause API errors but at least agent exists)
-                        return Agent(**agent_data, api_key=None)
-            except Exception as e:
-                # print(f"Error loading agent from Redis: {e}")
-                pass
-        
+        # Recently resolved config (with API key) - no network calls
+        if AgentService._agent_configs is not None:
+            cached = AgentService._agent_configs.get(self._agent_config_key(agent_id, wallet_address))
+            if cached is not None:
+                return cached.model_copy()
+        
+        # Recently looked up and not found anywhere - skip Supabase and Redis
+        if cache_service.is_known_missing("agent", agent_id, wallet_address):
+            return None
+        
+        # Local copy and Supabase have the API key; Redis only lists the agent
+        # (a key-less agent will cause API errors but at least it exists)
+        result = await AgentService._agents.get(agent_id, wallet_address)
+        if result.value is not None:
+            agent = Agent(**result.value)
+            self._remember_agent_config(agent, wallet_address)
+            return agent
+        
+        # Only a clean miss in every tier is cached; errors leave the lookup retryable
+        if not result.failed:
+            cache_service.mark_missing("agent", agent_id, wallet_address)
         return None
     
+    @staticmethod
+    def _agent_config_key(agent_id: str, wallet_address: Optional[str]) -> str:
+        return f"{agent_id}:{wallet_address or ''}"
+    
+    def _remember_agent_config(self, agent: Agent, wallet_address: Optional[str]):
+        if AgentService._agent_configs is not None and agent.api_key:
+            AgentService._agent_configs.set(self._agent_config_key(agent.id, wallet_address), agent.model_copy())
+    
+    def _forget_agent_config(self, agent_id: str, wallet_address: Optional[str]):
+        if AgentService._agent_configs is not None:
+            AgentService._agent_configs.delete(self._agent_config_key(agent_id, wallet_address))
+            AgentService._agent_configs.delete(self._agent_config_key(agent_id, None))
+    
     async def create_agent(self, agent_data: AgentCreate, wallet_address: str) -> Agent:
         """Create a new agent"""
         agent_id = f"custom-{uuid.uuid4().hex[:8]}"
@@ -133,10 +89,11 @@ class AgentService:
             api_key_configured=True,
             model=agent_data.model,
             user_wallet=wallet_address,
-            api_key=agent_data.api_key  # Store API key
+            api_key=agent_data.api_key,  # Store API key
+            completion_cache=agent_data.completion_cache
         )
         
-        # Save agent data (without API key for storage)
+        # Agent data without API key (Redis); the key is stored in the database and locally only
         agent_storage_data = {
             "id": agent.id,
             "name": agent.name,
@@ -144,134 +101,87 @@ class AgentService:
             "platform": agent.platform,
             "api_key_configured": True,
             "model": agent.model,
-            "user_wallet": wallet_address
-        }
-        
-        # Save to Redis (primary storage)
-        try:
-            cache_service.add_user_agent(wallet_address, agent_storage_data)
-            # print(f"✅ Agent '{agent.display_name}' saved to Redis")
-        except Exception as e:
-            # print(f"❌ Error saving agent to Redis: {e}")
-            pass
-        
-        # Also save to Supabase as backup
-        saved_to_db = False
-        if self.supabase:
-            try:
-                self.supabase.table("agents").insert({
-                    **agent_storage_data,
-                    "api_key": agent_data.api_key  # Store API key in database only
-                }).execute()
-                saved_to_db = True
-                # print(f"✅ Agent '{agent.display_name}' also saved to Supabase")
-            except Exception as e:
-                # print(f"⚠️  Error saving agent to Supabase: {e}")
-                pass
-        
-        # Always store in memory as backup (even if saved to DB/Redis)
-        AgentService._in_memory_agents[agent.id] = {
-            **agent_storage_data,
-            "api_key": agent_data.api_key
+            "user_wallet": wallet_address,
+            "completion_cache": agent.completion_cache
         }
-        
-        # if not saved_to_db and not self.supabase:
-        #     print("⚠️  WARNING: Supabase not configured. Agent stored in memory only.")
-        #     print("⚠️  Data will be lost on server restart. Please configure Supabase for persistence.")
+        await AgentService._agents.create(agent_storage_data, agent_data.api_key)
+        cache_service.clear_missing("agent", agent.id, wallet_address)
+        self._remember_agent_config(agent, wallet_address)
         
         # Don't return API key in response
         agent.api_key = None
         return agent
     
-    async def get_agent_chats(self, agent_id: str, wallet_address: Optional[str]) -> List[Chat]:
-        """Get all chats for an agent from Redis"""
-        chats = []
+    async def update_agent(self, agent_id: str, agent_update: AgentUpdate, wallet_address: str) -> Agent:
+        """Update an agent's display name, model or completion cache opt-in"""
+        agent = await self.get_agent(agent_id, wallet_address)
+        if not agent or (agent.user_wallet and agent.user_wallet != wallet_address):
+            raise Exception(f"Agent {agent_id} not found or unauthorized")
         
-        # Try Redis first
-        if cache_service.redis_available:
-            try:
-                # If wallet_address is provided, use the chat list index (faster)
-                if wallet_address:
-                    chat_ids = cache_service.get_chat_list(agent_id, wallet_address)
-                else:
-                    # If no wallet_address, we need to scan all chats for this agent
-                    # This is less efficient but ensures we get all chats
-                    chat_ids = []
-                    # Try to get from a global agent chat list if it exists
-                    all_chat_ids = cache_service.get(f"agent:chats:{agent_id}", [])
-                    if all_chat_ids:
-                        chat_ids = all_chat_ids
-                
-                # Load chats from Redis
-                for chat_id in chat_ids:
-                    # Get chat data
-                    chat_data = cache_service.get_chat(chat_id)
-                    if not chat_data:
-                        continue
-                    
-                    # Check if it matches agent_id
-                    if chat_data.get("agent_id") != agent_id:
-                        continue
-                    
-                    # Filter by wallet_address if provided
-                    if wallet_address and chat_data.get("user_wallet") != wallet_address:
-                        continue
-                    
-                    # Get messages
-                    messages_data = cache_service.get_messages(chat_id)
-                    messages = []
-                    for msg_data in messages_data:
-                        # Convert timestamp string to datetime if needed
-                        if isinstance(msg_data.get("timestamp"), str):
-                            msg_data["timestamp"] = datetime.fromisoformat(msg_data["timestamp"])
-                        # Convert role enum if it's a string
-                        if isinstance(msg_data.get("role"), str):
-                            from app.models.schemas import MessageRole
-                            msg_data["role"] = MessageRole(msg_data["role"])
-                        messages.append(Message(**msg_data))
-                    
-                    # Convert timestamp string to datetime if needed
-                    if isinstance(chat_data.get("timestamp"), str):
-                        chat_data["timestamp"] = datetime.fromisoformat(chat_data["timestamp"])
-                    
-                    chat_data["messages"] = messages
-                    # Ensure web_search_enabled has a default value
-                    if "web_search_enabled" not in chat_data:
-                        chat_data["web_search_enabled"] = False
-                    chats.append(Chat(**chat_data))
-                
-                # Sort by timestamp (newest first)
-                chats.sort(key=lambda x: x.timestamp, reverse=True)
-                return chats
-            except Exception as e:
-                # print(f"Error fetching chats from Redis: {e}")
-                pass
+        changes = {}
+        if agent_update.display_name:
+            changes["display_name"] = agent_update.display_name
+        if agent_update.model:
+            changes["model"] = agent_update.model
+        if agent_update.completion_cache is not None:
+            changes["completion_cache"] = agent_update.completion_cache
         
-        # If no wallet_address or Redis unavailable, fallback to in-memory storage
-        for chat_id, chat_data in AgentService._in_memory_chats.items():
-            if chat_data.get("agent_id") == agent_id:
-                if not wallet_address or chat_data.get("user_wallet") == wallet_address:
-                    # Get messages for this chat
-                    chat_messages = []
-                    for msg_data in AgentService._in_memory_messages.get(chat_id, []):
-                        # Convert timestamp string to datetime if needed
-                        if isinstance(msg_data.get("timestamp"), str):
-                            msg_data["timestamp"] = datetime.fromisoformat(msg_data["timestamp"])
-                        # Convert role enum if it's a string
-                        if isinstance(msg_data.get("role"), str):
-                            from app.models.schemas import MessageRole
-                            msg_data["role"] = MessageRole(msg_data["role"])
-                        chat_messages.append(Message(**msg_data))
-                    chat_data["messages"] = chat_messages
-                    # Ensure web_search_enabled has a default value
-                    if "web_search_enabled" not in chat_data:
-                        chat_data["web_search_enabled"] = False
-                    chats.append(Chat(**chat_data))
+        if changes:
+            await AgentService._agents.update(agent_id, wallet_address, changes)
+            self._forget_agent_config(agent_id, wallet_address)
         
-        return chats
+        # Don't return API key in response
+        return agent.model_copy(update={**changes, "api_key": None})
     
+    async def get_agent_chats(self, agent_id: str, wallet_address: Optional[str]) -> List[Chat]:
+        """Get all chats for an agent, most recently active first"""
+        chats, _ = await self.get_agent_chats_page(agent_id, wallet_address)
+        return chats
+
+    async def get_agent_chats_page(
+        self,
+        agent_id: str,
+        wallet_address: Optional[str],
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        summary: bool = False
+    ) -> Tuple[List[Union[Chat, ChatSummary]], Optional[str]]:
+        """
+        Get one page of an agent's chats, most recently active first
+        Args:
+            agent_id: Agent ID
+            wallet_address: Owner wallet (None = all wallets)
+            cursor: next_cursor from the previous page
+            limit: Page size (None = all remaining chats)
+            summary: Return ChatSummary metadata only, without reading any messages
+        Returns:
+            (chats, next_cursor or None on the last page)
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        decode_chat_cursor(cursor)  # Reject malformed cursors up front
+        result = await AgentService._chats.page(agent_id, wallet_address, cursor, limit, summary)
+        if result.value is None:
+            return [], None
+        rows, next_cursor = result.value
+        # Already in index order (most recent activity first)
+        return [self._build_chat(chat_data, messages_data, summary) for chat_data, messages_data in rows], next_cursor
+
+    def _build_chat(self, chat_data: dict, messages_data: list, summary: bool) -> Union[Chat, ChatSummary]:
+        # Convert timestamp string to datetime if needed
+        if isinstance(chat_data.get("timestamp"), str):
+            chat_data["timestamp"] = datetime.fromisoformat(chat_data["timestamp"])
+        # Ensure web_search_enabled has a default value
+        if "web_search_enabled" not in chat_data:
+            chat_data["web_search_enabled"] = False
+        if summary:
+            chat_data.pop("messages", None)
+            return ChatSummary(**chat_data)
+        chat_data["messages"] = self._to_messages(messages_data)
+        return Chat(**chat_data)
+
     async def create_chat(self, agent_id: str, chat_data: ChatCreate, wallet_address: str) -> Chat:
-        """Create a new chat and save to Redis"""
+        """Create a new chat"""
         chat_id = str(uuid.uuid4())
         now = datetime.now()
         chat = Chat(
@@ -300,109 +210,148 @@ class AgentService:
             "web_search_enabled": getattr(chat_data, 'web_search_enabled', False)
         }
         
-        # Save to Redis (primary storage) - ALWAYS save, even if wallet_address is missing
-        saved_to_redis = False
-        if cache_service.redis_available:
-            try:
-                # Save chat data
-                cache_service.save_chat(chat_dict)
-                # Save empty messages list
-                cache_service.save_messages(chat_id, [])
-                
-                # Add to chat list index (if wallet_address provided)
-                if wallet_address:
-                    cache_service.add_chat_to_list(agent_id, wallet_address, chat_id)
-                
-                # Also maintain a global agent chat list (for retrieval without wallet_address)
-                agent_chat_list_key = f"agent:chats:{agent_id}"
-                agent_chat_ids = cache_service.get(agent_chat_list_key, [])
-                if chat_id not in agent_chat_ids:
-                    agent_chat_ids.append(chat_id)
-                    cache_service.set(agent_chat_list_key, agent_chat_ids, ttl_seconds=None)
-                
-                saved_to_redis = True
-                # print(f"✅ Chat '{chat.name}' saved to Redis (agent: {agent_id}, wallet: {wallet_address or 'N/A'})")
-            except Exception as e:
-                # print(f"❌ Error saving chat to Redis: {e}")
-                # import traceback
-                # traceback.print_exc()
-                pass
-        
-        # Always store in memory as backup
-        AgentService._in_memory_chats[chat_id] = chat_dict
-        AgentService._in_memory_messages[chat_id] = []
-        
-        # if not saved_to_redis:
-        #     print("⚠️  WARNING: Redis not available. Chat stored in memory only.")
-        #     print("⚠️  Data will be lost on server restart. Please configure Redis for persistence.")
+        # Saved even if wallet_address is missing
+        await AgentService._chats.create(chat_dict)
+        cache_service.clear_missing("chat", chat_id, wallet_address)
         
         return chat
     
-    async def get_chat(self, chat_id: str, wallet_address: Optional[str]) -> Optional[Chat]:
-        """Get a specific chat with messages from Redis"""
-        # Try Redis first
-        if cache_service.redis_available:
-            try:
-                chat_data = cache_service.get_chat(chat_id)
-                if chat_data:
-                    # Check wallet address if provided
-                    if wallet_address and chat_data.get("user_wallet") != wallet_address:
-                        # print(f"Chat {chat_id} belongs to different wallet. Expected: {wallet_address}, Found: {chat_data.get('user_wallet')}")
-                        return None
-                    
-                    # Get messages from Redis
-                    messages_data = cache_service.get_messages(chat_id)
-                    messages = []
-                    for msg_data in messages_data:
-                        # Convert timestamp string to datetime if needed
-                        if isinstance(msg_data.get("timestamp"), str):
-                            msg_data["timestamp"] = datetime.fromisoformat(msg_data["timestamp"])
-                        # Convert role enum if it's a string
-                        if isinstance(msg_data.get("role"), str):
-                            from app.models.schemas import MessageRole
-                            msg_data["role"] = MessageRole(msg_data["role"])
-                        messages.append(Message(**msg_data))
-                    
-                    # Convert timestamp string to datetime if needed
-                    if isinstance(chat_data.get("timestamp"), str):
-                        chat_data["timestamp"] = datetime.fromisoformat(chat_data["timestamp"])
-                    
-                    chat_data["messages"] = messages
-                    # Ensure web_search_enabled has a default value
-                    if "web_search_enabled" not in chat_data:
-                        chat_data["web_search_enabled"] = False
-                    return Chat(**chat_data)
-            except Exception as e:
-                # print(f"Error fetching chat from Redis: {e}")
-                pass
-        
-        # Fallback to in-memory storage
-        if chat_id in AgentService._in_memory_chats:
-            chat_data = AgentService._in_memory_chats[chat_id].copy()
-            # Check wallet address if provided
-            if wallet_address and chat_data.get("user_wallet") != wallet_address:
-                # print(f"Chat {chat_id} in memory belongs to different wallet. Expected: {wallet_address}, Found: {chat_data.get('user_wallet')}")
-                return None
-            
-            # Get messages from in-memory storage
-            chat_messages = [
-                Message(**msg) for msg in AgentService._in_memory_messages.get(chat_id, [])
-            ]
-            chat_data["messages"] = chat_messages
-            # Ensure web_search_enabled has a default value
-            if "web_search_enabled" not in chat_data:
-                chat_data["web_search_enabled"] = False
-            return Chat(**chat_data)
-        
-        # print(f"Chat {chat_id} not found in Redis or in-memory storage")
-        return None
+    async def get_chat(
+        self,
+        chat_id: str,
+        wallet_address: Optional[str],
+        message_limit: Optional[int] = None
+    ) -> Optional[Chat]:
+        """
+        Get a specific chat with messages from Redis
+        Args:
+            chat_id: Chat ID
+            wallet_address: Owner to check against (None = any)
+            message_limit: Load only the most recent N messages (None = full history, 0 = none)
+        """
+        found = await self._load_chat(chat_id, wallet_address, message_limit)
+        return found[0] if found else None
+    
+    async def _load_chat(
+        self,
+        chat_id: str,
+        wallet_address: Optional[str],
+        message_limit: Optional[int]
+    ) -> Optional[Tuple[Chat, str]]:
+        """A chat with its messages (see get_chat) and the tier it lives in, or None"""
+        found = await self._get_chat_data(chat_id, wallet_address)
+        if found is None:
+            return None
+        chat_data, tier = found
+        if message_limit is None:
+            messages = await self._get_all_messages(chat_id, tier)
+        else:
+            messages, _, _ = await self._get_message_page(chat_id, tier, message_limit)
+        chat_data["messages"] = messages
+        chat_data["tier"] = tier
+        return Chat(**chat_data), tier
+    
+    async def get_messages_page(
+        self,
+        chat_id: str,
+        wallet_address: Optional[str],
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Optional[Tuple[List[Message], Optional[int], Optional[int]]]:
+        """
+        Get one page of a chat's messages (most recent page by default)
+        Args:
+            chat_id: Chat ID
+            wallet_address: Owner to check against (None = any)
+            before: Return the page of messages with seq < before
+            after: Return the page of messages with seq > after
+            limit: Page size (default MESSAGE_PAGE_SIZE)
+        Returns:
+            (messages oldest first, cursor for the older page, cursor for the newer page),
+            cursors are None when nothing remains in that direction; None if the chat isn't found
+        """
+        found = await self._get_chat_data(chat_id, wallet_address)
+        if found is None:
+            return None
+        messages, first, total = await self._get_message_page(
+            chat_id, found[1], limit or settings.MESSAGE_PAGE_SIZE, before, after
+        )
+        older = first if messages and first > 0 else None
+        newer = messages[-1].seq if messages and first + len(messages) < total else None
+        return messages, older, newer
+    
+    async def get_history_range(self, chat_id: str, wallet_address: Optional[str], after: int, before: int) -> List[dict]:
+        """
+        A chat's messages with after < seq < before, oldest first, as LLM history entries
+        (role, content, seq, tokens) - used to summarize turns older than the loaded history
+        """
+        if before - after <= 1:
+            return []
+        page = await self.get_messages_page(chat_id, wallet_address, after=after, limit=before - after - 1)
+        if page is None:
+            return []
+        return [
+            {"role": m.role.value, "content": m.content, "seq": m.seq, "tokens": m.tokens}
+            for m in page[0] if m.seq is not None and m.seq < before
+        ]
+    
+    async def _get_chat_data(self, chat_id: str, wallet_address: Optional[str]) -> Optional[Tuple[dict, str]]:
+        """Chat metadata (without messages) and the tier it lives in ('redis', 'database' or 'local'), or None"""
+        if cache_service.is_known_missing("chat", chat_id, wallet_address):
+            return None
+        result = await AgentService._chats.get(chat_id)
+        if result.value is None:
+            # Only a clean miss in every tier is cached; errors leave the lookup retryable
+            if not result.failed:
+                cache_service.mark_missing("chat", chat_id, wallet_address)
+            return None
+        
+        chat_data = result.value
+        # Check wallet address if provided
+        if wallet_address and chat_data.get("user_wallet") != wallet_address:
+            return None
+        # Convert timestamp string to datetime if needed
+        if isinstance(chat_data.get("timestamp"), str):
+            chat_data["timestamp"] = datetime.fromisoformat(chat_data["timestamp"])
+        # Ensure web_search_enabled has a default value
+        if "web_search_enabled" not in chat_data:
+            chat_data["web_search_enabled"] = False
+        return chat_data, result.tier
+    
+    async def _get_all_messages(self, chat_id: str, tier: str) -> List[Message]:
+        return self._to_messages(await AgentService._messages.all(chat_id, tier))
+    
+    async def _get_message_page(
+        self,
+        chat_id: str,
+        tier: str,
+        limit: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[Message], int, int]:
+        """(messages, seq of the first one, total) - see CacheService.get_message_page"""
+        messages_data, first, total = await AgentService._messages.page(chat_id, tier, limit, before, after)
+        return self._to_messages(messages_data, first), first, total
+    
+    @staticmethod
+    def _to_messages(messages_data: list, first: int = 0) -> List[Message]:
+        """
+        Hydrate stored messages, numbering them from seq `first`
+        The whole list goes through one pydantic-core call (which also parses the
+        ISO timestamps) instead of a Message(**...) call and fromisoformat per message
+        """
+        return _MESSAGE_LIST.validate_python(
+            [{**msg_data, "seq": first + offset} for offset, msg_data in enumerate(messages_data)]
+        )
     
     async def update_chat(self, chat_id: str, chat_update: ChatUpdate, wallet_address: Optional[str]) -> Chat:
-        """Update chat metadata in Redis"""
+        """Update chat metadata"""
         # Get existing chat
-        chat = await self.get_chat(chat_id, wallet_address)
-        if not chat:
+        found = await self._load_chat(chat_id, wallet_address, settings.MESSAGE_PAGE_SIZE)
+        if not found:
             raise Exception("Chat not found")
+        chat, tier = found
         
         # Update fields
         if chat_update.name:
@@ -410,41 +359,42 @@ class AgentService:
         if chat_update.memory_size:
             chat.memory_size = chat_update.memory_size
         
-        # Save updated chat to Redis
-        chat_dict = {
-            "id": chat.id,
+        # Only the edited fields - message_count/last_message are maintained by add_message
+        await AgentService._chats.update(chat_id, {
             "name": chat.name,
-            "memory_size": chat.memory_size.value,
-            "timestamp": chat.timestamp.isoformat() if isinstance(chat.timestamp, datetime) else chat.timestamp,
-            "message_count": chat.message_count,
-            "agent_id": chat.agent_id,
-            "capsule_id": chat.capsule_id,
-            "user_wallet": chat.user_wallet,
-            "last_message": chat.last_message
-        }
-        
-        if cache_service.redis_available:
-            try:
-                cache_service.save_chat(chat_dict)
-                # print(f"✅ Chat '{chat.name}' updated in Redis")
-            except Exception as e:
-                # print(f"❌ Error updating chat in Redis: {e}")
-                pass
-        
-        # Update in-memory storage
-        AgentService._in_memory_chats[chat_id] = chat_dict
+            "memory_size": chat.memory_size.value
+        }, tier)
         
         return chat
     
-    async def add_message(self, chat_id: str, message: MessageCreate, wallet_address: str) -> Message:
-        """Add a message to a chat and save to Redis"""
+    async def update_chat_summary(self, chat_id: str, wallet_address: Optional[str], summary: str, summary_seq: int):
+        """Store a chat's rolling summary of the messages up to summary_seq (see LLMService)"""
+        found = await self._get_chat_data(chat_id, wallet_address)
+        if found is None:
+            return
+        await AgentService._chats.update(chat_id, {"summary": summary, "summary_seq": summary_seq}, found[1])
+    
+    async def add_message(
+        self,
+        chat_id: str,
+        message: MessageCreate,
+        wallet_address: str,
+        tier: Optional[str] = None
+    ) -> Message:
+        """
+        Add a message to a chat
+        Args:
+            tier: Where the chat lives, when the caller already loaded it (Chat.tier);
+                looked up otherwise
+        """
         message_id = str(uuid.uuid4())
         now = datetime.now()
         msg = Message(
             id=message_id,
             role=message.role,
             content=message.content,
-            timestamp=now
+            timestamp=now,
+            tokens=count_tokens(message.content)  # Counted once, reused by every later context build
         )
         
         msg_dict = {
@@ -452,100 +402,72 @@ class AgentService:
             "chat_id": chat_id,
             "role": msg.role.value,
             "content": msg.content,
+            "tokens": msg.tokens,
             "timestamp": now.isoformat()
         }
         
-        # Save to Redis (primary storage) - ALWAYS save
-        if cache_service.redis_available:
-            try:
-                cache_service.add_message(chat_id, msg_dict)
-                
-                # Update chat message count and last message
-                chat_data = cache_service.get_chat(chat_id)
-                if chat_data:
-                    messages = cache_service.get_messages(chat_id)
-                    chat_data["message_count"] = len(messages)
-                    chat_data["last_message"] = message.content[:100]
-                    cache_service.save_chat(chat_data)
-                    print(f"✅ Message saved to Redis (chat: {chat_id})")
-                # else:
-                #     print(f"⚠️  Chat {chat_id} not found in Redis, saving message anyway")
-            except Exception as e:
-                # print(f"❌ Error saving message to Redis: {e}")
-                # import traceback
-                # traceback.print_exc()
-                # print("⚠️  Message stored in memory only")
-                pass
-        # else:
-        #     print("⚠️  Redis not available, message stored in memory only")
-        
-        # Always store in memory as backup
-        if chat_id not in AgentService._in_memory_messages:
-            AgentService._in_memory_messages[chat_id] = []
-        AgentService._in_memory_messages[chat_id].append(msg_dict)
-        
-        # Update in-memory chat
-        if chat_id in AgentService._in_memory_chats:
-            AgentService._in_memory_chats[chat_id]["message_count"] = len(AgentService._in_memory_messages[chat_id])
-            AgentService._in_memory_chats[chat_id]["last_message"] = message.content[:100]
+        # Append where the chat lives (a chat created while Redis was down stays in its fallback tier)
+        if tier is None:
+            found = await self._get_chat_data(chat_id, None)
+            tier = found[1] if found else None
+        await AgentService._messages.append(chat_id, msg_dict, message.content[:100], now, tier)
         
         return msg
     
+    async def _delete_chats(
+        self,
+        agent_id: str,
+        wallet_address: Optional[str],
+        chat_ids: List[str],
+        job: Optional[dict] = None
+    ):
+        """
+        Delete chats with their messages and memories, in batches of DELETE_BATCH_SIZE
+        Memories are deleted concurrently (DELETE_CONCURRENCY at a time), each batch's
+        chats and messages with one call per tier (see ChatRepository.delete)
+        Args:
+            agent_id: Agent the chats belong to
+            wallet_address: Owner wallet
+            chat_ids: Chats to delete
+            job: Deletion job to report progress to
+        """
+        if not chat_ids:
+            return
+        from app.services.memory_service import MemoryService
+        memory_service = MemoryService()
+        semaphore = asyncio.Semaphore(max(1, settings.DELETE_CONCURRENCY))
+        
+        async def delete_memories(chat_id: str):
+            # Turns of the chat still queued for memory storage would recreate memories
+            memory_ingestion.discard_chat(chat_id)
+            async with semaphore:
+                try:
+                    await asyncio.to_thread(memory_service.delete_chat_memories, agent_id, chat_id)
+                except Exception as e:
+                    # print(f"⚠️  Error deleting memories for chat {chat_id}: {e}")
+                    pass
+        
+        batch_size = max(1, settings.DELETE_BATCH_SIZE)
+        for start in range(0, len(chat_ids), batch_size):
+            batch = chat_ids[start:start + batch_size]
+            await asyncio.gather(*(delete_memories(chat_id) for chat_id in batch))
+            
+            # Chats and messages from every tier, one call per tier for the batch
+            await AgentService._chats.delete(agent_id, wallet_address, batch)
+            
+            if job is not None:
+                job["chats_deleted"] += len(batch)
+                await self._save_deletion_job(job)
+    
     async def delete_chat(self, chat_id: str, wallet_address: Optional[str]):
-        """Delete a chat and its messages from Redis, Supabase, and memory service"""
+        """Delete a chat with its messages (from every tier) and memories"""
         # Get chat to find agent_id
-        chat = await self.get_chat(chat_id, wallet_address)
+        chat = await self.get_chat(chat_id, wallet_address, message_limit=0)
         if not chat:
             # print(f"Chat {chat_id} not found")
             return
         
-        agent_id = chat.agent_id
-        
-        # Delete memories associated with this chat
-        from app.services.memory_service import MemoryService
-        memory_service = MemoryService()
-        try:
-            memory_service.delete_chat_memories(agent_id, chat_id)
-            # print(f"✅ Deleted memories for chat {chat_id}")
-        except Exception as e:
-            # print(f"⚠️  Error deleting memories for chat {chat_id}: {e}")
-            pass
-        
-        # Delete from Supabase if available
-        if self.supabase:
-            try:
-                # Delete messages first (CASCADE will handle this automatically, but explicit is clearer)
-                self.supabase.table("messages").delete().eq("chat_id", chat_id).execute()
-                # Delete chat
-                self.supabase.table("chats").delete().eq("id", chat_id).execute()
-                # print(f"✅ Chat {chat_id} deleted from Supabase")
-            except Exception as e:
-                # print(f"⚠️  Error deleting chat from Supabase: {e}")
-                pass
-        
-        # Delete from Redis
-        if cache_service.redis_available:
-            try:
-                cache_service.delete_chat(chat_id)
-                cache_service.delete_messages(chat_id)
-                if wallet_address:
-                    cache_service.remove_chat_from_list(agent_id, wallet_address, chat_id)
-                
-                # Also remove from global agent chat list
-                agent_chat_list_key = f"agent:chats:{agent_id}"
-                agent_chat_ids = cache_service.get(agent_chat_list_key, [])
-                if chat_id in agent_chat_ids:
-                    agent_chat_ids.remove(chat_id)
-                    cache_service.set(agent_chat_list_key, agent_chat_ids, ttl_seconds=None)
-                
-                # print(f"✅ Chat {chat_id} deleted from Redis")
-            except Exception as e:
-                # print(f"❌ Error deleting chat from Redis: {e}")
-                pass
-        
-        # Delete from in-memory storage
-        AgentService._in_memory_chats.pop(chat_id, None)
-        AgentService._in_memory_messages.pop(chat_id, None)
+        await self._delete_chats(chat.agent_id, wallet_address, [chat_id])
     
     async def delete_agent(self, agent_id: str, wallet_address: str) -> bool:
         """Delete an agent/LLM configuration and all associated chats"""
@@ -554,41 +476,79 @@ class AgentService:
         if not agent:
             raise Exception(f"Agent {agent_id} not found or unauthorized")
         
-        # Delete all associated chats first (complete cleanup)
-        # delete_chat already handles memory cleanup, so we just need to delete chats
-        chats = await self.get_agent_chats(agent_id, wallet_address)
-        
-        # Delete all chats (delete_chat handles memory cleanup, Redis, Supabase, and in-memory)
-        for chat in chats:
-            try:
-                await self.delete_chat(chat.id, wallet_address)
-            except Exception as e:
-                # print(f"⚠️  Error deleting chat {chat.id}: {e}")
-                pass
-        
-        # Delete from Supabase
-        if self.supabase:
-            try:
-                # Chats are already handled above, just delete agent
-                self.supabase.table("agents").delete().eq("id", agent_id).eq("user_wallet", wallet_address).execute()
-                # print(f"✅ Agent {agent_id} deleted from Supabase")
-            except Exception as e:
-                # print(f"⚠️  Error deleting agent from Supabase: {e}")
-                pass
-        
-        # Delete from Redis
-        if wallet_address and cache_service.redis_available:
-            try:
-                agents = cache_service.get_user_agents(wallet_address)
-                agents = [a for a in agents if a.get("id") != agent_id]
-                cache_service.set_user_agents(wallet_address, agents)
-                # print(f"✅ Agent {agent_id} deleted from Redis")
-            except Exception as e:
-                # print(f"❌ Error deleting agent from Redis: {e}")
-                pass
-        
-        # Delete from in-memory storage
-        AgentService._in_memory_agents.pop(agent_id, None)
-        
+        await self._remove_agent_record(agent_id, wallet_address)
+        await self._delete_agent_chats(agent_id, wallet_address)
         return True
+    
+    async def start_agent_deletion(self, agent_id: str, wallet_address: str) -> dict:
+        """
+        Delete an agent in the background (for agents with many chats)
+        The agent disappears from listings right away; its chats are deleted by a
+        background task whose progress is available from get_deletion_job
+        Returns:
+            The job status (job_id, status, chats_total, chats_deleted, ...)
+        Raises:
+            Exception: If the agent doesn't exist or belongs to another wallet
+        """
+        agent = await self.get_agent(agent_id, wallet_address)
+        if not agent:
+            raise Exception(f"Agent {agent_id} not found or unauthorized")
+        
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "agent_id": agent_id,
+            "user_wallet": wallet_address,
+            "status": "running",
+            "chats_total": None,
+            "chats_deleted": 0,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+        }
+        await self._save_deletion_job(job)
+        await self._remove_agent_record(agent_id, wallet_address)
+        task = asyncio.create_task(self._run_deletion_job(job))
+        # Hold a reference so the task isn't garbage collected mid-run
+        AgentService._deletion_tasks.add(task)
+        task.add_done_callback(AgentService._deletion_tasks.discard)
+        return dict(job)
+    
+    async def _run_deletion_job(self, job: dict):
+        try:
+            await self._delete_agent_chats(job["agent_id"], job["user_wallet"], job)
+            job["status"] = "completed"
+        except Exception as e:
+            print(f"Error deleting agent {job['agent_id']}: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        job["finished_at"] = datetime.now().isoformat()
+        await self._save_deletion_job(job)
+    
+    @staticmethod
+    async def _save_deletion_job(job: dict):
+        """Publish a deletion job's status to every worker (kept for DELETION_JOB_TTL_SECONDS)"""
+        if not await cache_service.aset(f"deletion_job:{job['job_id']}", job, ttl_seconds=settings.DELETION_JOB_TTL_SECONDS):
+            print(f"⚠️  Could not save status of deletion job {job['job_id']}")
+    
+    async def get_deletion_job(self, job_id: str, wallet_address: Optional[str]) -> Optional[dict]:
+        """Status of a background deletion started by this wallet (None if unknown or expired)"""
+        job = await cache_service.aget(f"deletion_job:{job_id}")
+        if not isinstance(job, dict) or job.get("user_wallet") != wallet_address:
+            return None
+        return job
+    
+    async def _remove_agent_record(self, agent_id: str, wallet_address: str):
+        """Delete the agent itself (ownership already verified), so it leaves listings immediately"""
+        await AgentService._agents.delete(agent_id, wallet_address)
+        self._forget_agent_config(agent_id, wallet_address)
+    
+    async def _delete_agent_chats(self, agent_id: str, wallet_address: str, job: Optional[dict] = None):
+        """Delete every chat of an agent (complete cleanup)"""
+        # Chat IDs only - summaries skip reading every chat's messages
+        chats, _ = await self.get_agent_chats_page(agent_id, wallet_address, summary=True)
+        chat_ids = [chat.id for chat in chats]
+        if job is not None:
+            job["chats_total"] = len(chat_ids)
+            await self._save_deletion_job(job)
+        await self._delete_chats(agent_id, wallet_address, chat_ids, job)
 
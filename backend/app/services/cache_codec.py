@@ -0,0 +1,221 @@
+"""
+Serialization codec for values stored in Redis
+
+Plain JSON is still the default wire format, encoded with orjson when it is
+installed (several times faster than the json module; the output is
+JSON-compatible with what older versions wrote, though spacing differs).
+Two optional formats, compression only when CACHE_COMPRESSION opts in, are
+marked with a short type tag so readers know how to decode them without
+guessing:
+
+    ~1m:<base64 msgpack>          CACHE_CODEC=msgpack
+    ~1z:<base64 zstd(JSON)>       payloads >= CACHE_COMPRESS_MIN_BYTES
+    ~1mz:<base64 zstd(msgpack)>
+
+Untagged values are read exactly as before (JSON, falling back to the raw
+string), so keys written by older deployments keep working. Binary payloads
+are base64 encoded because the Upstash REST API only carries text.
+
+Environment:
+    CACHE_CODEC: auto (default, orjson if installed), json, orjson or msgpack
+    CACHE_COMPRESSION: none (default), zstd, or auto (zstd if installed)
+    CACHE_COMPRESS_MIN_BYTES: smallest payload worth compressing (default 1024)
+    CACHE_ZSTD_LEVEL: zstd compression level (default 3)
+"""
+from typing import Any, Callable, Optional
+import base64
+import json
+import os
+import threading
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None  # type: ignore
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None  # type: ignore
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None  # type: ignore
+    ZSTD_AVAILABLE = False
+
+TAG_PREFIX = "~1"
+TAG_MSGPACK = "m"
+TAG_ZSTD_JSON = "z"
+TAG_ZSTD_MSGPACK = "mz"
+
+_NOT_TAGGED = object()
+
+
+class CacheCodec:
+    """
+    Encodes Python values to Redis strings and back
+
+    Args:
+        format: 'json', 'orjson' or 'msgpack' (missing libraries fall back to json)
+        compression: 'zstd' or 'none'
+        compress_min_bytes: Only compress payloads at least this large
+        zstd_level: zstd compression level
+    """
+
+    def __init__(
+        self,
+        format: str = "orjson",
+        compression: str = "none",
+        compress_min_bytes: int = 1024,
+        zstd_level: int = 3
+    ):
+        if format == "msgpack" and not MSGPACK_AVAILABLE:
+            print("⚠️  msgpack not installed, cache codec falling back to JSON")
+            format = "orjson"
+        if format == "orjson" and not ORJSON_AVAILABLE:
+            format = "json"
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            print("⚠️  zstandard not installed, cache values will not be compressed")
+            compression = "none"
+        self.format = format
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.zstd_level = zstd_level
+        self._local = threading.local()  # zstd (de)compressors are not thread-safe
+        self._dumps: Callable[[Any], str] = self._orjson_dumps if format == "orjson" else json.dumps
+        self._loads: Callable[[Any], Any] = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+    @classmethod
+    def from_env(cls) -> "CacheCodec":
+        """Create a codec configured from CACHE_* environment variables"""
+        format = os.getenv("CACHE_CODEC", "auto").lower()
+        if format == "auto":
+            format = "orjson"
+        compression = os.getenv("CACHE_COMPRESSION", "none").lower()
+        if compression == "auto":
+            compression = "zstd" if ZSTD_AVAILABLE else "none"
+        return cls(
+            format=format,
+            compression=compression,
+            compress_min_bytes=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024")),
+            zstd_level=int(os.getenv("CACHE_ZSTD_LEVEL", "3"))
+        )
+
+    def describe(self) -> str:
+        if self.compression == "none":
+            return self.format
+        return f"{self.format}+{self.compression}>={self.compress_min_bytes}B"
+
+    # ============================================
+    # Encoding
+    # ============================================
+
+    def encode(self, value: Any) -> str:
+        """
+        Encode a value for Redis
+        Args:
+            value: Any JSON-serializable value
+        Returns:
+            Plain JSON text, or a tagged msgpack/compressed payload
+        """
+        if self.format == "msgpack":
+            payload = self._msgpack_dumps(value)
+            if payload is not None:
+                return self._pack(payload, TAG_MSGPACK, TAG_ZSTD_MSGPACK)
+        text = self._dumps(value)
+        if self.compression == "zstd" and len(text) >= self.compress_min_bytes:
+            return self._pack(text.encode("utf-8"), None, TAG_ZSTD_JSON) or text
+        return text
+
+    def _pack(self, payload: bytes, plain_tag: Optional[str], zstd_tag: str) -> Optional[str]:
+        """Tag (and maybe compress) a binary payload; None means 'store the JSON text as is'"""
+        if self.compression == "zstd" and len(payload) >= self.compress_min_bytes:
+            compressed = self._compressor().compress(payload)
+            # Compression doesn't pay for itself on incompressible data
+            if len(compressed) < len(payload):
+                return self._tagged(zstd_tag, compressed)
+        if plain_tag is None:
+            return None
+        return self._tagged(plain_tag, payload)
+
+    @staticmethod
+    def _tagged(tag: str, payload: bytes) -> str:
+        return f"{TAG_PREFIX}{tag}:{base64.b64encode(payload).decode('ascii')}"
+
+    @staticmethod
+    def _orjson_dumps(value: Any) -> str:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # e.g. integers wider than 64 bits - the json module copes
+            return json.dumps(value)
+
+    @staticmethod
+    def _msgpack_dumps(value: Any) -> Optional[bytes]:
+        try:
+            return msgpack.packb(value, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+    # ============================================
+    # Decoding
+    # ============================================
+
+    def decode(self, value: Any) -> Any:
+        """
+        Parse a raw Redis value back into a Python object
+        Args:
+            value: Raw value (bytes, str or an already-decoded scalar)
+        Returns:
+            Decoded value; untagged strings that aren't JSON are returned as is
+        """
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        if not isinstance(value, str):
+            return value
+        if value.startswith(TAG_PREFIX):
+            decoded = self._decode_tagged(value)
+            if decoded is not _NOT_TAGGED:
+                return decoded
+        try:
+            return self._loads(value)
+        except ValueError:
+            # json and orjson decode errors are both ValueErrors
+            return value
+
+    def _decode_tagged(self, value: str) -> Any:
+        tag, sep, body = value[len(TAG_PREFIX):].partition(":")
+        if not sep or tag not in (TAG_MSGPACK, TAG_ZSTD_JSON, TAG_ZSTD_MSGPACK):
+            return _NOT_TAGGED
+        payload = base64.b64decode(body)
+        if tag in (TAG_ZSTD_JSON, TAG_ZSTD_MSGPACK):
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("Cached value is zstd-compressed but zstandard is not installed")
+            payload = self._decompressor().decompress(payload)
+        if tag == TAG_ZSTD_JSON:
+            return self._loads(payload)
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("Cached value is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+    def is_ambiguous(self, text: str) -> bool:
+        """True if a raw string would be mistaken for a tagged payload on read"""
+        return text.startswith(TAG_PREFIX)
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.zstd_level)
+        return compressor
+
+    def _decompressor(self):
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
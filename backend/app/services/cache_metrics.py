@@ -0,0 +1,297 @@
+"""
+Per-key-family cache instrumentation
+
+Keys are grouped into families by prefix (`chat`, `messages`,
+`user:agents`, ...) and each family keeps counters for calls per command,
+hits, misses and errors, the size of values read and written, and a
+latency histogram. CacheService only records into a CacheMetrics instance
+when CACHE_METRICS_ENABLED=true; when it is off the hot paths do nothing
+beyond a None check.
+
+Sizes are measured on the stored (encoded) text, in characters, so they
+track what actually crosses the wire; values from the in-memory fallback
+have no encoded form and are not sized.
+
+Environment:
+    CACHE_METRICS_ENABLED: true to record metrics (default false)
+    CACHE_METRICS_FAMILIES: comma-separated key prefixes to group by, most
+        specific first (keys matching none are grouped by their first segment)
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+
+DEFAULT_FAMILIES = (
+    "user:agents,user:preferences,agent:chats,chats:agent,"
+    "capsules:wallet,capsules,capsule,marketplace,messages,chat,lock,cache:l1"
+)
+
+# Upper bounds, in milliseconds / characters; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+READ_COMMANDS = ("get", "lrange", "hgetall", "hmget")
+WRITE_COMMANDS = ("set", "rpush", "hset")
+
+
+def raw_size(value: Any) -> Optional[int]:
+    """Encoded size of a raw Redis reply or payload (None if it isn't text)"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        return None
+    return sum(len(item) for item in value if isinstance(item, (str, bytes)))
+
+
+def is_hit(command: str, result: Any) -> Optional[bool]:
+    """Whether a read command found something (None for commands that aren't lookups)"""
+    if command not in READ_COMMANDS:
+        return None
+    if command == "hmget":
+        return result is not None and any(item is not None for item in result)
+    return bool(result) if command in ("lrange", "hgetall") else result is not None
+
+
+class _FamilyStats:
+    __slots__ = (
+        "calls", "hits", "misses", "errors",
+        "bytes_read", "bytes_written", "max_value_bytes", "sizes",
+        "latency", "latency_count", "latency_sum",
+    )
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.max_value_bytes = 0
+        self.sizes = [0] * (len(SIZE_BUCKETS) + 1)
+        self.latency = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_count = 0
+        self.latency_sum = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "calls": dict(self.calls),
+            "total_calls": sum(self.calls.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "errors": self.errors,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "max_value_bytes": self.max_value_bytes,
+            "value_sizes": _buckets(SIZE_BUCKETS, self.sizes, ""),
+            "latency_ms": {
+                "count": self.latency_count,
+                "mean": round(self.latency_sum * 1000 / self.latency_count, 3) if self.latency_count else None,
+                "p50": _percentile(self.latency, self.latency_count, 0.50),
+                "p95": _percentile(self.latency, self.latency_count, 0.95),
+                "p99": _percentile(self.latency, self.latency_count, 0.99),
+                "buckets": _buckets(LATENCY_BUCKETS_MS, self.latency, "ms"),
+            },
+        }
+
+
+def _buckets(bounds: Sequence[float], counts: List[int], unit: str) -> Dict[str, int]:
+    labels = [f"<={bound}{unit}" for bound in bounds] + [f">{bounds[-1]}{unit}"]
+    return {label: count for label, count in zip(labels, counts) if count}
+
+
+def _percentile(counts: List[int], total: int, quantile: float) -> Optional[float]:
+    """Upper bound of the bucket holding the quantile (None past the last bound)"""
+    if not total:
+        return None
+    rank = quantile * total
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+class CacheMetrics:
+    """
+    Thread-safe counters and histograms per key family
+
+    Args:
+        families: Key prefixes to group by, checked in order
+    """
+
+    def __init__(self, families: Sequence[str] = tuple(DEFAULT_FAMILIES.split(","))):
+        self.families: Tuple[str, ...] = tuple(families)
+        self._stats: Dict[str, _FamilyStats] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    @classmethod
+    def from_env(cls) -> Optional["CacheMetrics"]:
+        """A CacheMetrics configured from CACHE_METRICS_* variables, or None when disabled"""
+        if os.getenv("CACHE_METRICS_ENABLED", "false").lower() != "true":
+            return None
+        families = os.getenv("CACHE_METRICS_FAMILIES", DEFAULT_FAMILIES)
+        return cls(tuple(f.strip() for f in families.split(",") if f.strip()))
+
+    def family(self, key: str) -> str:
+        """The family a key is counted under"""
+        for prefix in self.families:
+            if key.startswith(prefix) and (len(key) == len(prefix) or key[len(prefix)] == ":"):
+                return prefix
+        return key.split(":", 1)[0]
+
+    def record(
+        self,
+        command: str,
+        key: str,
+        seconds: Optional[float] = None,
+        hit: Optional[bool] = None,
+        size: Optional[int] = None,
+        error: bool = False
+    ):
+        """
+        Record one cache call
+        Args:
+            command: Command name (get, set, hgetall, ...)
+            key: Key it touched
+            seconds: Latency to add to the family's histogram (None = not timed)
+            hit: True/False for lookups, None for other commands
+            size: Encoded size of the value read or written
+            error: The call failed
+        """
+        family = self.family(key)
+        with self._lock:
+            self._observe(self._family_stats(family), command, seconds, hit, size, error)
+
+    def record_many(
+        self,
+        command: str,
+        values: Dict[str, Any],
+        seconds: float,
+        missing: Any = None,
+        sized: bool = True,
+        error: bool = False
+    ):
+        """
+        Record a multi-key lookup (MGET); its latency is added once per family involved
+        Args:
+            command: Command name
+            values: Raw value per key
+            seconds: Round-trip time of the whole call
+            missing: The value that marks a key as not found
+            sized: Values are encoded replies whose size can be measured
+            error: The call failed
+        """
+        with self._lock:
+            timed = set()
+            for key, value in values.items():
+                family = self.family(key)
+                found = value is not missing
+                self._observe(
+                    self._family_stats(family),
+                    command,
+                    None if family in timed else seconds,
+                    None if error else found,
+                    raw_size(value) if sized and found and not error else None,
+                    error and family not in timed
+                )
+                timed.add(family)
+
+    def record_pipeline(
+        self,
+        commands: Sequence[Tuple[str, tuple]],
+        seconds: float,
+        results: Sequence[Any] = (),
+        sizes: Optional[Dict[int, int]] = None,
+        error: bool = False
+    ):
+        """
+        Record a pipeline's commands; its latency is added once per family involved
+        Args:
+            commands: Queued (command, args) pairs
+            seconds: Round-trip time of the whole pipeline
+            results: Decoded results, one per command (empty on failure)
+            sizes: Encoded size by command index, where known
+            error: The pipeline failed
+        """
+        sizes = sizes or {}
+        with self._lock:
+            timed = set()
+            for index, (command, args) in enumerate(commands):
+                if not args:
+                    continue
+                family = self.family(args[0])
+                result = results[index] if index < len(results) else None
+                self._observe(
+                    self._family_stats(family),
+                    command,
+                    None if family in timed else seconds,
+                    None if error else is_hit(command, result),
+                    sizes.get(index),
+                    error and family not in timed
+                )
+                timed.add(family)
+
+    def _family_stats(self, family: str) -> _FamilyStats:
+        stats = self._stats.get(family)
+        if stats is None:
+            stats = self._stats[family] = _FamilyStats()
+        return stats
+
+    @staticmethod
+    def _observe(
+        stats: _FamilyStats,
+        command: str,
+        seconds: Optional[float],
+        hit: Optional[bool],
+        size: Optional[int],
+        error: bool
+    ):
+        stats.calls[command] = stats.calls.get(command, 0) + 1
+        if hit is True:
+            stats.hits += 1
+        elif hit is False:
+            stats.misses += 1
+        if error:
+            stats.errors += 1
+        if size is not None:
+            if command in WRITE_COMMANDS:
+                stats.bytes_written += size
+            else:
+                stats.bytes_read += size
+            stats.max_value_bytes = max(stats.max_value_bytes, size)
+            stats.sizes[bisect_left(SIZE_BUCKETS, size)] += 1
+        if seconds is not None:
+            stats.latency[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+            stats.latency_count += 1
+            stats.latency_sum += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All families' counters plus totals, as plain JSON-friendly dicts"""
+        with self._lock:
+            families = {family: stats.snapshot() for family, stats in sorted(self._stats.items())}
+        totals = {
+            field: sum(stats[field] for stats in families.values())
+            for field in ("total_calls", "hits", "misses", "errors", "bytes_read", "bytes_written")
+        }
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_ratio"] = round(totals["hits"] / lookups, 4) if lookups else None
+        return {
+            "enabled": True,
+            "since": self.started_at,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "totals": totals,
+            "families": families,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started_at = time.time()
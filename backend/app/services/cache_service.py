@@ -13,23 +13,342 @@ Setup:
    OR
    - UPSTASH_REDIS_REST_URL
    - UPSTASH_REDIS_REST_TOKEN
+   OR, for a local/standard Redis over TCP (pip install redis)
+   - REDIS_URL=redis://localhost:6379/0
+
+Every primitive has a blocking form (get, set, pipeline, ...) and an
+awaitable form (aget, aset, apipeline, ...). Request handlers use the
+awaitable forms, which go through a pooled async client so a slow Redis
+call never blocks the event loop. The chat/agent/preferences helpers are
+coroutines built on those.
 """
-from typing import Optional, Any
+from typing import Optional, Any, Awaitable, Callable, Dict, Iterable, List, Set, Tuple
 import json
 import os
-from datetime import timedelta
-
-try:
-    from upstash_redis import Redis
-    REDIS_AVAILABLE = True
-except ImportError:
-    Redis = None  # type: ignore
-    REDIS_AVAILABLE = False
+import time
+from datetime import datetime, timedelta
+
+from app.services.cache_codec import CacheCodec
+from app.services.cache_metrics import READ_COMMANDS, CacheMetrics, raw_size
+from app.services.local_cache import InMemoryStore, LocalCache
+from app.services.single_flight import DistributedLock, SingleFlight, wait_for_value
+from app.services.redis_clients import (
+    UPSTASH_AVAILABLE, REDIS_PY_AVAILABLE,
+    resolve_redis_config, create_sync_client, create_async_client
+)
+
+REDIS_AVAILABLE = UPSTASH_AVAILABLE or REDIS_PY_AVAILABLE
+if not REDIS_AVAILABLE:
     print("⚠️  upstash-redis not installed. Install with: pip install upstash-redis")
     print("⚠️  Cache service will use in-memory storage only.")
 
-# Fallback in-memory cache if KV is not available
-_in_memory_cache: dict = {}
+
+# Optional in-process L1 tier in front of Redis (see CacheService._init_l1)
+L1_VERSIONS_KEY = "cache:l1:versions"
+L1_DEFAULT_PREFIXES = "user:agents:,user:preferences:"
+_MISSING = object()
+
+
+class CacheError(Exception):
+    """A Redis command failed (as opposed to a key simply not existing)"""
+
+
+def chat_activity_score(when: Optional[datetime] = None) -> float:
+    """Sorted-set score for a chat's last activity (epoch milliseconds)"""
+    return float(int((when or datetime.now()).timestamp() * 1000))
+
+
+def encode_chat_cursor(score: float, chat_id: str) -> str:
+    """Opaque pagination cursor pointing just past (score, chat_id)"""
+    return f"{int(score)}:{chat_id}"
+
+
+def decode_chat_cursor(cursor: Optional[str]) -> Tuple[Any, Optional[str]]:
+    """
+    Parse a chat list cursor
+    Returns:
+        (max score for ZREVRANGEBYSCORE, chat ID to resume after) - ("+inf", None) for no cursor
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return "+inf", None
+    score, sep, chat_id = cursor.partition(":")
+    if not sep or not chat_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return float(int(score)), chat_id
+
+
+def _score_pairs(value: Any) -> List[Tuple[str, float]]:
+    """Normalize a WITHSCORES reply (pairs or a flat member/score list) to [(member, score)]"""
+    if not value:
+        return []
+    if isinstance(value[0], (list, tuple)):
+        return [(member, float(score)) for member, score in value]
+    it = iter(value)
+    return [(member, float(score)) for member, score in zip(it, it)]
+
+
+class CachePipeline:
+    """
+    Buffers cache commands and sends them to Redis in a single round trip
+    (Upstash pipeline, or MULTI/EXEC when transaction=True).
+    Against the in-memory fallback the commands are simply applied in order
+    to the service's InMemoryStore.
+    """
+
+    def __init__(self, service: "CacheService", transaction: bool = False):
+        self._service = service
+        self._transaction = transaction
+        self._commands: List[Tuple[str, tuple]] = []
+        self.results: List[Any] = []
+        self.succeeded = False
+        self.error: Optional[Exception] = None
+        self._sizes: Optional[Dict[int, int]] = None  # encoded write sizes, when metrics are on
+
+    def __enter__(self) -> "CachePipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.execute()
+        return False
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def get(self, key: str) -> "CachePipeline":
+        self._commands.append(("get", (key,)))
+        return self
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> "CachePipeline":
+        self._commands.append(("set", (key, value, ttl_seconds)))
+        return self
+
+    def delete(self, *keys: str) -> "CachePipeline":
+        if keys:
+            self._commands.append(("delete", keys))
+        return self
+
+    def rpush(self, key: str, *values: Any) -> "CachePipeline":
+        if values:
+            self._commands.append(("rpush", (key, *values)))
+        return self
+
+    def lrange(self, key: str, start: int, stop: int) -> "CachePipeline":
+        self._commands.append(("lrange", (key, start, stop)))
+        return self
+
+    def llen(self, key: str) -> "CachePipeline":
+        self._commands.append(("llen", (key,)))
+        return self
+
+    def hset(self, key: str, mapping: Dict[str, Any]) -> "CachePipeline":
+        """Queue HSET of several fields (values are JSON-encoded per field)"""
+        if mapping:
+            self._commands.append(("hset", (key, None, None, mapping)))
+        return self
+
+    def hgetall(self, key: str) -> "CachePipeline":
+        self._commands.append(("hgetall", (key,)))
+        return self
+
+    def hmget(self, key: str, *fields: str) -> "CachePipeline":
+        self._commands.append(("hmget", (key, *fields)))
+        return self
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> "CachePipeline":
+        self._commands.append(("hincrby", (key, field, amount)))
+        return self
+
+    def zadd(self, key: str, mapping: Dict[str, float], nx: bool = False, xx: bool = False) -> "CachePipeline":
+        if mapping:
+            self._commands.append(("zadd", (key, mapping, nx, xx)))
+        return self
+
+    def zrem(self, key: str, *members: str) -> "CachePipeline":
+        if members:
+            self._commands.append(("zrem", (key, *members)))
+        return self
+
+    def zcard(self, key: str) -> "CachePipeline":
+        self._commands.append(("zcard", (key,)))
+        return self
+
+    def zrevrangebyscore(
+        self,
+        key: str,
+        max: Any = "+inf",
+        min: Any = "-inf",
+        offset: Optional[int] = None,
+        count: Optional[int] = None
+    ) -> "CachePipeline":
+        """Queue a ZREVRANGEBYSCORE ... WITHSCORES; the result is a list of (member, score)"""
+        if count is not None and offset is None:
+            offset = 0
+        self._commands.append(("zrevrangebyscore", (key, max, min, True, offset, count)))
+        return self
+
+    def execute(self) -> List[Any]:
+        """
+        Send all queued commands
+        Returns:
+            One result per queued command (GET/LRANGE results are deserialized)
+        """
+        commands, self._commands = self._commands, []
+        if not commands:
+            self.succeeded = True
+            return self.results
+        service = self._service
+        started = time.perf_counter() if service.metrics else 0.0
+        try:
+            if service.redis_available and service.redis:
+                pipe = service.redis.multi() if self._transaction else service.redis.pipeline()
+                families = self._queue(pipe, commands)
+                self._finish(commands, families, pipe.exec())
+            else:
+                self.results = [self._apply_in_memory(name, args) for name, args in commands]
+            self._succeed()
+        except Exception as e:
+            self._fail(commands, e)
+        if service.metrics:
+            self._record(commands, started)
+        return self.results
+
+    def _queue(self, pipe: Any, commands: List[Tuple[str, tuple]]) -> Set[str]:
+        """Queue commands on a client pipeline, plus L1 version bumps for written keys"""
+        service = self._service
+        self._sizes = {} if service.metrics else None
+        written = [key for name, args in commands if name in self._WRITE_COMMANDS for key in self._keys_of(name, args)]
+        families = service._l1_invalidate(written)
+        for index, (name, args) in enumerate(commands):
+            if name == "set":
+                key, value, ttl_seconds = args
+                payload = service._serialize(value)
+                pipe.set(key, payload, ex=ttl_seconds or None)
+            elif name == "rpush":
+                payload = [service._serialize(value) for value in args[1:]]
+                pipe.rpush(args[0], *payload)
+            elif name == "hset":
+                payload = service._encode_fields(args[3])
+                pipe.hset(args[0], values=payload)
+            else:
+                getattr(pipe, name)(*args)
+                continue
+            if self._sizes is not None:
+                self._sizes[index] = raw_size(payload)
+        for family in families:
+            pipe.hincrby(L1_VERSIONS_KEY, family, 1)
+        return families
+
+    def _finish(self, commands: List[Tuple[str, tuple]], families: Set[str], raw: List[Any]):
+        self._service._l1_bump_versions(families, raw[len(commands):])
+        if self._sizes is not None:
+            for index, (name, _) in enumerate(commands):
+                if name in READ_COMMANDS and raw[index] is not None:
+                    self._sizes[index] = raw_size(raw[index])
+        self.results = [
+            self._decode_result(name, value)
+            for (name, _), value in zip(commands, raw)
+        ]
+
+    def _succeed(self):
+        self.succeeded = True
+        self.error = None
+
+    def _fail(self, commands: List[Tuple[str, tuple]], error: Exception):
+        if not self._service._is_wrong_type(error):
+            print(f"Error executing cache pipeline ({len(commands)} commands): {error}")
+        self.results = []
+        self.succeeded = False
+        self.error = error
+
+    def _record(self, commands: List[Tuple[str, tuple]], started: float):
+        self._service.metrics.record_pipeline(
+            commands,
+            time.perf_counter() - started,
+            self.results,
+            self._sizes,
+            error=not self.succeeded
+        )
+
+    # Writes that can change what a GET (the only read L1 serves) returns;
+    # hash, list and sorted-set updates don't need a version bump
+    _WRITE_COMMANDS = ("set", "delete")
+
+    @staticmethod
+    def _keys_of(name: str, args: tuple) -> tuple:
+        return args if name == "delete" else args[:1]
+
+    def _decode_result(self, name: str, value: Any) -> Any:
+        if value is None:
+            return None
+        if name == "get":
+            return self._service._deserialize(value)
+        if name == "lrange":
+            return [self._service._deserialize(item) for item in value]
+        if name == "hgetall":
+            return self._service._decode_fields(value)
+        if name == "hmget":
+            return [None if item is None else self._service._decode_field(item) for item in value]
+        if name == "zrevrangebyscore":
+            return _score_pairs(value)
+        return value
+
+    _MEMORY_COMMANDS = (
+        "get", "set", "delete", "rpush", "lrange", "llen",
+        "hset", "hgetall", "hmget", "hincrby",
+        "zadd", "zrem", "zcard", "zrevrangebyscore"
+    )
+
+    def _apply_in_memory(self, name: str, args: tuple) -> Any:
+        if name not in self._MEMORY_COMMANDS:
+            raise ValueError(f"Unsupported pipeline command: {name}")
+        return getattr(self._service.memory_store, name)(*args)
+
+
+class AsyncCachePipeline(CachePipeline):
+    """
+    Awaitable CachePipeline that sends its commands through the pooled async client
+
+    Usage:
+        async with cache_service.apipeline() as pipe:
+            pipe.set("a", 1)
+        pipe.results
+    """
+
+    async def __aenter__(self) -> "AsyncCachePipeline":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            await self.execute()
+        return False
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' for AsyncCachePipeline")
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        if not commands:
+            self.succeeded = True
+            return self.results
+        service = self._service
+        started = time.perf_counter() if service.metrics else 0.0
+        try:
+            client = service._async_client()
+            if client is not None:
+                pipe = client.multi() if self._transaction else client.pipeline()
+                families = self._queue(pipe, commands)
+                self._finish(commands, families, await pipe.exec())
+            else:
+                self.results = [self._apply_in_memory(name, args) for name, args in commands]
+            self._succeed()
+        except Exception as e:
+            self._fail(commands, e)
+        if service.metrics:
+            self._record(commands, started)
+        return self.results
 
 
 class CacheService:
@@ -39,10 +358,42 @@ class CacheService:
     """
     
     def __init__(self):
-        self.redis: Optional[Redis] = None
+        self.redis: Optional[Any] = None
+        self.transport: Optional[str] = None
+        self._redis_url: Optional[str] = None
+        self._redis_token: Optional[str] = None
+        self._aredis: Optional[Any] = None
         self.redis_available = REDIS_AVAILABLE and self._init_redis()
         if not self.redis_available:
             print("⚠️  Vercel KV/Redis not available. Using in-memory cache (data lost on restart).")
+        
+        # Bounded, TTL-aware fallback used whenever Redis is unavailable
+        self.memory_store = InMemoryStore.from_env()
+        self.codec = CacheCodec.from_env()
+        # Per-key-family hit/miss/latency counters (None = disabled, no overhead)
+        self.metrics: Optional[CacheMetrics] = CacheMetrics.from_env()
+        
+        # Cache-miss loaders: coalesced in-process, and across workers with a Redis lock
+        self._flight = SingleFlight()
+        self._distributed_locks = os.getenv("CACHE_LOADER_LOCKS", "true").lower() == "true"
+        self._lock_wait_seconds = float(os.getenv("CACHE_LOADER_LOCK_WAIT_SECONDS", "5"))
+        
+        # Short-lived record of lookups that found nothing (see is_known_missing)
+        negative_ttl = float(os.getenv("CACHE_NEGATIVE_TTL_SECONDS", "30"))
+        self.negative: Optional[LocalCache] = None
+        if negative_ttl > 0:
+            self.negative = LocalCache(
+                max_entries=int(os.getenv("CACHE_NEGATIVE_MAX_ENTRIES", "10000")),
+                ttl_seconds=negative_ttl
+            )
+        
+        self.l1: Optional[LocalCache] = None
+        self._l1_prefixes: Tuple[str, ...] = ()
+        self._l1_versions: Dict[str, int] = {}
+        self._l1_checked_at = 0.0
+        self._l1_check_interval = 1.0
+        if self.redis_available and os.getenv("CACHE_L1_ENABLED", "false").lower() == "true":
+            self._init_l1()
     
     def _init_redis(self) -> bool:
         """Initialize Redis connection"""
@@ -50,33 +401,217 @@ class CacheService:
             if not REDIS_AVAILABLE:
                 return False
             
-            # Check for Vercel KV environment variables (try all possible names)
-            url = (
-                os.getenv('KV_REST_API_URL') or 
-                os.getenv('KV_URL') or 
-                os.getenv('REDIS_URL') or 
-                os.getenv('UPSTASH_REDIS_REST_URL')
-            )
-            token = (
-                os.getenv('KV_REST_API_TOKEN') or 
-                os.getenv('UPSTASH_REDIS_REST_TOKEN')
-            )
-            
-            if not url or not token:
-                print("⚠️  Redis credentials not found. Set KV_REST_API_URL and KV_REST_API_TOKEN")
+            transport, url, token = resolve_redis_config()
+            if not transport:
+                print("⚠️  Redis credentials not found. Set KV_REST_API_URL and KV_REST_API_TOKEN (or REDIS_URL)")
                 return False
             
-            # Initialize Redis client
-            self.redis = Redis(url=url, token=token)
+            # Initialize Redis client (the async client is created lazily on first use)
+            self.redis = create_sync_client(transport, url, token)
+            self.transport, self._redis_url, self._redis_token = transport, url, token
             
             # Test connection
             self.redis.ping()
-            print("✅ Vercel KV (Redis) connected successfully")
+            print(f"✅ Vercel KV (Redis) connected successfully ({transport})")
             return True
         except Exception as e:
             print(f"⚠️  Redis connection failed: {e}")
             return False
-    
+
+    def _async_client(self) -> Optional[Any]:
+        """Pooled async client (created on first use), or None when Redis is unavailable"""
+        if not (self.redis_available and self.transport):
+            return None
+        if self._aredis is None:
+            self._aredis = create_async_client(self.transport, self._redis_url, self._redis_token)
+        return self._aredis
+
+    async def aclose(self):
+        """Close the async client's connection pool (call on application shutdown)"""
+        client, self._aredis = self._aredis, None
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as e:
+                print(f"Error closing async Redis client: {e}")
+
+    def _init_l1(self):
+        """
+        Enable the in-process L1 tier (bounded LRU with TTL) in front of Redis
+
+        Only string values (GET) under CACHE_L1_PREFIXES are cached locally;
+        hashes, lists and sorted sets always go to Redis. Every SET or DELETE of
+        such a key bumps a per-prefix version stamp in Redis (in the same
+        pipeline as the write), and each worker re-reads the stamps at most
+        every CACHE_L1_VERSION_CHECK_SECONDS. Entries filled under an older
+        stamp are dropped, so workers stay coherent within that interval.
+
+        Environment:
+            CACHE_L1_MAX_ENTRIES (default 2048)
+            CACHE_L1_TTL_SECONDS (default 30)
+            CACHE_L1_PREFIXES (comma-separated, default user:agents:,user:preferences:)
+            CACHE_L1_VERSION_CHECK_SECONDS (default 1)
+        """
+        self.l1 = LocalCache(
+            max_entries=int(os.getenv("CACHE_L1_MAX_ENTRIES", "2048")),
+            ttl_seconds=float(os.getenv("CACHE_L1_TTL_SECONDS", "30")),
+        )
+        prefixes = os.getenv("CACHE_L1_PREFIXES", L1_DEFAULT_PREFIXES)
+        self._l1_prefixes = tuple(p.strip() for p in prefixes.split(",") if p.strip())
+        self._l1_check_interval = float(os.getenv("CACHE_L1_VERSION_CHECK_SECONDS", "1"))
+        print(f"✅ L1 cache enabled ({self.l1.max_entries} entries, prefixes: {', '.join(self._l1_prefixes)})")
+
+    def _l1_family(self, key: str) -> Optional[str]:
+        """The L1 prefix a key belongs to, or None if it isn't cached locally"""
+        if self.l1 is None:
+            return None
+        for prefix in self._l1_prefixes:
+            if key.startswith(prefix):
+                return prefix
+        return None
+
+    def _l1_versions_due(self) -> bool:
+        """True if the shared version stamps should be re-read now"""
+        if self.l1 is None:
+            return False
+        now = time.monotonic()
+        if now - self._l1_checked_at < self._l1_check_interval:
+            return False
+        self._l1_checked_at = now
+        return True
+
+    def _l1_apply_versions(self, versions: Optional[dict]):
+        for family, version in (versions or {}).items():
+            version = int(version)
+            if version > self._l1_versions.get(family, 0):
+                self._l1_versions[family] = version
+
+    def _l1_versions_failed(self, error: Exception):
+        # Can't confirm freshness - drop everything rather than serve stale data
+        print(f"Error reading L1 cache versions: {error}")
+        self.l1.clear()
+
+    def _l1_refresh_versions(self):
+        """Re-read the shared version stamps if the check interval has elapsed"""
+        if not self._l1_versions_due():
+            return
+        try:
+            self._l1_apply_versions(self.redis.hgetall(L1_VERSIONS_KEY))
+        except Exception as e:
+            self._l1_versions_failed(e)
+
+    async def _al1_refresh_versions(self, client: Any):
+        """Async form of _l1_refresh_versions"""
+        if not self._l1_versions_due():
+            return
+        try:
+            self._l1_apply_versions(await client.hgetall(L1_VERSIONS_KEY))
+        except Exception as e:
+            self._l1_versions_failed(e)
+
+    def _l1_get(self, key: str) -> Any:
+        """Raw Redis value from L1, or _MISSING (call a refresh first)"""
+        family = self._l1_family(key)
+        if family is None:
+            return _MISSING
+        current = self._l1_versions.get(family, 0)
+        entry = self.l1.get(key, _MISSING, is_valid=lambda stamped: stamped[1] >= current)
+        return _MISSING if entry is _MISSING else entry[0]
+
+    def _l1_stamp(self, key: str) -> Optional[int]:
+        """Version to stamp on a value about to be read from Redis (None = not cached)"""
+        family = self._l1_family(key)
+        if family is None:
+            return None
+        return self._l1_versions.get(family, 0)
+
+    def _l1_put(self, key: str, raw: Any, stamp: Optional[int]):
+        if stamp is not None and raw is not None:
+            self.l1.set(key, (raw, stamp))
+
+    def _l1_invalidate(self, keys: Iterable[str]) -> Set[str]:
+        """Drop keys from L1 and return the prefixes whose version must be bumped"""
+        families = set()
+        if self.l1 is None:
+            return families
+        for key in keys:
+            family = self._l1_family(key)
+            if family is not None:
+                self.l1.delete(key)
+                families.add(family)
+        return families
+
+    def _l1_bump_versions(self, families: Iterable[str], versions: List[Any]):
+        for family, version in zip(families, versions):
+            try:
+                self._l1_versions[family] = max(self._l1_versions.get(family, 0), int(version))
+            except (TypeError, ValueError):
+                pass
+
+    def l1_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and configuration of the in-process L1 tier"""
+        if self.l1 is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "prefixes": list(self._l1_prefixes),
+            "versions": dict(self._l1_versions),
+            **self.l1.stats(),
+        }
+
+    def _record(self, command: str, key: str, started: float, **details):
+        self.metrics.record(command, key, time.perf_counter() - started, **details)
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """
+        Per-key-family cache metrics (hits, misses, errors, value sizes, latency)
+        plus the L1, single-flight and negative-cache counters
+        Returns:
+            {"enabled": False, ...} when CACHE_METRICS_ENABLED is off
+        """
+        snapshot = self.metrics.snapshot() if self.metrics else {"enabled": False}
+        snapshot["backend"] = self.transport if self.redis_available else "memory"
+        snapshot["codec"] = self.codec.describe()
+        snapshot["l1"] = self.l1_stats()
+        snapshot["single_flight"] = self.single_flight_stats()
+        snapshot["negative"] = self.negative.stats() if self.negative is not None else {"enabled": False}
+        return snapshot
+
+    def reset_metrics(self):
+        if self.metrics:
+            self.metrics.reset()
+
+    def _serialize(self, value: Any) -> Any:
+        """Serialize a value for Redis (codec-encoded for anything that isn't a scalar)"""
+        if isinstance(value, str) and self.codec.is_ambiguous(value):
+            # Would read back as a tagged payload - store it JSON-quoted instead
+            return json.dumps(value)
+        if not isinstance(value, (str, int, float, bool)):
+            return self.codec.encode(value)
+        return value
+
+    def _deserialize(self, value: Any) -> Any:
+        """Parse a raw Redis value back into a Python object (tagged or legacy JSON)"""
+        return self.codec.decode(value)
+
+    # Hash fields are small, so each is stored as plain JSON text: types
+    # survive the round trip and integer fields stay HINCRBY-compatible
+    @staticmethod
+    def _encode_fields(mapping: Dict[str, Any]) -> Dict[str, str]:
+        return {field: json.dumps(value) for field, value in mapping.items()}
+
+    def _decode_field(self, value: Any) -> Any:
+        return self.codec.decode(value)
+
+    def _decode_fields(self, value: Any) -> Dict[str, Any]:
+        """Decode an HGETALL reply (dict, or a flat field/value list)"""
+        if not value:
+            return {}
+        if not isinstance(value, dict):
+            it = iter(value)
+            value = dict(zip(it, it))
+        return {field: self._decode_field(item) for field, item in value.items()}
+
     def get(self, key: str, default: Any = None) -> Optional[Any]:
         """
         Get a value from cache
@@ -86,25 +621,29 @@ class CacheService:
         Returns:
             Cached value or default
         """
+        started = time.perf_counter() if self.metrics else 0.0
         try:
             if self.redis_available and self.redis:
-                value = self.redis.get(key)
-                if value is None:
-                    return default
-                # Redis returns bytes or strings, parse if needed
-                if isinstance(value, bytes):
-                    value = value.decode('utf-8')
-                if isinstance(value, str):
-                    try:
-                        return json.loads(value)
-                    except json.JSONDecodeError:
-                        return value
-                return value
+                self._l1_refresh_versions()
+                value = self._l1_get(key)
+                if value is _MISSING:
+                    stamp = self._l1_stamp(key)
+                    value = self.redis.get(key)
+                    self._l1_put(key, value, stamp)
+                result = default if value is None else self._deserialize(value)
+                if self.metrics:
+                    self._record("get", key, started, hit=value is not None, size=raw_size(value))
+                return result
             else:
                 # Fallback to in-memory
-                return _in_memory_cache.get(key, default)
+                value = self.memory_store.get(key, _MISSING)
+                if self.metrics:
+                    self._record("get", key, started, hit=value is not _MISSING)
+                return default if value is _MISSING else value
         except Exception as e:
             print(f"Error getting cache key '{key}': {e}")
+            if self.metrics:
+                self._record("get", key, started, error=True)
             return default
     
     def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> bool:
@@ -117,23 +656,34 @@ class CacheService:
         Returns:
             True if successful, False otherwise
         """
+        started = time.perf_counter() if self.metrics else 0.0
         try:
             if self.redis_available and self.redis:
-                # Serialize value to JSON
-                if not isinstance(value, (str, int, float, bool)):
-                    value = json.dumps(value)
+                if self._l1_family(key) is not None:
+                    # Write and version bump go out together
+                    with self.pipeline() as pipe:
+                        pipe.set(key, value, ttl_seconds)
+                    return pipe.succeeded
+                
+                value = self._serialize(value)
                 
                 if ttl_seconds:
                     self.redis.setex(key, ttl_seconds, value)
                 else:
                     self.redis.set(key, value)
+                if self.metrics:
+                    self._record("set", key, started, size=raw_size(value))
                 return True
             else:
-                # Fallback to in-memory (no TTL support)
-                _in_memory_cache[key] = value
-                return True
+                # Fallback to in-memory (bounded, honors TTL)
+                stored = self.memory_store.set(key, value, ttl_seconds)
+                if self.metrics:
+                    self._record("set", key, started)
+                return stored
         except Exception as e:
             print(f"Error setting cache key '{key}': {e}")
+            if self.metrics:
+                self._record("set", key, started, error=True)
             return False
     
     def delete(self, key: str) -> bool:
@@ -144,17 +694,119 @@ class CacheService:
         Returns:
             True if successful, False otherwise
         """
+        started = time.perf_counter() if self.metrics else 0.0
         try:
             if self.redis_available and self.redis:
+                if self._l1_family(key) is not None:
+                    with self.pipeline() as pipe:
+                        pipe.delete(key)
+                    return pipe.succeeded
                 self.redis.delete(key)
-                return True
             else:
-                _in_memory_cache.pop(key, None)
-                return True
+                self.memory_store.delete(key)
+            if self.metrics:
+                self._record("delete", key, started)
+            return True
         except Exception as e:
             print(f"Error deleting cache key '{key}': {e}")
+            if self.metrics:
+                self._record("delete", key, started, error=True)
             return False
-    
+
+    def get_many(self, keys: Iterable[str], default: Any = None) -> Dict[str, Any]:
+        """
+        Get several values in a single round trip (MGET)
+        Args:
+            keys: Cache keys to fetch
+            default: Value used for keys that don't exist
+        Returns:
+            Dict mapping every requested key to its value (or default)
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        started = time.perf_counter() if self.metrics else 0.0
+        try:
+            if self.redis_available and self.redis:
+                self._l1_refresh_versions()
+                raw = {key: self._l1_get(key) for key in keys}
+                pending = [key for key, value in raw.items() if value is _MISSING]
+                if pending:
+                    stamps = {key: self._l1_stamp(key) for key in pending}
+                    for key, value in zip(pending, self.redis.mget(*pending)):
+                        raw[key] = value
+                        self._l1_put(key, value, stamps[key])
+                result = {
+                    key: default if value is None else self._deserialize(value)
+                    for key, value in raw.items()
+                }
+                if self.metrics:
+                    self.metrics.record_many("mget", raw, time.perf_counter() - started)
+                return result
+            else:
+                raw = {key: self.memory_store.get(key, _MISSING) for key in keys}
+                if self.metrics:
+                    self.metrics.record_many("mget", raw, time.perf_counter() - started, missing=_MISSING, sized=False)
+                return {key: default if value is _MISSING else value for key, value in raw.items()}
+        except Exception as e:
+            print(f"Error getting {len(keys)} cache keys: {e}")
+            if self.metrics:
+                self.metrics.record_many("mget", dict.fromkeys(keys), time.perf_counter() - started, error=True)
+            return {key: default for key in keys}
+
+    def set_many(self, mapping: Dict[str, Any], ttl_seconds: Optional[int] = None) -> bool:
+        """
+        Set several values in a single round trip (pipelined SET)
+        Args:
+            mapping: Dict of cache key -> value
+            ttl_seconds: Time to live applied to every key (None = no expiration)
+        Returns:
+            True if successful, False otherwise
+        """
+        if not mapping:
+            return True
+        with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ttl_seconds)
+        return pipe.succeeded
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """
+        Delete several keys with a single DEL
+        Args:
+            keys: Cache keys to delete
+        Returns:
+            Number of keys deleted
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return 0
+        try:
+            if self.redis_available and self.redis:
+                with self.pipeline() as pipe:
+                    pipe.delete(*keys)
+                return int(pipe.results[0] or 0) if pipe.succeeded else 0
+            else:
+                return self.memory_store.delete(*keys)
+        except Exception as e:
+            print(f"Error deleting {len(keys)} cache keys: {e}")
+            return 0
+
+    def pipeline(self, transaction: bool = False) -> "CachePipeline":
+        """
+        Create a pipeline that sends all queued commands in one round trip
+
+        Usage:
+            with cache_service.pipeline() as pipe:
+                pipe.set("a", 1)
+                pipe.delete("b", "c")
+            pipe.results  # one entry per queued command
+
+        Args:
+            transaction: Wrap the commands in MULTI/EXEC so they apply atomically
+        """
+        return CachePipeline(self, transaction=transaction)
+
     def clear_pattern(self, pattern: str) -> int:
         """
         Clear all keys matching a pattern (use with caution)
@@ -176,24 +828,326 @@ class CacheService:
                         break
                 
                 if keys_to_delete:
-                    self.redis.delete(*keys_to_delete)
+                    with self.pipeline() as pipe:
+                        pipe.delete(*keys_to_delete)
                 return len(keys_to_delete)
             else:
-                # Fallback: delete matching keys from in-memory cache
-                keys_to_delete = [k for k in _in_memory_cache.keys() if pattern.replace('*', '') in k]
-                for key in keys_to_delete:
-                    _in_memory_cache.pop(key, None)
-                return len(keys_to_delete)
+                # Fallback: glob match through the in-memory prefix index
+                return self.memory_store.clear_pattern(pattern)
         except Exception as e:
             print(f"Error clearing cache pattern '{pattern}': {e}")
             return 0
     
-    def get_user_preferences(self, wallet_address: str) -> dict:
+    # ============================================
+    # Async primitives (pooled async client)
+    # ============================================
+
+    async def aget(self, key: str, default: Any = None, raise_errors: bool = False) -> Optional[Any]:
+        """
+        Awaitable form of get()
+        Args:
+            raise_errors: Raise CacheError when Redis fails instead of returning default,
+                for callers that must tell a failure from a missing key
+        """
+        started = time.perf_counter() if self.metrics else 0.0
+        try:
+            client = self._async_client()
+            if client is not None:
+                await self._al1_refresh_versions(client)
+                value = self._l1_get(key)
+                if value is _MISSING:
+                    stamp = self._l1_stamp(key)
+                    value = await client.get(key)
+                    self._l1_put(key, value, stamp)
+                result = default if value is None else self._deserialize(value)
+                if self.metrics:
+                    self._record("get", key, started, hit=value is not None, size=raw_size(value))
+                return result
+            else:
+                value = self.memory_store.get(key, _MISSING)
+                if self.metrics:
+                    self._record("get", key, started, hit=value is not _MISSING)
+                return default if value is _MISSING else value
+        except Exception as e:
+            print(f"Error getting cache key '{key}': {e}")
+            if self.metrics:
+                self._record("get", key, started, error=True)
+            if raise_errors:
+                raise CacheError(f"Reading '{key}' failed: {e}") from e
+            return default
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> bool:
+        """Awaitable form of set()"""
+        started = time.perf_counter() if self.metrics else 0.0
+        try:
+            client = self._async_client()
+            if client is not None:
+                if self._l1_family(key) is not None:
+                    async with self.apipeline() as pipe:
+                        pipe.set(key, value, ttl_seconds)
+                    return pipe.succeeded
+                payload = self._serialize(value)
+                await client.set(key, payload, ex=ttl_seconds or None)
+                if self.metrics:
+                    self._record("set", key, started, size=raw_size(payload))
+                return True
+            else:
+                stored = self.memory_store.set(key, value, ttl_seconds)
+                if self.metrics:
+                    self._record("set", key, started)
+                return stored
+        except Exception as e:
+            print(f"Error setting cache key '{key}': {e}")
+            if self.metrics:
+                self._record("set", key, started, error=True)
+            return False
+
+    async def adelete(self, key: str) -> bool:
+        """Awaitable form of delete()"""
+        started = time.perf_counter() if self.metrics else 0.0
+        try:
+            client = self._async_client()
+            if client is not None:
+                if self._l1_family(key) is not None:
+                    async with self.apipeline() as pipe:
+                        pipe.delete(key)
+                    return pipe.succeeded
+                await client.delete(key)
+            else:
+                self.memory_store.delete(key)
+            if self.metrics:
+                self._record("delete", key, started)
+            return True
+        except Exception as e:
+            print(f"Error deleting cache key '{key}': {e}")
+            if self.metrics:
+                self._record("delete", key, started, error=True)
+            return False
+
+    async def aget_many(self, keys: Iterable[str], default: Any = None) -> Dict[str, Any]:
+        """Awaitable form of get_many() (single MGET)"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        started = time.perf_counter() if self.metrics else 0.0
+        try:
+            client = self._async_client()
+            if client is not None:
+                await self._al1_refresh_versions(client)
+                raw = {key: self._l1_get(key) for key in keys}
+                pending = [key for key, value in raw.items() if value is _MISSING]
+                if pending:
+                    stamps = {key: self._l1_stamp(key) for key in pending}
+                    for key, value in zip(pending, await client.mget(*pending)):
+                        raw[key] = value
+                        self._l1_put(key, value, stamps[key])
+                result = {
+                    key: default if value is None else self._deserialize(value)
+                    for key, value in raw.items()
+                }
+                if self.metrics:
+                    self.metrics.record_many("mget", raw, time.perf_counter() - started)
+                return result
+            else:
+                raw = {key: self.memory_store.get(key, _MISSING) for key in keys}
+                if self.metrics:
+                    self.metrics.record_many("mget", raw, time.perf_counter() - started, missing=_MISSING, sized=False)
+                return {key: default if value is _MISSING else value for key, value in raw.items()}
+        except Exception as e:
+            print(f"Error getting {len(keys)} cache keys: {e}")
+            if self.metrics:
+                self.metrics.record_many("mget", dict.fromkeys(keys), time.perf_counter() - started, error=True)
+            return {key: default for key in keys}
+
+    async def aset_many(self, mapping: Dict[str, Any], ttl_seconds: Optional[int] = None) -> bool:
+        """Awaitable form of set_many() (pipelined SET)"""
+        if not mapping:
+            return True
+        async with self.apipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ttl_seconds)
+        return pipe.succeeded
+
+    async def adelete_many(self, keys: Iterable[str]) -> int:
+        """Awaitable form of delete_many() (single DEL)"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return 0
+        async with self.apipeline() as pipe:
+            pipe.delete(*keys)
+        return int(pipe.results[0] or 0) if pipe.succeeded else 0
+
+    def apipeline(self, transaction: bool = False) -> "AsyncCachePipeline":
+        """
+        Awaitable pipeline, sent through the pooled async client
+
+        Usage:
+            async with cache_service.apipeline() as pipe:
+                pipe.get("a")
+            pipe.results
+        """
+        return AsyncCachePipeline(self, transaction=transaction)
+
+    async def aclear_pattern(self, pattern: str) -> int:
+        """Awaitable form of clear_pattern() (SCAN + pipelined DEL)"""
+        try:
+            client = self._async_client()
+            if client is None:
+                return self.memory_store.clear_pattern(pattern)
+            keys_to_delete = []
+            cursor = 0
+            while True:
+                cursor, keys = await client.scan(cursor, match=pattern, count=100)
+                keys_to_delete.extend(keys)
+                if int(cursor) == 0:
+                    break
+            if keys_to_delete:
+                async with self.apipeline() as pipe:
+                    pipe.delete(*keys_to_delete)
+            return len(keys_to_delete)
+        except Exception as e:
+            print(f"Error clearing cache pattern '{pattern}': {e}")
+            return 0
+
+    # ============================================
+    # Stampede protection for cache-miss loaders
+    # ============================================
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[int] = None,
+        cache_if: Callable[[Any], bool] = bool,
+        lock_ttl_ms: int = 10000
+    ) -> Any:
+        """
+        Read a key, or load and cache it with at most one loader running per key
+
+        Concurrent misses in this process share one loader call. Across workers
+        a Redis lock (`lock:{key}`) lets one worker load while the others wait
+        for the value to appear, falling back to loading themselves if the
+        holder gives up or takes longer than CACHE_LOADER_LOCK_WAIT_SECONDS.
+
+        Args:
+            key: Cache key
+            loader: Coroutine function returning the value on a miss
+            ttl_seconds: TTL for the cached value (None = no expiration)
+            cache_if: Only cache loaded values this accepts (default: truthy values)
+            lock_ttl_ms: Expiry of the cross-worker lock
+        Returns:
+            Cached or freshly loaded value (loader exceptions propagate)
+        """
+        value = await self.aget(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        return await self._flight.do(
+            key, lambda: self._load_and_fill(key, loader, ttl_seconds, cache_if, lock_ttl_ms)
+        )
+
+    async def coalesce(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Share one in-flight loader call between concurrent callers (no caching)"""
+        return await self._flight.do(f"coalesce:{key}", loader)
+
+    async def _load_and_fill(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[int],
+        cache_if: Callable[[Any], bool],
+        lock_ttl_ms: int
+    ) -> Any:
+        client = self._async_client()
+        lock = None
+        if client is not None and self._distributed_locks:
+            try:
+                lock = DistributedLock(client, f"lock:{key}", lock_ttl_ms)
+                if await lock.acquire():
+                    # The previous holder may have filled the key just before we got the lock
+                    value = await self.aget(key, _MISSING)
+                    if value is not _MISSING:
+                        await lock.release()
+                        return value
+                else:
+                    value = await wait_for_value(lambda: self._probe_locked_key(client, key, lock.key), self._lock_wait_seconds)
+                    if value is not None and value is not _MISSING:
+                        return value
+                    # Holder finished without caching anything, or is too slow - load ourselves
+            except Exception as e:
+                print(f"Error coordinating loader lock for '{key}': {e}")
+        try:
+            value = await loader()
+            if cache_if(value):
+                await self.aset(key, value, ttl_seconds)
+            return value
+        finally:
+            if lock is not None:
+                await lock.release()
+
+    async def _probe_locked_key(self, client: Any, key: str, lock_key: str) -> Any:
+        """Value if another worker cached it, _MISSING if its lock is gone, else None (keep waiting)"""
+        value = await self.aget(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if not await client.exists(lock_key):
+            return _MISSING
+        return None
+
+    def single_flight_stats(self) -> Dict[str, int]:
+        return {
+            "loads": self._flight.loads,
+            "coalesced": self._flight.coalesced,
+            "in_flight": self._flight.in_flight(),
+        }
+
+    # ============================================
+    # Negative cache (known-missing entities)
+    # ============================================
+
+    @staticmethod
+    def _negative_key(kind: str, entity_id: str, scope: Optional[str] = None) -> str:
+        return f"{kind}:{entity_id}:{scope or ''}"
+
+    def is_known_missing(self, kind: str, entity_id: str, scope: Optional[str] = None) -> bool:
+        """
+        True if a recent lookup for this entity found nothing
+        Args:
+            kind: Entity type ('agent', 'chat', 'capsule')
+            entity_id: Entity ID
+            scope: Optional qualifier the lookup depended on (e.g. the wallet address)
+        """
+        if self.negative is None:
+            return False
+        return self.negative.get(self._negative_key(kind, entity_id, scope), False)
+
+    def mark_missing(self, kind: str, entity_id: str, scope: Optional[str] = None):
+        """
+        Remember that a lookup found nothing, for CACHE_NEGATIVE_TTL_SECONDS
+
+        Only call this after every backing store answered - a lookup that
+        failed with an error is not proof the entity doesn't exist.
+        """
+        if self.negative is not None:
+            self.negative.set(self._negative_key(kind, entity_id, scope), True)
+
+    def clear_missing(self, kind: str, entity_id: str, scope: Optional[str] = None):
+        """Forget a negative entry (call when the entity is created); clears the unscoped entry too"""
+        if self.negative is None:
+            return
+        self.negative.delete(self._negative_key(kind, entity_id, scope))
+        if scope:
+            self.negative.delete(self._negative_key(kind, entity_id))
+
+    # ============================================
+    # User agents and preferences
+    # ============================================
+
+    async def get_user_preferences(self, wallet_address: str) -> dict:
         """Get user preferences from cache"""
         key = f"user:preferences:{wallet_address}"
-        return self.get(key, {})
+        return await self.aget(key, {})
     
-    def set_user_preferences(self, wallet_address: str, preferences: dict, ttl_seconds: int = 86400 * 30) -> bool:
+    async def set_user_preferences(self, wallet_address: str, preferences: dict, ttl_seconds: int = 86400 * 30) -> bool:
         """
         Set user preferences in cache (30 days TTL)
         Args:
@@ -202,14 +1156,18 @@ class CacheService:
             ttl_seconds: TTL in seconds (default 30 days)
         """
         key = f"user:preferences:{wallet_address}"
-        return self.set(key, preferences, ttl_seconds)
+        return await self.aset(key, preferences, ttl_seconds)
     
-    def get_user_agents(self, wallet_address: str) -> list:
-        """Get user's custom agents from Redis"""
+    async def get_user_agents(self, wallet_address: str) -> list:
+        """
+        Get user's custom agents from Redis
+        Raises:
+            CacheError: If Redis failed (an empty list means the wallet has none cached)
+        """
         key = f"user:agents:{wallet_address}"
-        return self.get(key, [])
+        return await self.aget(key, [], raise_errors=True)
     
-    def set_user_agents(self, wallet_address: str, agents: list, ttl_seconds: Optional[int] = None) -> bool:
+    async def set_user_agents(self, wallet_address: str, agents: list, ttl_seconds: Optional[int] = None) -> bool:
         """
         Save user's custom agents to Redis (no TTL for persistence)
         Args:
@@ -218,25 +1176,34 @@ class CacheService:
             ttl_seconds: TTL in seconds (None = no expiration, persistent)
         """
         key = f"user:agents:{wallet_address}"
-        return self.set(key, agents, ttl_seconds)
+        return await self.aset(key, agents, ttl_seconds)
+    
+    async def load_user_agents(self, wallet_address: str, loader: Callable[[], Awaitable[list]]) -> list:
+        """Get user's agents from Redis, running loader (once across workers) on a miss"""
+        key = f"user:agents:{wallet_address}"
+        return await self.get_or_load(key, loader)
     
-    def add_user_agent(self, wallet_address: str, agent: dict) -> bool:
-        """Add a single agent to user's agent list in Redis"""
-        agents = self.get_user_agents(wallet_address)
+    async def add_user_agent(self, wallet_address: str, agent: dict) -> bool:
+        """
+        Add a single agent to user's agent list in Redis
+        Raises:
+            CacheError: If the list couldn't be read (rather than overwriting it)
+        """
+        agents = await self.get_user_agents(wallet_address)
         # Check if agent already exists (by id)
         existing_index = next((i for i, a in enumerate(agents) if a.get('id') == agent.get('id')), None)
         if existing_index is not None:
             agents[existing_index] = agent  # Update existing
         else:
             agents.append(agent)  # Add new
-        return self.set_user_agents(wallet_address, agents)
+        return await self.set_user_agents(wallet_address, agents)
     
-    def get_chat_cache(self, agent_id: str, wallet_address: str) -> Optional[list]:
+    async def get_chat_cache(self, agent_id: str, wallet_address: str) -> Optional[list]:
         """Get cached chat list for an agent"""
         key = f"chats:{agent_id}:{wallet_address}"
-        return self.get(key)
+        return await self.aget(key)
     
-    def set_chat_cache(self, agent_id: str, wallet_address: str, chats: list, ttl_seconds: int = 300) -> bool:
+    async def set_chat_cache(self, agent_id: str, wallet_address: str, chats: list, ttl_seconds: int = 300) -> bool:
         """
         Cache chat list for an agent (5 minutes TTL)
         Args:
@@ -246,20 +1213,26 @@ class CacheService:
             ttl_seconds: TTL in seconds (default 5 minutes)
         """
         key = f"chats:{agent_id}:{wallet_address}"
-        return self.set(key, chats, ttl_seconds)
+        return await self.aset(key, chats, ttl_seconds)
     
-    def invalidate_chat_cache(self, agent_id: str, wallet_address: str) -> bool:
+    async def invalidate_chat_cache(self, agent_id: str, wallet_address: str) -> bool:
         """Invalidate chat cache when chats are modified"""
         key = f"chats:{agent_id}:{wallet_address}"
-        return self.delete(key)
+        return await self.adelete(key)
     
     # ============================================
     # Chat and Message Storage (Persistent)
     # ============================================
     
-    def save_chat(self, chat_data: dict) -> bool:
+    # Chat metadata lives in a Redis hash under `chat:{chat_id}` (one field per
+    # chat attribute, JSON-encoded), so a new message is an HINCRBY of
+    # message_count plus an HSET of last_message/last_activity instead of a
+    # read-modify-write of the whole chat. Chats written before this layout
+    # are JSON blobs and are converted on the first WRONGTYPE.
+
+    async def save_chat(self, chat_data: dict) -> bool:
         """
-        Save a chat to Redis (persistent storage)
+        Save a chat to Redis (persistent storage, HSET of every field)
         Args:
             chat_data: Chat dictionary with all fields
         Returns:
@@ -270,108 +1243,489 @@ class CacheService:
             return False
         
         key = f"chat:{chat_id}"
-        # Store without TTL for persistence
-        return self.set(key, chat_data, ttl_seconds=None)
+        # Stored without TTL for persistence
+        pipe = await self._chat_pipeline([chat_id], lambda p: p.hset(key, chat_data))
+        return pipe.succeeded
     
-    def get_chat(self, chat_id: str) -> Optional[dict]:
+    async def get_chat(self, chat_id: str) -> Optional[dict]:
         """
-        Get a chat from Redis
+        Get a chat from Redis (one HGETALL)
         Args:
             chat_id: Chat ID
         Returns:
-            Chat dictionary or None
+            Chat dictionary or None if it doesn't exist
+        Raises:
+            CacheError: If the read didn't go through
         """
         key = f"chat:{chat_id}"
-        return self.get(key)
+        pipe = await self._chat_pipeline([chat_id], lambda p: p.hgetall(key))
+        if not pipe.succeeded:
+            raise CacheError(f"Reading chat '{chat_id}' failed: {pipe.error}")
+        return pipe.results[0] or None
     
-    def delete_chat(self, chat_id: str) -> bool:
+    async def delete_chat(self, chat_id: str) -> bool:
         """Delete a chat from Redis"""
         key = f"chat:{chat_id}"
-        return self.delete(key)
+        return await self.adelete(key)
+
+    async def record_chat_message(
+        self,
+        chat_id: str,
+        last_message: Optional[str],
+        activity: Optional[datetime] = None,
+        message: Optional[dict] = None
+    ) -> Optional[dict]:
+        """
+        Update chat metadata for a new message in one round trip
+        (HINCRBY message_count, HSET last_message/last_activity)
+        Args:
+            chat_id: Chat ID
+            last_message: Preview of the newest message
+            activity: Time of the message (default now)
+            message: The message itself, RPUSHed in the same round trip
+        Returns:
+            Dict with the new message_count plus the chat's agent_id and
+            user_wallet, or None if the chat doesn't exist
+        Raises:
+            CacheError: If the update didn't go through
+        """
+        key = f"chat:{chat_id}"
+        messages_key = f"messages:{chat_id}"
+        updates = {
+            "last_message": last_message,
+            "last_activity": (activity or datetime.now()).isoformat(),
+        }
+
+        def queue(pipe: CachePipeline):
+            if message is not None:
+                pipe.rpush(messages_key, message)
+            pipe.hincrby(key, "message_count", 1)
+            pipe.hset(key, updates)
+            pipe.hmget(key, "agent_id", "user_wallet")
+
+        pipe = await self._chat_pipeline([chat_id], queue, with_messages=message is not None)
+        if not pipe.succeeded:
+            raise CacheError(f"Updating chat '{chat_id}' failed: {pipe.error}")
+        message_count, _, (agent_id, user_wallet) = pipe.results[-3:]
+        if agent_id is None:
+            # Chat was deleted concurrently (or isn't in Redis) - don't leave a
+            # partial hash or an orphaned message list behind
+            await self.adelete(key)
+            if message is not None:
+                await self.adelete(messages_key)
+            return None
+        return {"message_count": int(message_count), "agent_id": agent_id, "user_wallet": user_wallet}
+
+    async def _chat_pipeline(
+        self,
+        chat_ids: List[str],
+        queue: Callable[[CachePipeline], Any],
+        with_messages: bool = False
+    ) -> "AsyncCachePipeline":
+        """
+        Run a pipeline on chat hashes, converting legacy JSON-blob chats (and their
+        message lists, with_messages=True) and retrying once on WRONGTYPE
+        """
+        for attempt in range(2):
+            pipe = self.apipeline()
+            queue(pipe)
+            await pipe.execute()
+            if pipe.succeeded or attempt or not self._is_wrong_type(pipe.error):
+                break
+            for chat_id in chat_ids:
+                await self.migrate_legacy_chat(chat_id)
+                if with_messages:
+                    await self.migrate_legacy_messages(chat_id)
+        return pipe
+
+    async def migrate_legacy_chat(self, chat_id: str) -> bool:
+        """
+        Convert a chat's legacy JSON-blob metadata key into a hash
+        Args:
+            chat_id: Chat ID
+        Returns:
+            True if the key is now a hash (or absent), False if migration failed
+        """
+        client = self._async_client()
+        if client is None:
+            return True
+        key = f"chat:{chat_id}"
+        try:
+            if await client.type(key) != "string":
+                return True
+            chat_data = self._deserialize(await client.get(key))
+            async with self.apipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if isinstance(chat_data, dict) and chat_data:
+                    pipe.hset(key, chat_data)
+            return pipe.succeeded
+        except Exception as e:
+            print(f"Error migrating chat '{chat_id}': {e}")
+            return False
+
+    async def migrate_all_legacy_chats(self) -> int:
+        """
+        One-time migration of every legacy `chat:*` blob to a hash
+        Returns:
+            Number of chats migrated
+        """
+        client = self._async_client()
+        if client is None:
+            return 0
+        migrated = 0
+        cursor = 0
+        while True:
+            cursor, keys = await client.scan(cursor, match="chat:*", count=100, type="string")
+            for key in keys:
+                if await self.migrate_legacy_chat(key[len("chat:"):]):
+                    migrated += 1
+            if int(cursor) == 0:
+                break
+        return migrated
     
-    def save_messages(self, chat_id: str, messages: list) -> bool:
+    # Messages are stored as a native Redis list (one JSON element per message)
+    # so appends are a single RPUSH and reads are LRANGE slices. Chats written
+    # before this layout hold a single JSON blob under the same key; those are
+    # converted the first time a list command hits them (WRONGTYPE).
+
+    async def save_messages(self, chat_id: str, messages: list) -> bool:
         """
-        Save messages for a chat to Redis
+        Replace all messages for a chat in Redis (atomic DEL + RPUSH)
         Args:
             chat_id: Chat ID
-            messages: List of message dictionaries
+            messages: List of message dictionaries (oldest first)
         Returns:
             True if successful
         """
         key = f"messages:{chat_id}"
         # Store without TTL for persistence
-        return self.set(key, messages, ttl_seconds=None)
+        async with self.apipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if messages:
+                pipe.rpush(key, *messages)
+        return pipe.succeeded
     
-    def get_messages(self, chat_id: str) -> list:
+    async def get_messages(self, chat_id: str, start: int = 0, stop: int = -1) -> list:
         """
-        Get messages for a chat from Redis (sorted by timestamp)
+        Get a range of messages for a chat from Redis (oldest first)
         Args:
             chat_id: Chat ID
+            start: Index of the first message (negative counts from the end)
+            stop: Index of the last message, inclusive (-1 = newest)
         Returns:
-            List of message dictionaries sorted by timestamp
+            List of message dictionaries in insertion order
         """
         key = f"messages:{chat_id}"
-        messages = self.get(key, [])
-        
-        # Sort by timestamp (oldest first)
-        if messages:
-            try:
-                messages.sort(key=lambda x: x.get("timestamp", ""))
-            except Exception as e:
-                print(f"Error sorting messages: {e}")
-        
-        return messages
+        try:
+            return await self._lrange(key, start, stop)
+        except Exception as e:
+            if not self._is_wrong_type(e):
+                print(f"Error getting messages for chat '{chat_id}': {e}")
+                return []
+        if not await self.migrate_legacy_messages(chat_id):
+            return []
+        try:
+            return await self._lrange(key, start, stop)
+        except Exception as e:
+            print(f"Error getting messages for chat '{chat_id}': {e}")
+            return []
     
-    def add_message(self, chat_id: str, message: dict) -> bool:
+    async def get_message_page(
+        self,
+        chat_id: str,
+        limit: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[list, int, int]:
         """
-        Add a single message to a chat
+        Get one page of a chat's messages with a single LLEN + LRANGE round trip
+
+        Messages are addressed by their position in the chat (`seq`, 0 = first
+        message). Positions never shift because messages are only appended.
+
+        Args:
+            chat_id: Chat ID
+            limit: Maximum number of messages
+            before: Only messages with seq < before (the page just older than it)
+            after: Only messages with seq > after (the page just newer than it)
+        Returns:
+            (messages oldest first, each with a `seq` field; seq of the first one; total messages)
+        """
+        if after is not None:
+            start, stop = after + 1, after + limit
+        elif before is not None:
+            start, stop = max(0, before - limit), before - 1
+        else:
+            # Most recent page
+            start, stop = -limit, -1
+        key = f"messages:{chat_id}"
+        for attempt in range(2):
+            async with self.apipeline(transaction=True) as pipe:
+                pipe.llen(key)
+                if limit > 0 and (start < 0 or stop >= start):
+                    pipe.lrange(key, start, stop)
+            if pipe.succeeded:
+                break
+            if attempt or not self._is_wrong_type(pipe.error) or not await self.migrate_legacy_messages(chat_id):
+                return [], 0, 0
+        total = int(pipe.results[0] or 0)
+        messages = (pipe.results[1] if len(pipe.results) > 1 else None) or []
+        first = start if start >= 0 else max(0, total - len(messages))
+        messages = [
+            {**message, "seq": first + offset} if isinstance(message, dict) else message
+            for offset, message in enumerate(messages)
+        ]
+        return messages, first, total
+    
+    async def count_messages(self, chat_id: str) -> int:
+        """Get the number of messages in a chat (LLEN)"""
+        key = f"messages:{chat_id}"
+        try:
+            client = self._async_client()
+            if client is not None:
+                return int(await client.llen(key) or 0)
+            return self.memory_store.llen(key)
+        except Exception as e:
+            if self._is_wrong_type(e) and await self.migrate_legacy_messages(chat_id):
+                return await self.count_messages(chat_id)
+            print(f"Error counting messages for chat '{chat_id}': {e}")
+            return 0
+    
+    async def add_message(self, chat_id: str, message: dict) -> int:
+        """
+        Append a single message to a chat (RPUSH, O(1))
         Args:
             chat_id: Chat ID
             message: Message dictionary
         Returns:
-            True if successful
+            New number of messages in the chat (0 on failure)
         """
-        messages = self.get_messages(chat_id)
-        messages.append(message)
-        return self.save_messages(chat_id, messages)
+        key = f"messages:{chat_id}"
+        started = time.perf_counter() if self.metrics else 0.0
+        try:
+            client = self._async_client()
+            if client is not None:
+                payload = self._serialize(message)
+                count = int(await client.rpush(key, payload))
+                if self.metrics:
+                    self._record("rpush", key, started, size=raw_size(payload))
+                return count
+            return self.memory_store.rpush(key, message)
+        except Exception as e:
+            if self.metrics:
+                self._record("rpush", key, started, error=True)
+            if self._is_wrong_type(e) and await self.migrate_legacy_messages(chat_id):
+                return await self.add_message(chat_id, message)
+            print(f"Error adding message to chat '{chat_id}': {e}")
+            return 0
     
-    def delete_messages(self, chat_id: str) -> bool:
+    async def migrate_legacy_messages(self, chat_id: str) -> bool:
+        """
+        Convert a chat's legacy JSON-blob message key into a Redis list
+        Args:
+            chat_id: Chat ID
+        Returns:
+            True if the key is now a list (or absent), False if migration failed
+        """
+        client = self._async_client()
+        if client is None:
+            return True
+        key = f"messages:{chat_id}"
+        try:
+            if await client.type(key) != "string":
+                return True
+            messages = self._deserialize(await client.get(key)) or []
+            if not isinstance(messages, list):
+                messages = []
+            messages.sort(key=lambda x: x.get("timestamp", "") if isinstance(x, dict) else "")
+            async with self.apipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if messages:
+                    pipe.rpush(key, *messages)
+            return pipe.succeeded
+        except Exception as e:
+            print(f"Error migrating messages for chat '{chat_id}': {e}")
+            return False
+    
+    async def migrate_all_legacy_messages(self) -> int:
+        """
+        One-time migration of every legacy `messages:*` blob to a Redis list
+        Returns:
+            Number of chats migrated
+        """
+        client = self._async_client()
+        if client is None:
+            return 0
+        migrated = 0
+        cursor = 0
+        while True:
+            cursor, keys = await client.scan(cursor, match="messages:*", count=100, type="string")
+            for key in keys:
+                if await self.migrate_legacy_messages(key[len("messages:"):]):
+                    migrated += 1
+            if int(cursor) == 0:
+                break
+        return migrated
+    
+    async def _lrange(self, key: str, start: int, stop: int) -> list:
+        client = self._async_client()
+        if client is None:
+            return self.memory_store.lrange(key, start, stop)
+        if not self.metrics:
+            return [self._deserialize(value) for value in await client.lrange(key, start, stop)]
+        started = time.perf_counter()
+        try:
+            raw = await client.lrange(key, start, stop)
+        except Exception:
+            self._record("lrange", key, started, error=True)
+            raise
+        self._record("lrange", key, started, hit=bool(raw), size=raw_size(raw))
+        return [self._deserialize(value) for value in raw]
+    
+    @staticmethod
+    def _is_wrong_type(error: Optional[BaseException]) -> bool:
+        """True if a Redis error means the key holds a different data type"""
+        return error is not None and "WRONGTYPE" in str(error)
+    
+    async def delete_messages(self, chat_id: str) -> bool:
         """Delete all messages for a chat"""
         key = f"messages:{chat_id}"
-        return self.delete(key)
+        return await self.adelete(key)
     
-    def get_chat_list(self, agent_id: str, wallet_address: str) -> list:
+    # Chat list indexes are sorted sets of chat IDs scored by last activity
+    # (epoch milliseconds): `chats:agent:{agent_id}:wallet:{wallet}` per owner
+    # and `agent:chats:{agent_id}` across wallets. Listing is ZREVRANGEBYSCORE
+    # with a (score, chat_id) cursor; add/remove/touch are single ZADD/ZREM
+    # commands. Indexes written before this layout are JSON arrays and are
+    # converted the first time a sorted-set command hits them (WRONGTYPE).
+
+    @staticmethod
+    def _chat_index_keys(agent_id: str, wallet_address: Optional[str]) -> List[str]:
+        keys = [f"agent:chats:{agent_id}"]
+        if wallet_address:
+            keys.append(f"chats:agent:{agent_id}:wallet:{wallet_address}")
+        return keys
+
+    async def get_chat_list(self, agent_id: str, wallet_address: str) -> list:
         """
         Get list of chat IDs for an agent/user
         Args:
             agent_id: Agent ID
             wallet_address: User wallet address
         Returns:
-            List of chat IDs
+            List of chat IDs, most recently active first
         """
-        key = f"chats:agent:{agent_id}:wallet:{wallet_address}"
-        return self.get(key, [])
-    
-    def add_chat_to_list(self, agent_id: str, wallet_address: str, chat_id: str) -> bool:
+        chat_ids, _ = await self.get_chat_page(agent_id, wallet_address)
+        return chat_ids
+
+    async def get_agent_chat_list(self, agent_id: str) -> list:
+        """Get the global chat ID list for an agent (all wallets), most recently active first"""
+        chat_ids, _ = await self.get_chat_page(agent_id, None)
+        return chat_ids
+
+    async def get_chat_page(
+        self,
+        agent_id: str,
+        wallet_address: Optional[str],
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[str], Optional[str]]:
         """
-        Add a chat ID to the agent's chat list
+        Get one page of chat IDs, most recently active first
         Args:
             agent_id: Agent ID
-            wallet_address: User wallet address
+            wallet_address: Owner wallet (None = global agent index)
+            cursor: next_cursor from the previous page (None = first page)
+            limit: Page size (None = everything after the cursor)
+        Returns:
+            (chat IDs, next_cursor or None if this is the last page)
+        Raises:
+            ValueError: If the cursor is malformed
+            CacheError: If the read didn't go through
+        """
+        key = self._chat_index_keys(agent_id, wallet_address)[-1]
+        max_score, after_id = decode_chat_cursor(cursor)
+        batch = None if limit is None else limit + 1
+        page: List[Tuple[str, float]] = []
+        offset = 0
+        while True:
+            pipe = await self._chat_index_pipeline(
+                [key], lambda p: p.zrevrangebyscore(key, max_score, "-inf", offset if batch else None, batch)
+            )
+            if not pipe.succeeded:
+                raise CacheError(f"Reading chat index '{key}' failed: {pipe.error}")
+            window = pipe.results[0]
+            for member, score in window:
+                # Members that share the cursor's score sort by ID (descending);
+                # skip the ones already returned on the previous page
+                if after_id is not None and score == max_score and member >= after_id:
+                    continue
+                page.append((member, score))
+            if batch is None or len(page) >= batch or len(window) < batch:
+                break
+            offset += len(window)
+
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_chat_cursor(page[-1][1], page[-1][0])
+        return [member for member, _ in page], next_cursor
+
+    async def add_chat_to_list(
+        self,
+        agent_id: str,
+        wallet_address: Optional[str],
+        chat_id: str,
+        activity: Optional[datetime] = None
+    ) -> bool:
+        """
+        Add a chat ID to the agent's chat indexes (one pipelined ZADD per index)
+        Args:
+            agent_id: Agent ID
+            wallet_address: User wallet address (None = global agent index only)
             chat_id: Chat ID to add
+            activity: Last-activity time used as the score (default now)
         Returns:
             True if successful
         """
-        chat_list = self.get_chat_list(agent_id, wallet_address)
-        if chat_id not in chat_list:
-            chat_list.append(chat_id)
-            key = f"chats:agent:{agent_id}:wallet:{wallet_address}"
-            return self.set(key, chat_list, ttl_seconds=None)
-        return True
-    
-    def remove_chat_from_list(self, agent_id: str, wallet_address: str, chat_id: str) -> bool:
+        keys = self._chat_index_keys(agent_id, wallet_address)
+        scores = {chat_id: chat_activity_score(activity)}
+
+        def queue(pipe: CachePipeline):
+            for key in keys:
+                pipe.zadd(key, scores)
+
+        return (await self._chat_index_pipeline(keys, queue)).succeeded
+
+    async def touch_chat(
+        self,
+        agent_id: str,
+        wallet_address: Optional[str],
+        chat_id: str,
+        activity: Optional[datetime] = None
+    ) -> bool:
+        """
+        Move a chat to the front of its indexes (ZADD XX, so deleted chats stay deleted)
+        Args:
+            agent_id: Agent ID
+            wallet_address: User wallet address
+            chat_id: Chat ID that just had activity
+            activity: Activity time (default now)
+        Returns:
+            True if successful
+        """
+        keys = self._chat_index_keys(agent_id, wallet_address)
+        scores = {chat_id: chat_activity_score(activity)}
+
+        def queue(pipe: CachePipeline):
+            for key in keys:
+                pipe.zadd(key, scores, xx=True)
+
+        return (await self._chat_index_pipeline(keys, queue)).succeeded
+
+    async def remove_chat_from_list(self, agent_id: str, wallet_address: Optional[str], chat_id: str) -> bool:
         """
-        Remove a chat ID from the agent's chat list
+        Remove a chat ID from the agent's chat indexes (ZREM)
         Args:
             agent_id: Agent ID
             wallet_address: User wallet address
@@ -379,12 +1733,140 @@ class CacheService:
         Returns:
             True if successful
         """
-        chat_list = self.get_chat_list(agent_id, wallet_address)
-        if chat_id in chat_list:
-            chat_list.remove(chat_id)
-            key = f"chats:agent:{agent_id}:wallet:{wallet_address}"
-            return self.set(key, chat_list, ttl_seconds=None)
-        return True
+        keys = self._chat_index_keys(agent_id, wallet_address)
+
+        def queue(pipe: CachePipeline):
+            for key in keys:
+                pipe.zrem(key, chat_id)
+
+        return (await self._chat_index_pipeline(keys, queue)).succeeded
+
+    async def _chat_index_pipeline(self, index_keys: List[str], queue: Callable[[CachePipeline], Any]) -> "AsyncCachePipeline":
+        """Run a pipeline touching chat indexes, converting legacy JSON-array indexes and retrying once on WRONGTYPE"""
+        for attempt in range(2):
+            pipe = self.apipeline()
+            queue(pipe)
+            await pipe.execute()
+            if pipe.succeeded or attempt or not self._is_wrong_type(pipe.error):
+                break
+            for key in index_keys:
+                await self.migrate_legacy_chat_index(key)
+        return pipe
+
+    async def migrate_legacy_chat_index(self, key: str) -> bool:
+        """
+        Convert a legacy JSON-array chat index into a sorted set
+        (scored by each chat's last activity, or its creation time if unknown)
+        Args:
+            key: Index key (`agent:chats:*` or `chats:agent:*:wallet:*`)
+        Returns:
+            True if the key is now a sorted set (or absent), False if migration failed
+        """
+        client = self._async_client()
+        if client is None:
+            return True
+        try:
+            if await client.type(key) != "string":
+                return True
+            chat_ids = self._deserialize(await client.get(key)) or []
+            if not isinstance(chat_ids, list):
+                chat_ids = []
+            chats = await self.get_chats_bulk(chat_ids, include_messages=False)
+            scores = {}
+            for position, chat_id in enumerate(chat_ids):
+                chat_data, _ = chats.get(chat_id, (None, []))
+                timestamp = (chat_data.get("last_activity") or chat_data.get("timestamp")) if isinstance(chat_data, dict) else None
+                try:
+                    scores[chat_id] = chat_activity_score(datetime.fromisoformat(timestamp))
+                except (TypeError, ValueError):
+                    # Unknown age - keep the original list order at the oldest end
+                    scores[chat_id] = float(position)
+            async with self.apipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.zadd(key, scores)
+            return pipe.succeeded
+        except Exception as e:
+            print(f"Error migrating chat index '{key}': {e}")
+            return False
+
+    async def migrate_all_legacy_chat_indexes(self) -> int:
+        """
+        One-time migration of every legacy JSON-array chat index to a sorted set
+        Returns:
+            Number of indexes migrated
+        """
+        client = self._async_client()
+        if client is None:
+            return 0
+        migrated = 0
+        for pattern in ("agent:chats:*", "chats:agent:*:wallet:*"):
+            cursor = 0
+            while True:
+                cursor, keys = await client.scan(cursor, match=pattern, count=100, type="string")
+                for key in keys:
+                    if await self.migrate_legacy_chat_index(key):
+                        migrated += 1
+                if int(cursor) == 0:
+                    break
+        return migrated
+
+    async def get_chats_bulk(self, chat_ids: List[str], include_messages: bool = True) -> Dict[str, Tuple[Optional[dict], list]]:
+        """
+        Load several chats (and optionally their messages) in one round trip
+        Args:
+            chat_ids: Chat IDs to load
+            include_messages: Also fetch each chat's message list
+        Returns:
+            Dict of chat_id -> (chat dict or None, messages oldest first)
+        """
+        if not chat_ids:
+            return {}
+
+        for attempt in range(2):
+            pipe = self.apipeline()
+            for chat_id in chat_ids:
+                pipe.hgetall(f"chat:{chat_id}")
+            if include_messages:
+                for chat_id in chat_ids:
+                    pipe.lrange(f"messages:{chat_id}", 0, -1)
+            results = await pipe.execute()
+            if pipe.succeeded:
+                chats = results[:len(chat_ids)]
+                messages = results[len(chat_ids):] if include_messages else [[]] * len(chat_ids)
+                return {
+                    chat_id: (chat_data or None, chat_messages or [])
+                    for chat_id, chat_data, chat_messages in zip(chat_ids, chats, messages)
+                }
+            if attempt or not self._is_wrong_type(pipe.error):
+                break
+            # Some chats still use the legacy blob layouts - convert them and retry
+            for chat_id in chat_ids:
+                await self.migrate_legacy_chat(chat_id)
+                if include_messages:
+                    await self.migrate_legacy_messages(chat_id)
+        return {chat_id: (None, []) for chat_id in chat_ids}
+
+    async def purge_chats(self, agent_id: str, wallet_address: Optional[str], chat_ids: List[str]) -> bool:
+        """
+        Delete chats, their messages and their index entries in one round trip
+        (one pipeline of DEL + ZREM)
+        Args:
+            agent_id: Agent the chats belong to
+            wallet_address: Owner wallet (None = only the global agent index is updated)
+            chat_ids: Chat IDs to delete
+        Returns:
+            True if successful
+        """
+        if not chat_ids:
+            return True
+        index_keys = self._chat_index_keys(agent_id, wallet_address)
+
+        def queue(pipe: CachePipeline):
+            pipe.delete(*[f"chat:{chat_id}" for chat_id in chat_ids], *[f"messages:{chat_id}" for chat_id in chat_ids])
+            for key in index_keys:
+                pipe.zrem(key, *chat_ids)
+
+        return (await self._chat_index_pipeline(index_keys, queue)).succeeded
 
 
 # Global cache service instance
@@ -2,9 +2,11 @@ from typing import Optional, List
 from datetime import datetime
 import uuid
 import httpx
-from app.db.database import get_supabase
+from app.db.database import get_supabase, is_no_rows_error
 from app.models.schemas import Capsule, CapsuleCreate, CapsuleUpdate
 from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.write_behind import write_behind
 
 
 class CapsuleService:
@@ -17,29 +19,70 @@ class CapsuleService:
             raise Exception("Supabase not configured")
     
     async def get_user_capsules(self, wallet_address: Optional[str]) -> List[Capsule]:
-        """Get all capsules for a user"""
-        try:
+        """Get all capsules for a user (cached briefly; one Supabase query per miss)"""
+        async def load() -> List[dict]:
             self._check_supabase()
             query = self.supabase.table("capsules").select("*")
             if wallet_address:
                 query = query.eq("creator_wallet", wallet_address)
-            
-            result = query.execute()
-            return [Capsule(**row) for row in result.data]
+            return query.execute().data
+        
+        try:
+            rows = await cache_service.get_or_load(
+                f"capsules:wallet:{wallet_address}" if wallet_address else "capsules:all",
+                load,
+                ttl_seconds=settings.CAPSULE_CACHE_TTL_SECONDS,
+                cache_if=lambda rows: rows is not None
+            )
+            return [Capsule(**row) for row in rows]
         except Exception as e:
             print(f"Error fetching capsules: {e}")
             return []
     
     async def get_capsule(self, capsule_id: str) -> Optional[Capsule]:
-        """Get a specific capsule"""
-        try:
+        """Get a specific capsule (cached briefly; one Supabase query per miss)"""
+        async def load() -> Optional[dict]:
             self._check_supabase()
-            result = self.supabase.table("capsules").select("*").eq("id", capsule_id).single().execute()
-            if result.data:
-                return Capsule(**result.data)
+            try:
+                return self.supabase.table("capsules").select("*").eq("id", capsule_id).single().execute().data
+            except Exception as e:
+                if is_no_rows_error(e):
+                    return None
+                raise
+        
+        # Recently confirmed not to exist - skip Redis and Supabase
+        if cache_service.is_known_missing("capsule", capsule_id):
+            return None
+        try:
+            row = await cache_service.get_or_load(
+                f"capsule:{capsule_id}", load, ttl_seconds=settings.CAPSULE_CACHE_TTL_SECONDS
+            )
+            if row:
+                return Capsule(**row)
+            cache_service.mark_missing("capsule", capsule_id)
         except Exception as e:
             print(f"Error fetching capsule: {e}")
         return None
+
+    @staticmethod
+    async def invalidate_cache(capsule_id: Optional[str] = None, wallet_address: Optional[str] = None):
+        """
+        Drop cached reads affected by a capsule write (including marketplace listings)
+        Args:
+            capsule_id: Capsule that changed
+            wallet_address: Its creator (None = unknown, clears every wallet's list)
+        """
+        keys = ["capsules:all"]
+        if wallet_address:
+            keys.append(f"capsules:wallet:{wallet_address}")
+        if capsule_id:
+            keys.append(f"capsule:{capsule_id}")
+        await cache_service.adelete_many(keys)
+        if capsule_id:
+            cache_service.clear_missing("capsule", capsule_id)
+        if not wallet_address:
+            await cache_service.aclear_pattern("capsules:wallet:*")
+        await cache_service.aclear_pattern("marketplace:*")
     
     async def create_capsule(self, capsule_data: CapsuleCreate, wallet_address: str) -> Capsule:
         """Create a new memory capsule"""
@@ -83,6 +126,7 @@ class CapsuleService:
             }).execute()
             
             print(f"Capsule inserted into database. ID: {capsule.id}, Name: {capsule.name}")
+            await self.invalidate_cache(capsule.id, wallet_address)
             if result.data:
                 print(f"Inserted capsule details: id={result.data[0].get('id')}, name={result.data[0].get('name')}, stake_amount={result.data[0].get('stake_amount')}")
         except Exception as e:
@@ -107,6 +151,7 @@ class CapsuleService:
             self._check_supabase()
             result = self.supabase.table("capsules").update(update_data).eq("id", capsule_id).eq("creator_wallet", wallet_address).execute()
             if result.data:
+                await self.invalidate_cache(capsule_id, wallet_address)
                 return await self.get_capsule(capsule_id)
         except Exception as e:
             print(f"Error updating capsule: {e}")
@@ -118,6 +163,7 @@ class CapsuleService:
         try:
             self._check_supabase()
             self.supabase.table("capsules").delete().eq("id", capsule_id).eq("creator_wallet", wallet_address).execute()
+            await self.invalidate_cache(capsule_id, wallet_address)
         except Exception as e:
             print(f"Error deleting capsule: {e}")
     
@@ -209,33 +255,40 @@ class CapsuleService:
         wallet_address: str,
         amount: float
     ):
-        """Record earnings in database"""
+        """Record earnings in database (journaled, written in the background)"""
         try:
             self._check_supabase()
-            self.supabase.table("earnings").insert({
+            await write_behind.insert("earnings", {
                 "wallet_address": wallet_address,
                 "capsule_id": capsule_id,
                 "amount": amount,
                 "created_at": datetime.now().isoformat()
-            }).execute()
+            }, entity=f"earnings:{wallet_address}")
             print(f"Recorded earnings: {amount} SOL for wallet {wallet_address}")
         except Exception as e:
             print(f"Error recording earnings: {e}")
 
     async def _increment_query_count(self, capsule_id: str):
-        """Increment capsule query count"""
+        """Increment capsule query count (journaled; bursts are applied as one update)"""
         try:
             self._check_supabase()
-            # Fetch current capsule
-            result = self.supabase.table("capsules").select("query_count").eq("id", capsule_id).single().execute()
-            if result.data:
-                current_count = result.data.get("query_count", 0)
-                # Update with incremented count
-                self.supabase.table("capsules").update({
-                    "query_count": current_count + 1,
-                    "updated_at": datetime.now().isoformat()
-                }).eq("id", capsule_id).execute()
-                print(f"Incremented query count for capsule {capsule_id}")
+            await write_behind.increment(
+                "capsules",
+                {"id": capsule_id},
+                "query_count",
+                1,
+                values={"updated_at": datetime.now().isoformat()},
+                entity=f"capsule:{capsule_id}"
+            )
         except Exception as e:
             print(f"Error incrementing query count: {e}")
 
+
+async def _capsules_written(operations: List[dict]):
+    """Journaled capsule updates reached Supabase - drop the cached copies"""
+    for capsule_id in {operation["match"].get("id") for operation in operations if "match" in operation}:
+        await CapsuleService.invalidate_cache(capsule_id)
+
+
+write_behind.on_applied("capsules", _capsules_written)
+
@@ -0,0 +1,307 @@
+"""
+Completion cache for LLMService
+
+Capsule and agent chats see the same questions over and over, and each one
+pays for a full provider generation. For agents that opt in
+(Agent.completion_cache), answers are cached and replayed as a stream:
+
+- exact tier: cache_service key `completion:{agent_id}:{hash}`, the hash
+  taken over the model and the normalized final prompt (every message sent,
+  whitespace collapsed and case folded), so any change to the system
+  prompt, memory or web context, summary or history is a different entry
+- semantic tier (optional): the latest user message is embedded and
+  compared with earlier questions to the same agent, model and base system
+  prompt (the caller's system messages before memory and web context are
+  added; history isn't part of it either, since the prompt around a question
+  differs on every turn); a cosine similarity of at least
+  COMPLETION_CACHE_SIMILARITY_THRESHOLD reuses that question's cached answer.
+  Questions are matched on their own, which suits agents that answer
+  standalone questions (FAQ, capsules) rather than follow-ups.
+  Embeddings come from the provider's /embeddings endpoint with the agent's
+  key; the index of embeddings is per process, the answers are shared
+  through cache_service like the exact tier
+
+Answers expire after COMPLETION_CACHE_TTL_SECONDS. Only completed, non-empty
+generations are stored.
+
+Settings:
+    COMPLETION_CACHE_ENABLED: global switch for opted-in agents (default true)
+    COMPLETION_CACHE_TTL_SECONDS: answer lifetime (default 3600)
+    COMPLETION_CACHE_SEMANTIC: enable the semantic tier (default false)
+    COMPLETION_CACHE_SIMILARITY_THRESHOLD: minimum cosine similarity (default 0.95)
+    COMPLETION_CACHE_EMBEDDING_MODEL / COMPLETION_CACHE_EMBEDDING_DIMENSIONS
+    COMPLETION_CACHE_EMBEDDING_TIMEOUT_SECONDS: embedding call timeout (default 2)
+    COMPLETION_CACHE_SEMANTIC_MAX_SCOPES: prompts (per agent) indexed per process (default 1024)
+"""
+from typing import Any, AsyncGenerator, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import math
+import operator
+import re
+import threading
+import time
+
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.http_clients import provider_clients
+from app.services.local_cache import LocalCache
+
+# Questions remembered per indexed prompt (oldest dropped first)
+SEMANTIC_ENTRIES_PER_SCOPE = 64
+# Characters per chunk when a cached answer is streamed back
+REPLAY_CHUNK_CHARS = 64
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace and fold case"""
+    return " ".join(text.split()).casefold()
+
+
+def _digest(model: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    payload = [model or "", [[m["role"], normalize(m.get("content") or "")] for m in messages]]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def replay_chunks(content: str, size: int = REPLAY_CHUNK_CHARS) -> List[str]:
+    """Split an answer into stream chunks of about size characters, at whitespace"""
+    chunks, current = [], ""
+    for part in re.split(r"(\s+)", content):
+        current += part
+        if len(current) >= size:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class CacheLookup:
+    """
+    Outcome of a lookup: the cached answer on a hit, otherwise what store() needs
+
+    Attributes:
+        content: Cached answer (None on a miss)
+        tier: "exact" or "semantic" on a hit
+        key: Exact-tier key of the prompt
+        scope: Semantic index key (agent, model and base system prompt), None if not indexed
+        vector: Normalized embedding of the question, if one was computed
+        similarity: Similarity of a semantic hit
+    """
+
+    def __init__(self, key: str, scope: Optional[str] = None):
+        self.content: Optional[str] = None
+        self.tier: Optional[str] = None
+        self.key = key
+        self.scope = scope
+        self.vector: Optional[List[float]] = None
+        self.similarity: Optional[float] = None
+
+
+class CompletionCache:
+    """
+    Exact and semantic cache of completions, for agents with completion_cache on
+
+    Args:
+        enabled: Global switch (agents still have to opt in)
+        ttl_seconds: Lifetime of cached answers
+        semantic: Enable the semantic tier
+        threshold: Minimum cosine similarity for a semantic hit
+        embedding_model: Embedding model requested from the provider
+        embedding_dimensions: Embedding size requested (smaller is faster to compare)
+        embedding_timeout: Seconds to wait for an embedding before skipping the semantic tier
+        max_scopes: Prompts indexed per process for the semantic tier
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl_seconds: int = 3600,
+        semantic: bool = False,
+        threshold: float = 0.95,
+        embedding_model: str = "openai/text-embedding-3-small",
+        embedding_dimensions: int = 256,
+        embedding_timeout: float = 2.0,
+        max_scopes: int = 1024
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.semantic = semantic
+        self.threshold = threshold
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_timeout = embedding_timeout
+        # scope -> [(vector, exact key, expires at)], newest last
+        self._index = LocalCache(max_entries=max_scopes, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+
+    @classmethod
+    def from_settings(cls) -> "CompletionCache":
+        return cls(
+            enabled=settings.COMPLETION_CACHE_ENABLED,
+            ttl_seconds=settings.COMPLETION_CACHE_TTL_SECONDS,
+            semantic=settings.COMPLETION_CACHE_SEMANTIC,
+            threshold=settings.COMPLETION_CACHE_SIMILARITY_THRESHOLD,
+            embedding_model=settings.COMPLETION_CACHE_EMBEDDING_MODEL,
+            embedding_dimensions=settings.COMPLETION_CACHE_EMBEDDING_DIMENSIONS,
+            embedding_timeout=settings.COMPLETION_CACHE_EMBEDDING_TIMEOUT_SECONDS,
+            max_scopes=settings.COMPLETION_CACHE_SEMANTIC_MAX_SCOPES,
+        )
+
+    def enabled_for(self, agent_config: Any) -> bool:
+        return self.enabled and bool(getattr(agent_config, "completion_cache", False))
+
+    async def lookup(
+        self,
+        agent_id: str,
+        agent_config: Any,
+        messages: List[Dict[str, Any]],
+        base_prompt: Optional[List[Dict[str, Any]]] = None
+    ) -> CacheLookup:
+        """
+        Find a cached answer for the prompt: exact tier first, then the semantic tier
+        Args:
+            agent_id: Agent the prompt is sent to (entries are per agent)
+            agent_config: The agent (model and API key)
+            messages: Final prompt, as sent to the provider
+            base_prompt: System messages before any retrieved context was added
+                (scopes the semantic tier)
+        """
+        model = agent_config.model
+        result = CacheLookup(f"completion:{agent_id}:{_digest(model, messages)}")
+        self._count("lookups")
+
+        content = await self._get_answer(result.key)
+        if content is not None:
+            result.content, result.tier = content, "exact"
+            self._count("exact_hits")
+            return result
+
+        if self.semantic and messages and messages[-1]["role"] == "user":
+            result.scope = f"{agent_id}:{_digest(model, base_prompt or [])}"
+            result.vector = await self._embed(agent_config, messages[-1].get("content") or "")
+            if result.vector is not None:
+                match = self._nearest(result.scope, result.vector)
+                if match is not None:
+                    key, similarity = match
+                    content = await self._get_answer(key)
+                    if content is not None:
+                        result.content, result.tier, result.similarity = content, "semantic", similarity
+                        self._count("semantic_hits")
+                        return result
+                    self._forget(result.scope, key)
+
+        self._count("misses")
+        return result
+
+    async def store(self, lookup: CacheLookup, content: str):
+        """Cache a completed answer under the lookup's key (and index its question)"""
+        if not content.strip():
+            return
+        stored = await cache_service.aset(
+            lookup.key, {"content": content, "created_at": time.time()}, ttl_seconds=self.ttl_seconds
+        )
+        if not stored:
+            return
+        self._count("stores")
+        if lookup.scope and lookup.vector is not None:
+            with self._lock:
+                entries = [
+                    entry for entry in self._index.get(lookup.scope, []) or []
+                    if entry[1] != lookup.key and entry[2] > time.time()
+                ]
+                entries.append((lookup.vector, lookup.key, time.time() + self.ttl_seconds))
+                self._index.set(lookup.scope, entries[-SEMANTIC_ENTRIES_PER_SCOPE:])
+
+    async def replay(self, content: str) -> AsyncGenerator[str, None]:
+        """Stream a cached answer back in chunks"""
+        for chunk in replay_chunks(content):
+            yield chunk
+            await asyncio.sleep(0)
+
+    async def _get_answer(self, key: str) -> Optional[str]:
+        try:
+            value = await cache_service.aget(key)
+        except Exception as e:
+            print(f"Completion cache read failed: {e}")
+            return None
+        if isinstance(value, dict):
+            return value.get("content")
+        return None
+
+    async def _embed(self, agent_config: Any, text: str) -> Optional[List[float]]:
+        """Unit-length embedding of a question (None if the provider call fails or is slow)"""
+        self._count("embedding_calls")
+        try:
+            vector = await asyncio.wait_for(self._request_embedding(agent_config, normalize(text)), self.embedding_timeout)
+        except Exception as e:
+            self._count("embedding_errors")
+            print(f"⚠️  Completion cache embedding failed ({type(e).__name__}: {e}); skipping semantic lookup")
+            return None
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else None
+
+    async def _request_embedding(self, agent_config: Any, text: str) -> List[float]:
+        async with provider_clients.stream(
+            "openrouter",
+            "POST",
+            "/embeddings",
+            headers={
+                "Authorization": f"Bearer {agent_config.api_key or settings.OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={"model": self.embedding_model, "input": text, "dimensions": self.embedding_dimensions},
+        ) as response:
+            body = await response.aread()
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code}: {body[:200]!r}")
+            return json.loads(body)["data"][0]["embedding"]
+
+    def _nearest(self, scope: str, vector: List[float]):
+        """(key, similarity) of the most similar indexed question above the threshold"""
+        best = None
+        now = time.time()
+        for indexed, key, expires_at in self._index.get(scope, []) or []:
+            if expires_at <= now or len(indexed) != len(vector):
+                continue
+            similarity = sum(map(operator.mul, indexed, vector))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+        return best
+
+    def _forget(self, scope: str, key: str):
+        with self._lock:
+            entries = self._index.get(scope)
+            if entries:
+                self._index.set(scope, [entry for entry in entries if entry[1] != key])
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters.get("lookups", 0)
+        hits = counters.get("exact_hits", 0) + counters.get("semantic_hits", 0)
+        return {
+            "enabled": self.enabled,
+            "semantic": self.semantic,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "indexed_prompts": len(self._index),
+            **{name: counters.get(name, 0) for name in (
+                "lookups", "exact_hits", "semantic_hits", "misses", "stores", "embedding_calls", "embedding_errors"
+            )},
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters.clear()
+
+
+# Global cache shared by every LLMService
+completion_cache = CompletionCache.from_settings()
@@ -0,0 +1,246 @@
+"""
+Token-budgeted conversation context
+
+Sending a chat's whole history on every turn makes prompt size (and time to
+first token) grow with the chat until it overflows the model's context.
+ContextBuilder fits each turn into a per-model token budget instead:
+
+- the system prompt (with memory and web context) and the new message are
+  always sent
+- then the most recent history, newest first, as long as it fits (a
+  contiguous recency window - no gaps in the middle of the conversation)
+- turns that fall out of the window are covered by the chat's rolling
+  summary, which LLMService refreshes in the background (see
+  LLMService._schedule_summary) and stores on the chat. Only the chat's
+  latest CONTEXT_HISTORY_MESSAGES are loaded, so turns between the summary
+  and the loaded history are reported too (ConversationContext.unloaded)
+  for the refresh to load by seq
+
+Token counts are cached on stored messages (Message.tokens, set when the
+message is written), so building a context only counts the system prompt,
+the new message and messages stored before counts were kept. Counts use
+tiktoken's cl100k_base encoding when tiktoken is installed, otherwise an
+estimate of 4 characters per token; both are approximations for non-OpenAI
+models, which the budget's headroom absorbs.
+
+Settings:
+    CONTEXT_TOKEN_BUDGET: input tokens per turn (default 8000)
+    CONTEXT_MODEL_BUDGETS: per-model overrides, "model=tokens,prefix/*=tokens"
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+
+from app.core.config import settings
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+# Role and separator tokens the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_HEADING = "\n\nSummary of the earlier conversation:\n"
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and TIKTOKEN_AVAILABLE and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The encoding file is downloaded on first use - fall back to estimates offline
+            print(f"⚠️  tiktoken encoding unavailable ({e}); estimating token counts")
+            _encoding_failed = True
+    return _encoding
+
+
+def load_token_encoding() -> bool:
+    """
+    Load the tokenizer up front (the encoding file may be downloaded on first
+    use, which shouldn't happen inside a request)
+    Returns:
+        True if token counts will use tiktoken, False if they are estimated
+    """
+    return _get_encoding() is not None
+
+
+@lru_cache(maxsize=4096)
+def _encoded_length(text: str) -> int:
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of a text"""
+    # Only tiktoken counts are memoized; an estimate made before the encoding
+    # loaded must not outlive it
+    if _get_encoding() is not None:
+        return _encoded_length(text)
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Tokens a chat message takes in the prompt (cached count if the message has one)"""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = count_tokens(message.get("content") or "")
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationContext:
+    """
+    The messages to send for one turn
+
+    Attributes:
+        messages: Provider-ready messages (role and content only)
+        input_tokens: Approximate prompt size
+        budget: Budget the prompt was fitted to
+        history_sent: History messages in the window (excluding the new message)
+        dropped: History messages left out of the window, oldest first
+        unsummarized: Dropped messages not yet covered by the rolling summary
+        unloaded: (after, before) seqs bounding messages that are neither loaded nor
+            summarized - between the summary and the first loaded message - or None
+    """
+
+    def __init__(self, messages, input_tokens, budget, history_sent, dropped, unsummarized, unloaded=None):
+        self.messages: List[Dict[str, str]] = messages
+        self.input_tokens: int = input_tokens
+        self.budget: int = budget
+        self.history_sent: int = history_sent
+        self.dropped: List[Dict[str, Any]] = dropped
+        self.unsummarized: List[Dict[str, Any]] = unsummarized
+        self.unloaded: Optional[Tuple[int, int]] = unloaded
+
+
+class ContextBuilder:
+    """
+    Fits system prompt, rolling summary and recent history into a token budget
+
+    Args:
+        default_budget: Input tokens per turn for models without an override
+        model_budgets: Model name (or 'prefix*') -> input tokens per turn
+    """
+
+    def __init__(self, default_budget: int = 8000, model_budgets: Optional[Dict[str, int]] = None):
+        self.default_budget = default_budget
+        self.model_budgets = dict(model_budgets or {})
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.turns_trimmed = 0
+        self.input_tokens = 0
+        self.max_input_tokens = 0
+        self.messages_dropped = 0
+
+    @classmethod
+    def from_settings(cls) -> "ContextBuilder":
+        budgets: Dict[str, int] = {}
+        for item in settings.CONTEXT_MODEL_BUDGETS.split(","):
+            model, _, tokens = item.strip().rpartition("=")
+            if model and tokens.strip().isdigit():
+                budgets[model.strip()] = int(tokens)
+        return cls(settings.CONTEXT_TOKEN_BUDGET, budgets)
+
+    def budget_for(self, model: Optional[str]) -> int:
+        """The model's budget: exact name, then the longest matching 'prefix*', then the default"""
+        if model in self.model_budgets:
+            return self.model_budgets[model]
+        prefixes = [
+            pattern for pattern in self.model_budgets
+            if pattern.endswith("*") and model and model.startswith(pattern[:-1])
+        ]
+        if prefixes:
+            return self.model_budgets[max(prefixes, key=len)]
+        return self.default_budget
+
+    def build(
+        self,
+        messages: List[Dict[str, Any]],
+        model: Optional[str],
+        summary: Optional[str] = None,
+        summary_seq: Optional[int] = None
+    ) -> ConversationContext:
+        """
+        Fit a turn into the model's budget
+        Args:
+            messages: System messages followed by the history (oldest first) ending with
+                the new message; history entries may carry seq and a cached token count
+            model: Model the turn is sent to
+            summary: Rolling summary of earlier turns
+            summary_seq: Seq of the last message the summary covers
+        """
+        budget = self.budget_for(model)
+        system = [m for m in messages if m["role"] == "system"]
+        history = [m for m in messages if m["role"] != "system"]
+
+        used = sum(message_tokens(m) for m in system)
+        summary_tokens = count_tokens(SUMMARY_HEADING + summary) if summary else 0
+
+        # Recency window: the new message always, then older turns while they fit
+        start = len(history)
+        for index in range(len(history) - 1, -1, -1):
+            tokens = message_tokens(history[index])
+            if start < len(history) and used + summary_tokens + tokens > budget:
+                break
+            used += tokens
+            start = index
+        window, dropped = history[start:], history[:start]
+
+        # The summary matters once anything before the window isn't sent - dropped
+        # here or never loaded (the window doesn't begin at the chat's first message)
+        first_seq = (dropped or window)[0].get("seq") if history else None
+        if summary and (dropped or (first_seq or 0) > 0):
+            used += summary_tokens
+            if system:
+                system = [{**system[0], "content": system[0]["content"] + SUMMARY_HEADING + summary}] + system[1:]
+            else:
+                system = [{"role": "system", "content": SUMMARY_HEADING.lstrip() + summary}]
+
+        unsummarized = [
+            m for m in dropped
+            if m.get("seq") is not None and (summary_seq is None or m["seq"] > summary_seq)
+        ]
+        covered = summary_seq if summary_seq is not None else -1
+        first_loaded = history[0].get("seq") if history else None
+        unloaded = (covered, first_loaded) if first_loaded is not None and first_loaded > covered + 1 else None
+        context = ConversationContext(
+            messages=[{"role": m["role"], "content": m["content"]} for m in system + window],
+            input_tokens=used,
+            budget=budget,
+            history_sent=max(0, len(window) - 1),
+            dropped=dropped,
+            unsummarized=unsummarized,
+            unloaded=unloaded,
+        )
+        self._record(context)
+        return context
+
+    def _record(self, context: ConversationContext):
+        with self._lock:
+            self.turns += 1
+            self.input_tokens += context.input_tokens
+            self.max_input_tokens = max(self.max_input_tokens, context.input_tokens)
+            if context.dropped:
+                self.turns_trimmed += 1
+                self.messages_dropped += len(context.dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_counter": "tiktoken" if _get_encoding() is not None else "estimate",
+                "default_budget": self.default_budget,
+                "model_budgets": dict(self.model_budgets),
+                "turns": self.turns,
+                "turns_trimmed": self.turns_trimmed,
+                "messages_dropped": self.messages_dropped,
+                "mean_input_tokens": round(self.input_tokens / self.turns, 1) if self.turns else None,
+                "max_input_tokens": self.max_input_tokens,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.turns = self.turns_trimmed = self.input_tokens = self.max_input_tokens = self.messages_dropped = 0
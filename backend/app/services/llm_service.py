@@ -1,10 +1,15 @@
-from typing import List, Dict, Optional, AsyncGenerator
+from typing import Any, Awaitable, Callable, List, Dict, Optional, AsyncGenerator, Tuple
 from app.core.config import settings
 from app.models.schemas import Agent, LLMResponse
+from app.services.completion_cache import completion_cache
+from app.services.context_builder import ContextBuilder, ConversationContext, message_tokens
+from app.services.http_clients import provider_clients
+from app.services.memory_ingestion import memory_ingestion
 from app.services.memory_service import MemoryService
+from app.services.pregeneration import pregeneration
 from app.services.web_search_service import web_search, is_available as web_search_available
 
-import httpx
+import asyncio
 import json
 import logging
 
@@ -18,10 +23,23 @@ def truncate_to_words(text: str, max_words: int = 100) -> str:
     return " ".join(words[:max_words]) + "..."
 
 
+# Called with (summary, seq of the last message it covers) to store a refreshed rolling summary
+SummaryCallback = Callable[[str, int], Awaitable[Any]]
+# Called with (after, before) seqs; returns the chat's messages in between, oldest first, as history entries
+HistoryLoader = Callable[[int, int], Awaitable[List[Dict[str, Any]]]]
+
+# Most turns folded into the rolling summary per refresh (a long backlog is caught up over several turns)
+SUMMARY_BATCH_MESSAGES = 100
+
+
 class LLMService:
+    # Chats whose rolling summary is being refreshed, and the tasks doing it
+    _summarizing: set = set()
+    _summary_tasks: set = set()
+
     def __init__(self):
-        self.openrouter_base = "https://openrouter.ai/api/v1"
         self.memory_service = MemoryService()
+        self.context_builder = ContextBuilder.from_settings()
 
     # ---------------------------------------------------------------------
     # PUBLIC NON-STREAM API
@@ -35,68 +53,46 @@ class LLMService:
         chat_id: Optional[str] = None,
         memory_size: str = "Medium",
         capsule_id: Optional[str] = None,
-        web_search_enabled: bool = False
+        web_search_enabled: bool = False,
+        summary: Optional[str] = None,
+        summary_seq: Optional[int] = None,
+        on_summary: Optional[SummaryCallback] = None,
+        load_history: Optional[HistoryLoader] = None
     ) -> LLMResponse:
         """
         Get a single completion (non-streaming).
         Collects the full response from the stream and returns it as LLMResponse.
+        
+        History that doesn't fit the model's token budget is left out and covered by
+        the chat's rolling summary (summary/summary_seq); when enough turns have been
+        left out, a refreshed summary is generated in the background and passed to
+        on_summary. Turns older than the history passed in are fetched with load_history.
+        History messages may carry seq and cached tokens (see ContextBuilder).
         """
         full_content = ""
         model_name = agent_config.model or "google/gemma-3-27b-it:free"
         
-        # Get memory context
-        memory_context = ""
-        if chat_id and self.memory_service._is_available():
-            try:
-                user_message = messages[-1]["content"] if messages else ""
-                memories = self.memory_service.get_chat_memories(
-                    agent_id=agent_id,
-                    chat_id=chat_id,
-                    query=user_message,
-                    memory_size=memory_size,
-                    capsule_id=capsule_id
-                )
-                memory_context = self.memory_service.format_memory_context(memories)
-            except Exception as e:
-                # logger.warning(f"Memory retrieval failed: {e}")
-                pass
-
-        # Get web search context if enabled
-        web_search_context = ""
-        if web_search_enabled and web_search_available():
-            try:
-                user_message = messages[-1]["content"] if messages else ""
-                if user_message:
-                    logger.info(f"🔎 Performing web search for: {user_message[:50]}...")
-                    web_search_context = web_search(user_message, k=5)
-                    if web_search_context:
-                        logger.info("✅ Web search completed successfully")
-            except Exception as e:
-                # logger.warning(f"Web search failed: {e}")
-                pass
+        # Memory and web search context, retrieved concurrently
+        memory_context, web_search_context = await self._retrieve_context(
+            messages, agent_id, chat_id, memory_size, capsule_id, web_search_enabled
+        )
 
+        base_prompt = self._base_prompt(messages)
         enhanced_messages = self._inject_system_prompt(messages, memory_context, web_search_context)
+        context = self.context_builder.build(enhanced_messages, agent_config.model, summary, summary_seq)
         
-        # Collect all chunks from the stream
-        async for chunk in self._stream_completion(
-            enhanced_messages,
+        # Collect all chunks from the stream (or the cached answer)
+        async for chunk in self._generate(
+            context.messages,
             agent_config,
-            agent_id
+            agent_id,
+            base_prompt
         ):
             full_content += chunk
+        self._schedule_summary(chat_id, agent_id, agent_config, context, summary, on_summary, load_history)
 
-        # Store memory after getting full response
-        if chat_id and self.memory_service._is_available():
-            try:
-                self.memory_service.store_chat_memory(
-                    agent_id=agent_id,
-                    chat_id=chat_id,
-                    messages=messages + [{"role": "assistant", "content": full_content}],
-                    capsule_id=capsule_id
-                )
-            except Exception as e:
-                # logger.warning(f"Memory storage failed: {e}")
-                pass
+        # Store memory after getting full response (in the background)
+        await self._ingest_memory(agent_id, chat_id, messages, full_content, capsule_id)
 
         return LLMResponse(
             content=full_content,
@@ -117,61 +113,34 @@ class LLMService:
         chat_id: Optional[str] = None,
         memory_size: str = "Medium",
         capsule_id: Optional[str] = None,
-        web_search_enabled: bool = False
+        web_search_enabled: bool = False,
+        summary: Optional[str] = None,
+        summary_seq: Optional[int] = None,
+        on_summary: Optional[SummaryCallback] = None,
+        load_history: Optional[HistoryLoader] = None
     ) -> AsyncGenerator[str, None]:
 
-        memory_context = ""
-        if chat_id and self.memory_service._is_available():
-            try:
-                user_message = messages[-1]["content"] if messages else ""
-                memories = self.memory_service.get_chat_memories(
-                    agent_id=agent_id,
-                    chat_id=chat_id,
-                    query=user_message,
-                    memory_size=memory_size,
-                    capsule_id=capsule_id
-                )
-                memory_context = self.memory_service.format_memory_context(memories)
-            except Exception as e:
-                # logger.warning(f"Memory retrieval failed: {e}")
-                pass
-
-        # Get web search context if enabled
-        web_search_context = ""
-        if web_search_enabled and web_search_available():
-            try:
-                user_message = messages[-1]["content"] if messages else ""
-                if user_message:
-                    logger.info(f"🔎 Performing web search for: {user_message[:50]}...")
-                    web_search_context = web_search(user_message, k=5)
-                    if web_search_context:
-                        logger.info("✅ Web search completed successfully")
-            except Exception as e:
-                # logger.warning(f"Web search failed: {e}")
-                pass
+        memory_context, web_search_context = await self._retrieve_context(
+            messages, agent_id, chat_id, memory_size, capsule_id, web_search_enabled
+        )
 
+        base_prompt = self._base_prompt(messages)
         enhanced_messages = self._inject_system_prompt(messages, memory_context, web_search_context)
+        context = self.context_builder.build(enhanced_messages, agent_config.model, summary, summary_seq)
 
         full_content = ""
-        async for chunk in self._stream_completion(
-            enhanced_messages,
+        async for chunk in self._generate(
+            context.messages,
             agent_config,
-            agent_id
+            agent_id,
+            base_prompt
         ):
             full_content += chunk
             yield chunk
+        self._schedule_summary(chat_id, agent_id, agent_config, context, summary, on_summary, load_history)
 
-        if chat_id and self.memory_service._is_available():
-            try:
-                self.memory_service.store_chat_memory(
-                    agent_id=agent_id,
-                    chat_id=chat_id,
-                    messages=messages + [{"role": "assistant", "content": full_content}],
-                    capsule_id=capsule_id
-                )
-            except Exception as e:
-                # logger.warning(f"Memory storage failed: {e}")
-                pass
+        # Memory is stored in the background, so the stream ends with the last token
+        await self._ingest_memory(agent_id, chat_id, messages, full_content, capsule_id)
 
     # ---------------------------------------------------------------------
     # SINGLE STREAM ROUTER (THE FIX)
@@ -206,6 +175,38 @@ class LLMService:
         ):
             yield chunk
 
+    async def _generate(
+        self,
+        messages: List[Dict[str, str]],
+        agent_config: Agent,
+        agent_id: str,
+        base_prompt: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        _stream_completion behind the completion cache, for agents that opted in
+        (Agent.completion_cache): a cached answer to the same prompt - or, with the
+        semantic tier, a near-identical question under the same base_prompt (see
+        _base_prompt) - is replayed instead of generated
+        """
+        if not completion_cache.enabled_for(agent_config):
+            async for chunk in self._stream_completion(messages, agent_config, agent_id):
+                yield chunk
+            return
+
+        lookup = await completion_cache.lookup(agent_id, agent_config, messages, base_prompt)
+        if lookup.content is not None:
+            logger.info(f"⚡ Completion cache {lookup.tier} hit for agent {agent_id}")
+            async for chunk in completion_cache.replay(lookup.content):
+                yield chunk
+            return
+
+        content = ""
+        async for chunk in self._stream_completion(messages, agent_config, agent_id):
+            content += chunk
+            yield chunk
+        # Only reached when the generation completed
+        await completion_cache.store(lookup, content)
+
     # ---------------------------------------------------------------------
     # PROVIDER STREAM IMPLEMENTATIONS
     # ---------------------------------------------------------------------
@@ -234,36 +235,210 @@ class LLMService:
         model = model or "openai/gpt-4-turbo"
         api_key = api_key or settings.OPENROUTER_API_KEY
 
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                "POST",
-                f"{self.openrouter_base}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://solmind.ai",
-                    "X-Title": "SolMind"
-                },
-                json={
-                    "model": model,
-                    "messages": messages,
-                    "stream": True
-                },
-                timeout=60
-            ) as response:
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data.strip() == "[DONE]":
-                            break
-                        payload = json.loads(data)
-                        delta = payload["choices"][0].get("delta", {})
-                        if content := delta.get("content"):
-                            yield content
+        # Pooled keep-alive connection (see app.services.http_clients)
+        async with provider_clients.stream(
+            "openrouter",
+            "POST",
+            "/chat/completions",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://solmind.ai",
+                "X-Title": "SolMind"
+            },
+            json={
+                "model": model,
+                "messages": messages,
+                "stream": True
+            }
+        ) as response:
+
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    data = line[6:]
+                    if data.strip() == "[DONE]":
+                        # Read on to the end of the body (nothing follows [DONE])
+                        # so the connection goes back to the pool instead of closing
+                        continue
+                    payload = json.loads(data)
+                    delta = payload["choices"][0].get("delta", {})
+                    if content := delta.get("content"):
+                        yield content
+
+    # ---------------------------------------------------------------------
+    # PRE-GENERATION RETRIEVAL
+    # ---------------------------------------------------------------------
+
+    async def _retrieve_context(
+        self,
+        messages: List[Dict[str, Any]],
+        agent_id: str,
+        chat_id: Optional[str],
+        memory_size: str,
+        capsule_id: Optional[str],
+        web_search_enabled: bool
+    ) -> Tuple[str, str]:
+        """
+        Memory and web search context for the latest user message
+        Both lookups are blocking client calls; they run concurrently off the event loop,
+        each bounded by its own timeout (see PreGenerationPipeline), so a turn waits for
+        the slower of the two at most. A lookup that fails or times out adds no context.
+        Returns:
+            (memory_context, web_search_context)
+        """
+        user_message = messages[-1]["content"] if messages else ""
+        stages = {}
+        if chat_id and self.memory_service._is_available():
+            def retrieve_memories():
+                memories = self.memory_service.get_chat_memories(
+                    agent_id=agent_id,
+                    chat_id=chat_id,
+                    query=user_message,
+                    memory_size=memory_size,
+                    capsule_id=capsule_id
+                )
+                return self.memory_service.format_memory_context(memories)
+
+            stages["memory"] = (retrieve_memories, settings.MEMORY_RETRIEVAL_TIMEOUT_SECONDS)
+
+        if web_search_enabled and user_message and web_search_available():
+            logger.info(f"🔎 Performing web search for: {user_message[:50]}...")
+            stages["web_search"] = (lambda: web_search(user_message, k=5), settings.WEB_SEARCH_TIMEOUT_SECONDS)
+
+        results = await pregeneration.run(stages)
+        if results.get("web_search"):
+            logger.info("✅ Web search completed successfully")
+        return results.get("memory") or "", results.get("web_search") or ""
+
+    async def _ingest_memory(
+        self,
+        agent_id: str,
+        chat_id: Optional[str],
+        messages: List[Dict[str, Any]],
+        answer: str,
+        capsule_id: Optional[str]
+    ):
+        """Queue the finished turn for memory storage (see MemoryIngestionWorker)"""
+        if not chat_id or not self.memory_service._is_available():
+            return
+        try:
+            await memory_ingestion.submit(
+                self.memory_service,
+                agent_id,
+                chat_id,
+                self._plain(messages) + [{"role": "assistant", "content": answer}],
+                capsule_id
+            )
+        except Exception as e:
+            # logger.warning(f"Memory storage failed: {e}")
+            pass
+
+    # ---------------------------------------------------------------------
+    # ROLLING SUMMARY
+    # ---------------------------------------------------------------------
+
+    @staticmethod
+    def _plain(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Messages without the seq/token bookkeeping fields"""
+        return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+    def _schedule_summary(
+        self,
+        chat_id: Optional[str],
+        agent_id: str,
+        agent_config: Agent,
+        context: ConversationContext,
+        summary: Optional[str],
+        on_summary: Optional[SummaryCallback],
+        load_history: Optional[HistoryLoader] = None
+    ):
+        """
+        Refresh the chat's rolling summary in the background once the turns left out of
+        the context and not yet summarized reach CONTEXT_SUMMARY_MIN_TOKENS
+        (one refresh per chat at a time, never on the response path)
+
+        Turns that weren't loaded at all (context.unloaded, older than the history
+        passed in) come first; they are fetched with load_history, oldest first and
+        at most SUMMARY_BATCH_MESSAGES per refresh, so the summary stays contiguous.
+        """
+        pending = context.unsummarized
+        unloaded = context.unloaded if load_history else None
+        if not (settings.CONTEXT_SUMMARY_ENABLED and chat_id and on_summary and (pending or unloaded)):
+            return
+        if chat_id in LLMService._summarizing:
+            return
+        if not unloaded and sum(message_tokens(m) for m in pending) < settings.CONTEXT_SUMMARY_MIN_TOKENS:
+            return
+
+        async def refresh():
+            try:
+                turns = pending
+                if unloaded:
+                    after, before = unloaded
+                    limit = min(before - after - 1, SUMMARY_BATCH_MESSAGES)
+                    turns = await load_history(after, after + 1 + limit) + pending
+                turns = turns[:SUMMARY_BATCH_MESSAGES]
+                if not turns or sum(message_tokens(m) for m in turns) < settings.CONTEXT_SUMMARY_MIN_TOKENS:
+                    return
+                text = await self._summarize(agent_id, agent_config, summary, turns)
+                if text:
+                    await on_summary(text, turns[-1]["seq"])
+            except Exception as e:
+                logger.warning(f"Conversation summary failed for chat {chat_id}: {e}")
+            finally:
+                LLMService._summarizing.discard(chat_id)
+
+        LLMService._summarizing.add(chat_id)
+        task = asyncio.create_task(refresh())
+        # Hold a reference so the task isn't garbage collected mid-run
+        LLMService._summary_tasks.add(task)
+        task.add_done_callback(LLMService._summary_tasks.discard)
+
+    async def _summarize(
+        self,
+        agent_id: str,
+        agent_config: Agent,
+        summary: Optional[str],
+        turns: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Fold turns into the previous summary with the chat's own model
+        Falls back to an extractive summary (the start of each turn) if the model call fails
+        """
+        max_words = settings.CONTEXT_SUMMARY_MAX_WORDS
+        transcript = "\n".join(f"{m['role']}: {truncate_to_words(m['content'], 150)}" for m in turns)
+        prompt = [
+            {
+                "role": "system",
+                "content": (
+                    "Summarize the conversation for use as context in its later turns. Keep facts, names, "
+                    "numbers, decisions and open questions; drop pleasantries. Write plain prose of at most "
+                    f"{max_words} words and nothing else."
+                )
+            },
+            {
+                "role": "user",
+                "content": (f"Summary so far:\n{summary}\n\n" if summary else "") + f"New turns:\n{transcript}"
+            },
+        ]
+        try:
+            text = ""
+            async for chunk in self._stream_completion(prompt, agent_config, agent_id):
+                text += chunk
+            if text.strip():
+                return truncate_to_words(text.strip(), max_words)
+        except Exception as e:
+            logger.warning(f"Summary model call failed, using an extractive summary: {e}")
+        extract = " ".join(f"{m['role']}: {truncate_to_words(m['content'], 30)}" for m in turns)
+        return truncate_to_words(f"{summary} {extract}" if summary else extract, max_words)
 
     # ---------------------------------------------------------------------
 
+    @staticmethod
+    def _base_prompt(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """The caller's system messages, copied before _inject_system_prompt adds context to them"""
+        return [{"role": "system", "content": m["content"]} for m in messages if m["role"] == "system"]
+
     def _inject_system_prompt(self, messages, memory_context="", web_search_context=""):
         system_prompt = "You are a helpful assistant. Please keep your responses concise and aim for approximately 100 words. Complete your thoughts naturally within this limit."
         
@@ -284,3 +459,19 @@ class LLMService:
             return messages
 
         return [{"role": "system", "content": system_prompt}] + messages
+
+
+_llm_service: Optional[LLMService] = None
+
+
+def get_llm_service() -> LLMService:
+    """The process-wide LLMService (its memory client is created once, not per request)"""
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = LLMService()
+    return _llm_service
+
+
+def created_llm_service() -> Optional[LLMService]:
+    """The process-wide LLMService if a request has created it, without creating one (for metrics)"""
+    return _llm_service
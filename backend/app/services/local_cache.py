@@ -0,0 +1,546 @@
+"""
+Bounded in-process caches
+
+- LocalCache: LRU with TTL, used by CacheService as an optional L1 tier in
+  front of Redis so hot keys that rarely change (agents, chat metadata,
+  preferences) don't cost a network round trip on every read.
+- InMemoryStore: Redis-like fallback backend used when Redis is unavailable,
+  with TTL expiry, entry/byte budgets and LRU or LFU eviction.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import fnmatch
+import heapq
+import json
+import os
+import threading
+import time
+
+_MISSING = object()
+
+
+class LocalCache:
+    """
+    Thread-safe LRU cache bounded by entry count, with optional per-entry TTL
+
+    Keeps hit/miss/eviction counters so the size can be tuned from stats().
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        """
+        Args:
+            max_entries: Maximum number of entries before the least recently used is evicted
+            ttl_seconds: Default time to live for entries (None = no expiry)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str, default: Any = None, is_valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Get a value, refreshing its LRU position
+        Args:
+            key: Cache key
+            default: Returned on a miss
+            is_valid: Optional check on the stored value; entries failing it are dropped
+        Returns:
+            Stored value or default (expired and invalid entries count as misses)
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if is_valid is not None and not is_valid(value):
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries if over capacity"""
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        """Remove a key. Returns True if it was present."""
+        with self._lock:
+            if self._entries.pop(key, _MISSING) is _MISSING:
+                return False
+            self.invalidations += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for tuning max_entries / ttl_seconds"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+def _estimate_size(value: Any) -> int:
+    """Cheap approximation of a value's memory footprint in bytes"""
+    if isinstance(value, (bytes, str)):
+        return len(value) + 49
+    if isinstance(value, (int, float, bool)) or value is None:
+        return 28
+    try:
+        return len(json.dumps(value, default=str)) + 64
+    except (TypeError, ValueError):
+        return 256
+
+
+class _Hash(dict):
+    """field -> value mapping held by InMemoryStore for hash keys"""
+
+
+class _SortedSet(dict):
+    """member -> score mapping held by InMemoryStore for sorted-set keys"""
+
+
+def _parse_score_bound(bound: Any) -> Tuple[float, bool]:
+    """Parse a Redis score bound ('+inf', '-inf', '(1.5', 3) into (value, exclusive)"""
+    if isinstance(bound, str):
+        exclusive = bound.startswith("(")
+        return float(bound[1:] if exclusive else bound), exclusive
+    return float(bound), False
+
+
+class _LRUPolicy:
+    """Evicts the least recently used key"""
+
+    def __init__(self):
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+
+    def add(self, key: str):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def touch(self, key: str):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+
+class _LFUPolicy:
+    """Evicts the least frequently used key (ties broken by recency), O(1) per operation"""
+
+    def __init__(self):
+        self._freq: Dict[str, int] = {}
+        self._buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_freq = 0
+
+    def add(self, key: str):
+        if key in self._freq:
+            self.touch(key)
+            return
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def touch(self, key: str):
+        freq = self._freq.get(key)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def remove(self, key: str):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+
+    def victim(self) -> Optional[str]:
+        if not self._buckets:
+            return None
+        if self._min_freq not in self._buckets:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+
+class InMemoryStore:
+    """
+    Redis-like in-process key/value store used when Redis is unavailable
+
+    - Honors per-key TTLs (expired keys are dropped on access and swept on writes)
+    - Bounded by entry count and an approximate byte budget, evicting by LRU or LFU
+    - Supports list values (RPUSH/LRANGE/LLEN), hashes (HSET/HGETALL/HINCRBY)
+      and sorted sets (ZADD/ZREM/ZREVRANGEBYSCORE) alongside plain values
+    - Glob-style clear_pattern resolves through a prefix index, so clearing
+      `chat:*` only touches the matching keys instead of scanning everything
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, eviction: str = "lru"):
+        """
+        Args:
+            max_entries: Maximum number of keys
+            max_bytes: Approximate memory budget for all values
+            eviction: 'lru' or 'lfu'
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.eviction = eviction.lower()
+        self._policy = _LFUPolicy() if self.eviction == "lfu" else _LRUPolicy()
+        self._data: Dict[str, Any] = {}
+        self._sizes: Dict[str, int] = {}
+        self._expires: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._prefix_index: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "InMemoryStore":
+        """
+        Build a store from environment:
+            CACHE_MEMORY_MAX_ENTRIES (default 10000)
+            CACHE_MEMORY_MAX_BYTES (default 64MB)
+            CACHE_MEMORY_EVICTION (lru or lfu, default lru)
+        """
+        return cls(
+            max_entries=int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024))),
+            eviction=os.getenv("CACHE_MEMORY_EVICTION", "lru"),
+        )
+
+    # ------------------------------------------------------------------
+    # Internal bookkeeping
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _prefixes(key: str) -> List[str]:
+        """Every ':'-terminated prefix of a key ('a:b:c' -> ['a:', 'a:b:'])"""
+        prefixes = []
+        index = key.find(":")
+        while index != -1:
+            prefixes.append(key[:index + 1])
+            index = key.find(":", index + 1)
+        return prefixes
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return False
+        return key in self._data
+
+    def _remove(self, key: str) -> bool:
+        if key not in self._data:
+            return False
+        del self._data[key]
+        self._bytes -= self._sizes.pop(key, 0)
+        self._expires.pop(key, None)
+        self._policy.remove(key)
+        for prefix in self._prefixes(key):
+            bucket = self._prefix_index.get(prefix)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._prefix_index[prefix]
+        return True
+
+    def _store(self, key: str, value: Any, size: int, ttl_seconds: Optional[float] = None, keep_ttl: bool = False):
+        is_new = key not in self._data
+        self._data[key] = value
+        self._bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        if is_new:
+            self._policy.add(key)
+            for prefix in self._prefixes(key):
+                self._prefix_index.setdefault(prefix, set()).add(key)
+        else:
+            self._policy.touch(key)
+        if ttl_seconds:
+            expires_at = time.monotonic() + ttl_seconds
+            self._expires[key] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+        elif not keep_ttl:
+            self._expires.pop(key, None)
+        self._sweep_expired()
+        self._enforce_limits(protect=key)
+
+    def _sweep_expired(self):
+        now = time.monotonic()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            # Skip heap entries made stale by a later SET with a different TTL
+            if self._expires.get(key) == expires_at:
+                self._remove(key)
+                self.expirations += 1
+
+    def _enforce_limits(self, protect: Optional[str] = None):
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            victim = self._policy.victim()
+            if victim is None or (victim == protect and len(self._data) == 1):
+                break
+            if victim == protect:
+                # Never evict the key being written - evict the next candidate instead
+                self._policy.touch(protect)
+                victim = self._policy.victim()
+                if victim == protect:
+                    break
+            self._remove(victim)
+            self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Plain values
+    # ------------------------------------------------------------------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if not self._alive(key):
+                return default
+            self._policy.touch(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        with self._lock:
+            self._store(key, value, _estimate_size(value), ttl_seconds)
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._remove(key))
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return self._alive(key)
+
+    # ------------------------------------------------------------------
+    # Lists
+    # ------------------------------------------------------------------
+
+    def rpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            items = self._data.get(key) if self._alive(key) else None
+            if not isinstance(items, list):
+                items = []
+            items.extend(values)
+            size = self._sizes.get(key, 64) + sum(_estimate_size(value) for value in values)
+            self._store(key, items, size, keep_ttl=True)
+            return len(items)
+
+    def lrange(self, key: str, start: int, stop: int) -> list:
+        with self._lock:
+            items = self.get(key)
+            if not isinstance(items, list):
+                return []
+            length = len(items)
+            if start < 0:
+                start = max(length + start, 0)
+            if stop < 0:
+                stop = length + stop
+            return items[start:stop + 1]
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            items = self.get(key)
+            return len(items) if isinstance(items, list) else 0
+
+    # ------------------------------------------------------------------
+    # Hashes
+    # ------------------------------------------------------------------
+
+    def _hash(self, key: str) -> "_Hash":
+        fields = self._data.get(key) if self._alive(key) else None
+        return fields if isinstance(fields, _Hash) else _Hash()
+
+    def _store_hash(self, key: str, fields: "_Hash"):
+        size = 64 + sum(len(str(field)) + _estimate_size(value) for field, value in fields.items())
+        self._store(key, fields, size, keep_ttl=True)
+
+    def hset(self, key: str, field: Optional[str] = None, value: Any = None, values: Optional[Dict[str, Any]] = None) -> int:
+        """Set one field or a mapping of fields; returns how many fields were new"""
+        with self._lock:
+            fields = self._hash(key)
+            updates = dict(values or {})
+            if field is not None:
+                updates[field] = value
+            added = sum(1 for name in updates if name not in fields)
+            fields.update(updates)
+            self._store_hash(key, fields)
+            return added
+
+    def hgetall(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            current = self.get(key)
+            return dict(current) if isinstance(current, _Hash) else {}
+
+    def hmget(self, key: str, *fields: str) -> list:
+        with self._lock:
+            current = self.get(key)
+            if not isinstance(current, _Hash):
+                return [None] * len(fields)
+            return [current.get(field) for field in fields]
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            fields = self._hash(key)
+            fields[field] = int(fields.get(field) or 0) + amount
+            self._store_hash(key, fields)
+            return fields[field]
+
+    # ------------------------------------------------------------------
+    # Sorted sets
+    # ------------------------------------------------------------------
+
+    def zadd(self, key: str, mapping: Dict[str, float], nx: bool = False, xx: bool = False) -> int:
+        """Add/update members (nx: only add new ones, xx: only update existing ones)"""
+        with self._lock:
+            members = self._data.get(key) if self._alive(key) else None
+            if not isinstance(members, _SortedSet):
+                if xx:
+                    return 0
+                members = _SortedSet()
+            added = 0
+            for member, score in mapping.items():
+                if member in members:
+                    if not nx:
+                        members[member] = float(score)
+                elif not xx:
+                    members[member] = float(score)
+                    added += 1
+            if members:
+                self._store(key, members, 64 + sum(len(str(member)) + 32 for member in members), keep_ttl=True)
+            return added
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self._lock:
+            current = self.get(key)
+            if not isinstance(current, _SortedSet):
+                return 0
+            removed = sum(1 for member in members if current.pop(member, None) is not None)
+            if not current:
+                self._remove(key)
+            return removed
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            current = self.get(key)
+            return len(current) if isinstance(current, _SortedSet) else 0
+
+    def zrevrangebyscore(
+        self,
+        key: str,
+        max: Any,
+        min: Any,
+        withscores: bool = False,
+        offset: Optional[int] = None,
+        count: Optional[int] = None
+    ) -> list:
+        """Members with min <= score <= max, highest first (ties by member, descending)"""
+        with self._lock:
+            current = self.get(key)
+            if not isinstance(current, _SortedSet):
+                return []
+            high, high_open = _parse_score_bound(max)
+            low, low_open = _parse_score_bound(min)
+            ranked = sorted(current.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        selected = [
+            (member, score) for member, score in ranked
+            if (score < high or (score == high and not high_open))
+            and (score > low or (score == low and not low_open))
+        ]
+        if offset is not None and count is not None:
+            selected = selected[offset:offset + count] if count >= 0 else selected[offset:]
+        if withscores:
+            return selected
+        return [member for member, _ in selected]
+
+    # ------------------------------------------------------------------
+    # Patterns and stats
+    # ------------------------------------------------------------------
+
+    def keys_matching(self, pattern: str) -> List[str]:
+        """Keys matching a Redis-style glob pattern (e.g. 'chat:*')"""
+        with self._lock:
+            self._sweep_expired()
+            literal_end = len(pattern)
+            for index, char in enumerate(pattern):
+                if char in "*?[\\":
+                    literal_end = index
+                    break
+            literal = pattern[:literal_end]
+            if literal_end == len(pattern):
+                return [pattern] if self._alive(pattern) else []
+
+            # Narrow the candidates to the longest indexed prefix of the literal part
+            index_prefix = literal[:literal.rfind(":") + 1]
+            candidates = self._prefix_index.get(index_prefix, set()) if index_prefix else self._data.keys()
+            if pattern == index_prefix + "*":
+                return list(candidates)
+            return [key for key in candidates if fnmatch.fnmatchcase(key, pattern)]
+
+    def clear_pattern(self, pattern: str) -> int:
+        with self._lock:
+            return self.delete(*self.keys_matching(pattern))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sweep_expired()
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "eviction": self.eviction,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,6 +1,8 @@
 from typing import List
 from app.db.database import get_supabase
 from app.models.schemas import Capsule, MarketplaceFilters
+from app.core.config import settings
+from app.services.cache_service import cache_service
 
 
 class MarketplaceService:
@@ -15,52 +17,16 @@ class MarketplaceService:
     async def browse_capsules(self, filters: MarketplaceFilters, limit: int, offset: int) -> List[Capsule]:
         """Browse marketplace with filters - only shows capsules that have been staked"""
         try:
-            self._check_supabase()
-            
-            # Debug: Check all capsules first
-            all_capsules = self.supabase.table("capsules").select("id, name, stake_amount").execute()
-            print(f"Total capsules in DB: {len(all_capsules.data)}")
-            if all_capsules.data:
-                print(f"All capsule stake_amounts: {[(row.get('id'), row.get('name'), row.get('stake_amount'), type(row.get('stake_amount'))) for row in all_capsules.data]}")
-            
-            # Only show capsules that have been staked (stake_amount > 0)
-            # Try filtering with numeric comparison - Supabase might need the value as string for NUMERIC type
-            # First, get all capsules and filter in Python to ensure it works
-            all_query = self.supabase.table("capsules").select("*")
-            
-            if filters.category:
-                all_query = all_query.eq("category", filters.category)
-            if filters.min_reputation:
-                all_query = all_query.gte("reputation", filters.min_reputation)
-            if filters.max_price:
-                all_query = all_query.lte("price_per_query", filters.max_price)
-            
-            # Get all matching capsules first
-            all_result = all_query.execute()
-            
-            # Filter in Python to ensure stake_amount > 0 (handles type conversion issues)
-            filtered_capsules = []
-            for row in all_result.data:
-                stake_amount = row.get("stake_amount")
-                # Debug each capsule
-                print(f"Checking capsule {row.get('id')}: stake_amount={stake_amount}, type={type(stake_amount)}")
-                
-                # Convert to float if it's a string or other type
-                if stake_amount is not None:
-                    try:
-                        stake_float = float(stake_amount)
-                        print(f"  Converted to float: {stake_float}, is > 0: {stake_float > 0}")
-                        if stake_float > 0:
-                            filtered_capsules.append(row)
-                            print(f"  ✓ Added to filtered list")
-                        else:
-                            print(f"  ✗ Skipped (stake_amount <= 0)")
-                    except (ValueError, TypeError) as e:
-                        # Skip if we can't convert to float
-                        print(f"  ✗ Error converting to float: {e}")
-                        continue
-                else:
-                    print(f"  ✗ Skipped (stake_amount is None)")
+            # Staked capsules matching the filters: cached briefly and loaded by
+            # one request at a time, then sorted and paginated per request
+            filtered_capsules = await cache_service.get_or_load(
+                f"marketplace:browse:{filters.category}:{filters.min_reputation}:{filters.max_price}",
+                lambda: self._load_staked_capsules(filters),
+                ttl_seconds=settings.MARKETPLACE_CACHE_TTL_SECONDS,
+                cache_if=lambda rows: rows is not None
+            )
+            # Coalesced callers share the loaded list - sort a copy
+            filtered_capsules = list(filtered_capsules)
             
             # Apply sorting
             if filters.sort_by == "popular":
@@ -77,7 +43,7 @@ class MarketplaceService:
             # Apply pagination
             paginated_capsules = filtered_capsules[offset:offset + limit]
             
-            print(f"Marketplace query: {len(all_result.data)} total, {len(filtered_capsules)} with stake > 0, returning {len(paginated_capsules)}")
+            print(f"Marketplace query: {len(filtered_capsules)} with stake > 0, returning {len(paginated_capsules)}")
             if paginated_capsules:
                 print(f"Sample capsule stake_amounts: {[row.get('stake_amount') for row in paginated_capsules[:3]]}")
             
@@ -88,14 +54,73 @@ class MarketplaceService:
             traceback.print_exc()
             return []
     
+    async def _load_staked_capsules(self, filters: MarketplaceFilters) -> List[dict]:
+        """Query Supabase for capsules matching the filters that have been staked"""
+        self._check_supabase()
+        
+        # Debug: Check all capsules first
+        all_capsules = self.supabase.table("capsules").select("id, name, stake_amount").execute()
+        print(f"Total capsules in DB: {len(all_capsules.data)}")
+        if all_capsules.data:
+            print(f"All capsule stake_amounts: {[(row.get('id'), row.get('name'), row.get('stake_amount'), type(row.get('stake_amount'))) for row in all_capsules.data]}")
+        
+        # Only show capsules that have been staked (stake_amount > 0)
+        # Try filtering with numeric comparison - Supabase might need the value as string for NUMERIC type
+        # First, get all capsules and filter in Python to ensure it works
+        all_query = self.supabase.table("capsules").select("*")
+        
+        if filters.category:
+            all_query = all_query.eq("category", filters.category)
+        if filters.min_reputation:
+            all_query = all_query.gte("reputation", filters.min_reputation)
+        if filters.max_price:
+            all_query = all_query.lte("price_per_query", filters.max_price)
+        
+        # Get all matching capsules first
+        all_result = all_query.execute()
+        
+        # Filter in Python to ensure stake_amount > 0 (handles type conversion issues)
+        filtered_capsules = []
+        for row in all_result.data:
+            stake_amount = row.get("stake_amount")
+            # Debug each capsule
+            print(f"Checking capsule {row.get('id')}: stake_amount={stake_amount}, type={type(stake_amount)}")
+            
+            # Convert to float if it's a string or other type
+            if stake_amount is not None:
+                try:
+                    stake_float = float(stake_amount)
+                    print(f"  Converted to float: {stake_float}, is > 0: {stake_float > 0}")
+                    if stake_float > 0:
+                        filtered_capsules.append(row)
+                        print(f"  ✓ Added to filtered list")
+                    else:
+                        print(f"  ✗ Skipped (stake_amount <= 0)")
+                except (ValueError, TypeError) as e:
+                    # Skip if we can't convert to float
+                    print(f"  ✗ Error converting to float: {e}")
+                    continue
+            else:
+                print(f"  ✗ Skipped (stake_amount is None)")
+        
+        print(f"Marketplace load: {len(all_result.data)} total, {len(filtered_capsules)} with stake > 0")
+        return filtered_capsules
+    
     async def get_trending_capsules(self, limit: int) -> List[Capsule]:
         """Get trending capsules - only shows capsules that have been staked"""
         try:
-            self._check_supabase()
-            # Get all capsules, filter by stake_amount > 0 in Python
-            result = self.supabase.table("capsules").select("*").order("query_count", desc=True).execute()
-            # Filter to only show staked capsules
-            filtered = [row for row in result.data if row.get("stake_amount") and float(row.get("stake_amount") or 0) > 0]
+            async def load() -> List[dict]:
+                self._check_supabase()
+                # Get all capsules, filter by stake_amount > 0 in Python
+                result = self.supabase.table("capsules").select("*").order("query_count", desc=True).execute()
+                # Filter to only show staked capsules
+                return [row for row in result.data if row.get("stake_amount") and float(row.get("stake_amount") or 0) > 0]
+            
+            filtered = await cache_service.get_or_load(
+                "marketplace:trending", load,
+                ttl_seconds=settings.MARKETPLACE_CACHE_TTL_SECONDS,
+                cache_if=lambda rows: rows is not None
+            )
             return [Capsule(**row) for row in filtered[:limit]]
         except Exception as e:
             print(f"Error fetching trending: {e}")
@@ -104,10 +129,15 @@ class MarketplaceService:
     async def get_categories(self) -> List[str]:
         """Get all available categories"""
         try:
-            self._check_supabase()
-            result = self.supabase.table("capsules").select("category").execute()
-            categories = list(set([row["category"] for row in result.data]))
-            return sorted(categories)
+            async def load() -> List[str]:
+                self._check_supabase()
+                result = self.supabase.table("capsules").select("category").execute()
+                categories = list(set([row["category"] for row in result.data]))
+                return sorted(categories)
+            
+            return await cache_service.get_or_load(
+                "marketplace:categories", load, ttl_seconds=settings.MARKETPLACE_CACHE_TTL_SECONDS
+            )
         except Exception as e:
             print(f"Error fetching categories: {e}")
             return ["Finance", "Gaming", "Health", "Technology", "Education"]
@@ -115,11 +145,18 @@ class MarketplaceService:
     async def search_capsules(self, query: str, limit: int) -> List[Capsule]:
         """Search capsules by name or description - only shows capsules that have been staked"""
         try:
-            self._check_supabase()
-            # Supabase text search (if configured)
-            result = self.supabase.table("capsules").select("*").or_(f"name.ilike.%{query}%,description.ilike.%{query}%").execute()
-            # Filter to only show staked capsules
-            filtered = [row for row in result.data if row.get("stake_amount") and float(row.get("stake_amount") or 0) > 0]
+            async def load() -> List[dict]:
+                self._check_supabase()
+                # Supabase text search (if configured)
+                result = self.supabase.table("capsules").select("*").or_(f"name.ilike.%{query}%,description.ilike.%{query}%").execute()
+                # Filter to only show staked capsules
+                return [row for row in result.data if row.get("stake_amount") and float(row.get("stake_amount") or 0) > 0]
+            
+            filtered = await cache_service.get_or_load(
+                f"marketplace:search:{query}", load,
+                ttl_seconds=settings.MARKETPLACE_CACHE_TTL_SECONDS,
+                cache_if=lambda rows: rows is not None
+            )
             return [Capsule(**row) for row in filtered[:limit]]
         except Exception as e:
             print(f"Error searching capsules: {e}")
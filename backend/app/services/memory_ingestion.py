@@ -0,0 +1,270 @@
+"""
+Background memory ingestion
+
+Storing a finished turn in mem0 (MemoryService.store_chat_memory) runs an
+LLM-based extraction and can take seconds. Done inline, it held back the end
+of every response: the SSE stream's `done` event and the assistant message
+save waited for it. LLMService now submits the turn here and returns as soon
+as the last token is out:
+
+- Bounded queue: at most MEMORY_INGESTION_QUEUE_SIZE turns wait at a time.
+  When it is full, submit() waits up to MEMORY_INGESTION_ENQUEUE_TIMEOUT_SECONDS
+  for space (backpressure on the producing request), then drops the turn
+  and counts it, so an unavailable mem0 never backs up into responses.
+- Workers: MEMORY_INGESTION_WORKERS tasks each store one turn at a time on a
+  worker thread (the mem0 client is synchronous).
+- Retry: a failed store is retried with exponential backoff, up to
+  MEMORY_INGESTION_MAX_ATTEMPTS attempts; waiting retries don't hold a worker.
+- Shutdown: close() stops accepting turns, moves waiting retries back into
+  the queue and drains it for up to MEMORY_INGESTION_SHUTDOWN_TIMEOUT_SECONDS.
+- Deleted chats: discard_chat() makes queued turns of a chat whose memories
+  are being deleted skip storage, so they don't recreate them.
+
+Before start() (scripts, or MEMORY_INGESTION_ENABLED=false) turns are stored
+immediately on a worker thread, without queueing.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.local_cache import LocalCache
+
+
+class _Turn:
+    """One finished turn waiting to be stored"""
+
+    __slots__ = ("memory_service", "agent_id", "chat_id", "messages", "capsule_id", "attempts", "submitted_at")
+
+    def __init__(
+        self,
+        memory_service: Any,
+        agent_id: str,
+        chat_id: str,
+        messages: List[Dict[str, str]],
+        capsule_id: Optional[str]
+    ):
+        self.memory_service = memory_service
+        self.agent_id = agent_id
+        self.chat_id = chat_id
+        self.messages = messages
+        self.capsule_id = capsule_id
+        self.attempts = 0
+        self.submitted_at = time.perf_counter()
+
+
+class MemoryIngestionWorker:
+    """
+    Bounded background queue in front of MemoryService.store_chat_memory
+
+    Usage:
+        await memory_ingestion.submit(memory_service, agent_id, chat_id, messages, capsule_id)
+
+    Args:
+        enabled: False stores every turn immediately (no queue)
+        queue_size: Turns that may wait at a time
+        workers: Turns stored concurrently
+        max_attempts: Attempts per turn before it is given up
+        enqueue_timeout: Seconds submit() waits for queue space before dropping the turn
+        shutdown_timeout: Seconds close() spends draining the queue
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        queue_size: int = 1000,
+        workers: int = 2,
+        max_attempts: int = 4,
+        enqueue_timeout: float = 0.5,
+        shutdown_timeout: float = 10.0
+    ):
+        self.enabled = enabled
+        self.queue_size = max(1, queue_size)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.enqueue_timeout = enqueue_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Dict[asyncio.TimerHandle, _Turn] = {}
+        self._closing = False
+        # Chats whose memories were deleted while turns of theirs were queued
+        self._discarded = LocalCache(max_entries=10000, ttl_seconds=3600)
+        self.submitted = 0
+        self.stored = 0
+        self.failed_attempts = 0
+        self.given_up = 0
+        self.dropped = 0
+        self.skipped = 0  # Deleted chats, or turns mem0 had nothing to store for
+        self._stored_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "MemoryIngestionWorker":
+        return cls(
+            enabled=settings.MEMORY_INGESTION_ENABLED,
+            queue_size=settings.MEMORY_INGESTION_QUEUE_SIZE,
+            workers=settings.MEMORY_INGESTION_WORKERS,
+            max_attempts=settings.MEMORY_INGESTION_MAX_ATTEMPTS,
+            enqueue_timeout=settings.MEMORY_INGESTION_ENQUEUE_TIMEOUT_SECONDS,
+            shutdown_timeout=settings.MEMORY_INGESTION_SHUTDOWN_TIMEOUT_SECONDS,
+        )
+
+    # ============================================
+    # Lifecycle
+    # ============================================
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and not self._closing
+
+    async def start(self):
+        """Start the worker tasks"""
+        if not self.enabled or self._tasks:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop accepting turns, then store what is queued (up to shutdown_timeout)"""
+        if not self._tasks:
+            return
+        self._closing = True
+        # Retries waiting for their backoff get one last attempt now
+        for handle, turn in list(self._retries.items()):
+            handle.cancel()
+            self._enqueue_nowait(turn)
+        self._retries.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Memory ingestion shutdown timed out, {self._queue.qsize()} turn(s) not stored")
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ============================================
+    # Producers
+    # ============================================
+
+    async def submit(
+        self,
+        memory_service: Any,
+        agent_id: str,
+        chat_id: str,
+        messages: List[Dict[str, str]],
+        capsule_id: Optional[str] = None
+    ) -> bool:
+        """
+        Queue a finished turn for storage
+        Args:
+            memory_service: MemoryService to store with
+            agent_id: Agent the memories belong to
+            chat_id: Chat the turn is from
+            messages: The turn (user messages and the assistant answer)
+            capsule_id: Optional capsule scope
+        Returns:
+            True if the turn was queued (or stored), False if it was dropped
+        """
+        turn = _Turn(memory_service, agent_id, chat_id, messages, capsule_id)
+        self.submitted += 1
+        if not self.running:
+            await self._store(turn)
+            return True
+        try:
+            await asyncio.wait_for(self._queue.put(turn), self.enqueue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            print(f"⚠️  Memory ingestion queue full ({self.queue_size}), dropped a turn of chat {chat_id}")
+            return False
+
+    def discard_chat(self, chat_id: str):
+        """Skip queued turns of a chat (its memories are being deleted)"""
+        self._discarded.set(chat_id, True)
+
+    # ============================================
+    # Workers
+    # ============================================
+
+    async def _run(self):
+        while True:
+            turn = await self._queue.get()
+            try:
+                await self._store(turn)
+            except Exception as e:
+                print(f"Error in memory ingestion worker: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _store(self, turn: _Turn):
+        if self._discarded.get(turn.chat_id):
+            self.skipped += 1
+            return
+        turn.attempts += 1
+        try:
+            stored = await asyncio.to_thread(
+                turn.memory_service.store_chat_memory,
+                agent_id=turn.agent_id,
+                chat_id=turn.chat_id,
+                messages=turn.messages,
+                capsule_id=turn.capsule_id,
+                raise_errors=True
+            )
+        except Exception as e:
+            self.failed_attempts += 1
+            if turn.attempts < self.max_attempts and self.running:
+                delay = min(2.0 ** turn.attempts, 60.0)
+                print(f"Memory storage for chat {turn.chat_id} failed (attempt {turn.attempts}), retrying in {delay:.0f}s: {e}")
+                self._schedule_retry(turn, delay)
+            else:
+                self.given_up += 1
+                print(f"❌ Memory storage for chat {turn.chat_id} failed after {turn.attempts} attempt(s): {e}")
+            return
+        if not stored:
+            # Memory unavailable or nothing worth storing - not an error
+            self.skipped += 1
+            return
+        self.stored += 1
+        self._stored_seconds += time.perf_counter() - turn.submitted_at
+
+    def _schedule_retry(self, turn: _Turn, delay: float):
+        def requeue():
+            self._retries.pop(handle, None)
+            self._enqueue_nowait(turn)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries[handle] = turn
+
+    def _enqueue_nowait(self, turn: _Turn):
+        try:
+            self._queue.put_nowait(turn)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"⚠️  Memory ingestion queue full, dropped a retry for chat {turn.chat_id}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "waiting_retries": len(self._retries),
+            "submitted": self.submitted,
+            "stored": self.stored,
+            "failed_attempts": self.failed_attempts,
+            "given_up": self.given_up,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            # Submission to stored, including queueing and retries
+            "mean_store_ms": round(self._stored_seconds * 1000 / self.stored, 1) if self.stored else None,
+        }
+
+    def reset_stats(self):
+        self.submitted = self.stored = self.failed_attempts = self.given_up = self.dropped = self.skipped = 0
+        self._stored_seconds = 0.0
+
+
+# Global worker shared by every LLMService (started and drained in main.py lifespan)
+memory_ingestion = MemoryIngestionWorker.from_settings()
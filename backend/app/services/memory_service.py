@@ -180,7 +180,8 @@ class MemoryService:
         agent_id: str,
         chat_id: str,
         messages: List[Dict[str, str]],
-        capsule_id: Optional[str] = None
+        capsule_id: Optional[str] = None,
+        raise_errors: bool = False
     ) -> bool:
         """
         Store new memory from conversation (scoped by capsule if provided)
@@ -190,6 +191,7 @@ class MemoryService:
             chat_id: Chat identifier (stored in metadata)
             messages: List of message dicts with 'role' and 'content' keys
             capsule_id: Optional capsule ID for memory isolation
+            raise_errors: Raise mem0 errors instead of returning False (so callers can retry)
         
         Returns:
             True if memory was stored successfully, False otherwise
@@ -231,6 +233,8 @@ class MemoryService:
         except Exception as e:
             # logger.error(f"❌ Error storing memory for chat {chat_id}: {e}")
             # logger.error(f"   Agent: {agent_id}, Messages: {len(messages)}")
+            if raise_errors:
+                raise
             return False
     
     def format_memory_context(self, memories: List[Dict]) -> str:
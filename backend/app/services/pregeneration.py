@@ -0,0 +1,150 @@
+"""
+Pre-generation context retrieval
+
+Before a completion is sent, LLMService gathers memory context (mem0) and
+web search context (Tavily). Both clients are synchronous, so calling them
+inline blocks the event loop for every other request, and calling them one
+after the other makes each turn wait for their sum.
+
+PreGenerationPipeline runs the stages concurrently on a dedicated, bounded
+thread pool (so slow retrievals can't exhaust the loop's default executor,
+which other services use for their own blocking work), each with its own
+timeout. A stage that fails or times out contributes no context instead of
+holding up the turn; its thread finishes in the background and the result
+is discarded.
+
+Settings:
+    RETRIEVAL_MAX_WORKERS: threads shared by all retrieval stages (default 16)
+    MEMORY_RETRIEVAL_TIMEOUT_SECONDS: memory stage timeout (default 3)
+    WEB_SEARCH_TIMEOUT_SECONDS: web search stage timeout (default 8)
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import threading
+import time
+
+from app.core.config import settings
+
+
+class _StageStats:
+    """Latency and outcome counters for one retrieval stage"""
+
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "mean_ms": round(self.seconds * 1000 / self.calls, 3) if self.calls else None,
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class PreGenerationPipeline:
+    """
+    Runs blocking retrieval stages concurrently off the event loop
+
+    Usage:
+        results = await pregeneration.run({
+            "memory": (lambda: memory_service.get_chat_memories(...), settings.MEMORY_RETRIEVAL_TIMEOUT_SECONDS),
+            "web_search": (lambda: web_search(query), settings.WEB_SEARCH_TIMEOUT_SECONDS),
+        })
+        memories = results["memory"]  # None if the stage failed or timed out
+
+    Args:
+        max_workers: Threads shared by all stages
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats: Dict[str, _StageStats] = {}
+        self._turns = 0
+        self._wall_seconds = 0.0
+        self._stage_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "PreGenerationPipeline":
+        return cls(max(1, settings.RETRIEVAL_MAX_WORKERS))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retrieval")
+        return self._executor
+
+    async def run(self, stages: Dict[str, Tuple[Callable[[], Any], float]]) -> Dict[str, Any]:
+        """
+        Run stages concurrently and wait for all of them (each up to its timeout)
+        Args:
+            stages: Stage name -> (blocking callable, timeout in seconds)
+        Returns:
+            Stage name -> the callable's result, or None if it raised or timed out
+        """
+        if not stages:
+            return {}
+        started = time.perf_counter()
+        names = list(stages)
+        results = await asyncio.gather(*(self._run_stage(name, *stages[name]) for name in names))
+        wall = time.perf_counter() - started
+        with self._lock:
+            self._turns += 1
+            self._wall_seconds += wall
+            self._stage_seconds += sum(seconds for _, seconds in results)
+        return {name: value for name, (value, _) in zip(names, results)}
+
+    async def _run_stage(self, name: str, func: Callable[[], Any], timeout: float) -> Tuple[Any, float]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        value, timed_out, failed = None, False, False
+        try:
+            value = await asyncio.wait_for(loop.run_in_executor(self._get_executor(), func), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            print(f"⚠️  {name} retrieval timed out after {timeout}s; continuing without it")
+        except Exception as e:
+            failed = True
+            print(f"⚠️  {name} retrieval failed: {e}")
+        seconds = time.perf_counter() - started
+        with self._lock:
+            stats = self._stats.setdefault(name, _StageStats())
+            stats.calls += 1
+            stats.timeouts += timed_out
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+        return value, seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "turns": self._turns,
+                "mean_wall_ms": round(self._wall_seconds * 1000 / self._turns, 3) if self._turns else None,
+                # Time the stages would have taken back to back, minus the time they took together
+                "saved_ms": round((self._stage_seconds - self._wall_seconds) * 1000, 1),
+                "stages": {name: stats.snapshot() for name, stats in self._stats.items()},
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+            self._turns = 0
+            self._wall_seconds = self._stage_seconds = 0.0
+
+    def close(self):
+        """Stop the thread pool without waiting for abandoned (timed out) stages"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global pipeline shared by every LLMService
+pregeneration = PreGenerationPipeline.from_settings()
@@ -0,0 +1,172 @@
+"""
+Redis client construction for CacheService
+
+Two transports are supported:
+- REST (upstash-redis): Vercel KV / Upstash, sync and async clients. The
+  async client keeps one pooled keep-alive HTTP client per process.
+- RESP over TCP (redis-py): a local or standard Redis server, with a shared
+  connection pool for the sync client and another for the async client.
+
+RESP clients are wrapped to follow the upstash-redis call conventions
+(pipeline()/multi() + exec(), scan(type=...), hset(values=...),
+zrevrangebyscore(offset=, count=)), so
+CacheService has a single code path whatever the transport.
+
+Environment:
+    CACHE_REDIS_TRANSPORT: auto (default), rest or resp
+        auto uses REST when REST credentials are set, otherwise RESP
+    KV_REST_API_URL / UPSTASH_REDIS_REST_URL and matching *_TOKEN: REST endpoint
+    REDIS_URL / KV_URL: redis:// or rediss:// URL for RESP
+    REDIS_MAX_CONNECTIONS: pool size for RESP clients (default 50)
+"""
+from typing import Any, List, Optional, Tuple
+import os
+
+try:
+    from upstash_redis import Redis as UpstashRedis
+    from upstash_redis.asyncio import Redis as AsyncUpstashRedis
+    UPSTASH_AVAILABLE = True
+except ImportError:
+    UpstashRedis = None  # type: ignore
+    AsyncUpstashRedis = None  # type: ignore
+    UPSTASH_AVAILABLE = False
+
+try:
+    import redis as redis_py
+    import redis.asyncio as redis_py_async
+    REDIS_PY_AVAILABLE = True
+except ImportError:
+    redis_py = None  # type: ignore
+    redis_py_async = None  # type: ignore
+    REDIS_PY_AVAILABLE = False
+
+RESP_SCHEMES = ("redis://", "rediss://", "unix://")
+
+
+def resolve_redis_config() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Work out which transport to use from the environment
+    Returns:
+        (transport, url, token) where transport is 'rest', 'resp' or None
+    """
+    transport = os.getenv("CACHE_REDIS_TRANSPORT", "auto").lower()
+
+    # Check for Vercel KV environment variables (try all possible names)
+    rest_url = next(
+        (
+            url for url in (
+                os.getenv('KV_REST_API_URL'),
+                os.getenv('KV_URL'),
+                os.getenv('REDIS_URL'),
+                os.getenv('UPSTASH_REDIS_REST_URL'),
+            )
+            if url and not url.startswith(RESP_SCHEMES)
+        ),
+        None
+    )
+    token = (
+        os.getenv('KV_REST_API_TOKEN') or
+        os.getenv('UPSTASH_REDIS_REST_TOKEN')
+    )
+    resp_url = next(
+        (url for url in (os.getenv('REDIS_URL'), os.getenv('KV_URL')) if url and url.startswith(RESP_SCHEMES)),
+        None
+    )
+
+    if transport in ("auto", "rest") and rest_url and token and UPSTASH_AVAILABLE:
+        return "rest", rest_url, token
+    if transport in ("auto", "resp") and resp_url and REDIS_PY_AVAILABLE:
+        return "resp", resp_url, None
+    return None, None, None
+
+
+def _max_connections() -> int:
+    return int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+
+
+def create_sync_client(transport: str, url: str, token: Optional[str]) -> Any:
+    """Create the blocking client used by CacheService's sync methods"""
+    if transport == "rest":
+        return UpstashRedis(url=url, token=token)
+    pool = redis_py.ConnectionPool.from_url(url, max_connections=_max_connections(), decode_responses=True)
+    return RespClient(redis_py.Redis(connection_pool=pool))
+
+
+def create_async_client(transport: str, url: str, token: Optional[str]) -> Any:
+    """
+    Create the non-blocking client used by CacheService's a* methods.
+    Must be closed with `await client.close()` on shutdown.
+    """
+    if transport == "rest":
+        return AsyncUpstashRedis(url=url, token=token)
+    pool = redis_py_async.ConnectionPool.from_url(url, max_connections=_max_connections(), decode_responses=True)
+    return AsyncRespClient(redis_py_async.Redis(connection_pool=pool))
+
+
+class _RespCommands:
+    """Argument conventions that differ between redis-py and upstash-redis"""
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None, **kwargs) -> Any:
+        return self._client.set(key, value, ex=ex, **kwargs)
+
+    def scan(self, cursor: int, match: Optional[str] = None, count: Optional[int] = None, type: Optional[str] = None) -> Any:
+        return self._client.scan(cursor, match=match, count=count, _type=type)
+
+    def hset(self, key: str, field: Optional[str] = None, value: Any = None, values: Optional[dict] = None) -> Any:
+        return self._client.hset(key, field, value, mapping=values)
+
+    def zrevrangebyscore(
+        self,
+        key: str,
+        max: Any,
+        min: Any,
+        withscores: bool = False,
+        offset: Optional[int] = None,
+        count: Optional[int] = None
+    ) -> Any:
+        return self._client.zrevrangebyscore(key, max, min, start=offset, num=count, withscores=withscores)
+
+    def eval(self, script: str, keys: Optional[List[str]] = None, args: Optional[List[Any]] = None) -> Any:
+        keys = keys or []
+        return self._client.eval(script, len(keys), *keys, *(args or []))
+
+
+class RespClient(_RespCommands):
+    """Sync redis-py client with upstash-style pipelines"""
+
+    def pipeline(self) -> "RespPipeline":
+        return RespPipeline(self._client.pipeline(transaction=False))
+
+    def multi(self) -> "RespPipeline":
+        return RespPipeline(self._client.pipeline(transaction=True))
+
+
+class RespPipeline(_RespCommands):
+    def exec(self) -> List[Any]:
+        return self._client.execute()
+
+
+class AsyncRespClient(_RespCommands):
+    """Async redis-py client (pooled TCP connections) with upstash-style pipelines"""
+
+    def pipeline(self) -> "AsyncRespPipeline":
+        return AsyncRespPipeline(self._client.pipeline(transaction=False))
+
+    def multi(self) -> "AsyncRespPipeline":
+        return AsyncRespPipeline(self._client.pipeline(transaction=True))
+
+    async def close(self):
+        # redis-py >= 5.0.1 renamed close() to aclose()
+        close = getattr(self._client, "aclose", None) or self._client.close
+        await close()
+
+
+class AsyncRespPipeline(_RespCommands):
+    async def exec(self) -> List[Any]:
+        return await self._client.execute()
@@ -0,0 +1,513 @@
+"""
+Repositories for AgentService's agents, chats and messages
+
+Tiers:
+- local: bounded SpillStore namespaces of this worker (agents stay in memory
+  only because they carry API keys)
+- redis: cache_service - the agent list per wallet, chat hashes, message
+  lists and the chat indexes
+- database: agents live in Supabase (or SQLite with STORAGE_BACKEND=sqlite);
+  the insert is written inline (it carries the API key, which must not reach
+  the on-disk journal), updates and deletes through the write-behind journal.
+  Chats and messages only have a database tier with the SQLite store, which
+  has the tables for them
+
+Consistency rules:
+- agents: written to every tier. Only the database and the local copy hold
+  API keys (Redis keeps the key-less list per wallet); Redis is the system
+  of record, so a lookup still reaches it after a database miss
+- agent lists: Redis loads from the database on a miss (one loader per
+  wallet at a time); the database and local copies serve when it can't
+- chats: one system of record (Redis by default); when it is unavailable
+  writes go to the first available fallback tier instead of every tier
+- messages: written through the same tiers as chats by default and always
+  read from the tier their chat was found in, so a chat and its history are
+  never served from different tiers
+"""
+from typing import Any, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+
+from app.db.database import get_local_db, get_supabase, is_no_rows_error
+from app.services.cache_service import cache_service, chat_activity_score, decode_chat_cursor, encode_chat_cursor
+from app.services.spill_store import local_store
+from app.services.tiered_repository import ReadResult, TieredRepository, TierPolicy
+from app.services.write_behind import write_behind
+
+# Local copies (persist across requests). Bounded by LOCAL_STORE_MAX_BYTES; least
+# recently used chats/messages spill to local disk, agents are kept in memory only
+local_agents = local_store.namespace("agents", spill=False)
+local_chats = local_store.namespace("chats")
+local_messages = local_store.namespace("messages")
+
+AGENT_POLICY = TierPolicy.from_env("agents", TierPolicy(
+    read=("local", "database", "redis"), write=("redis", "database", "local")
+))
+AGENT_LIST_POLICY = TierPolicy.from_env("agent_lists", TierPolicy(
+    read=("redis", "database", "local"), write=("redis",)
+))
+CHAT_POLICY = TierPolicy.from_env("chats", TierPolicy(
+    read=("redis", "database", "local"), write=("redis",), fallback=("database", "local")
+))
+MESSAGE_POLICY = TierPolicy.from_env("messages", CHAT_POLICY)
+
+# Fields of an agent kept outside the database (no API key)
+AGENT_LIST_FIELDS = (
+    "id", "name", "display_name", "platform", "api_key_configured", "model", "user_wallet", "completion_cache"
+)
+
+
+class _AgentStoreRepository(TieredRepository):
+    """Tier availability shared by the AgentService repositories"""
+
+    def __init__(self, policy: TierPolicy, database: Any):
+        super().__init__(policy)
+        self.database = database
+
+    def available(self, tier: str) -> bool:
+        if tier == "redis":
+            return cache_service.redis_available
+        if tier == "database":
+            return self.database is not None
+        return True
+
+
+class AgentRepository(_AgentStoreRepository):
+    """Agent configs (with API keys) by agent ID"""
+
+    entity = "agents"
+
+    def __init__(self, policy: TierPolicy = AGENT_POLICY):
+        super().__init__(policy, get_supabase())
+
+    async def get(self, agent_id: str, wallet_address: Optional[str]) -> ReadResult:
+        """
+        Agent data, with the API key unless only Redis had the agent
+        Returns:
+            ReadResult with the agent dict as value
+        """
+        async def from_local():
+            agent_data = local_agents.get(agent_id)
+            if agent_data is None or (wallet_address and agent_data.get("user_wallet") != wallet_address):
+                return None
+            return dict(agent_data)
+
+        async def from_database():
+            query = self.database.table("agents").select("*").eq("id", agent_id)
+            if wallet_address:
+                query = query.eq("user_wallet", wallet_address)
+            try:
+                return (await asyncio.to_thread(query.single().execute)).data or None
+            except Exception as e:
+                if is_no_rows_error(e):
+                    return None
+                raise
+
+        async def from_redis():
+            # Custom agents are listed per wallet in Redis, without their API key
+            for agent_data in await cache_service.get_user_agents(wallet_address):
+                if agent_data.get("id") == agent_id:
+                    return {**agent_data, "api_key": None}
+            return None
+
+        readers = {"local": from_local, "database": from_database}
+        if wallet_address and agent_id.startswith("custom-"):
+            readers["redis"] = from_redis
+        return await self._read("get", readers, fill={"local": self._store_local})
+
+    async def create(self, agent_data: dict, api_key: str) -> List[str]:
+        """
+        Args:
+            agent_data: AGENT_LIST_FIELDS of the new agent
+            api_key: Stored only in the database and local tiers
+        """
+        wallet_address = agent_data["user_wallet"]
+
+        async def to_database():
+            # Inline, not journaled: the journal is a plain file on disk and API keys
+            # stay in process memory and the database only. Later journaled updates
+            # and deletes of the agent are queued after this has committed
+            row = {**agent_data, "api_key": api_key}
+            await asyncio.to_thread(self.database.table("agents").insert(row).execute)
+
+        async def to_redis():
+            if not await cache_service.add_user_agent(wallet_address, agent_data):
+                raise Exception(f"Redis write of agent {agent_data['id']} failed")
+
+        async def to_local():
+            await self._store_local({**agent_data, "api_key": api_key})
+
+        return await self._write("create", {"database": to_database, "redis": to_redis, "local": to_local})
+
+    async def update(self, agent_id: str, wallet_address: str, changes: dict) -> List[str]:
+        async def to_database():
+            await write_behind.update(
+                "agents", changes, {"id": agent_id, "user_wallet": wallet_address}, entity=f"agent:{agent_id}"
+            )
+
+        async def to_redis():
+            agents = await cache_service.get_user_agents(wallet_address)
+            for agent_data in agents:
+                if agent_data.get("id") == agent_id:
+                    agent_data.update(changes)
+            if not await cache_service.set_user_agents(wallet_address, agents):
+                raise Exception(f"Redis write of agent {agent_id} failed")
+
+        async def to_local():
+            agent_data = local_agents.get(agent_id)
+            if agent_data is not None:
+                local_agents[agent_id] = {**agent_data, **changes}
+
+        return await self._write("update", {"database": to_database, "redis": to_redis, "local": to_local})
+
+    async def delete(self, agent_id: str, wallet_address: str) -> List[str]:
+        async def from_database():
+            # Journaled after any pending update of the agent
+            await write_behind.delete("agents", {"id": agent_id, "user_wallet": wallet_address}, entity=f"agent:{agent_id}")
+
+        async def from_redis():
+            agents = await cache_service.get_user_agents(wallet_address)
+            if not await cache_service.set_user_agents(wallet_address, [a for a in agents if a.get("id") != agent_id]):
+                raise Exception(f"Redis delete of agent {agent_id} failed")
+
+        async def from_local():
+            local_agents.pop(agent_id, None)
+
+        deleters = {"database": from_database, "local": from_local}
+        if wallet_address:
+            deleters["redis"] = from_redis
+        return await self._delete("delete", deleters)
+
+    @staticmethod
+    async def _store_local(agent_data: dict):
+        if agent_data.get("api_key"):
+            local_agents[agent_data["id"]] = agent_data
+
+
+class AgentListRepository(_AgentStoreRepository):
+    """Key-less agent lists per wallet"""
+
+    entity = "agent_lists"
+
+    def __init__(self, policy: TierPolicy = AGENT_LIST_POLICY):
+        super().__init__(policy, get_supabase())
+
+    async def list(self, wallet_address: Optional[str]) -> ReadResult:
+        """
+        Returns:
+            ReadResult with a list of agent dicts (AGENT_LIST_FIELDS) as value
+        """
+        async def from_redis():
+            # On a miss one request per wallet loads from the database and
+            # re-populates Redis; concurrent requests wait for it
+            return await cache_service.load_user_agents(wallet_address, lambda: self._load(wallet_address))
+
+        async def from_database():
+            return await cache_service.coalesce(f"agents:{wallet_address or '*'}", lambda: self._load(wallet_address))
+
+        async def from_local():
+            return [
+                {field: agent_data.get(field) for field in AGENT_LIST_FIELDS}
+                for _, agent_data in local_agents.items()
+                if not wallet_address or agent_data.get("user_wallet") == wallet_address
+            ]
+
+        readers = {"database": from_database, "local": from_local}
+        if wallet_address:
+            readers["redis"] = from_redis
+        return await self._read("list", readers)
+
+    async def _load(self, wallet_address: Optional[str]) -> List[dict]:
+        """A wallet's agents from the database in the shape stored in Redis"""
+        if self.database is None:
+            raise Exception("Supabase not configured")
+        query = self.database.table("agents").select(", ".join(AGENT_LIST_FIELDS))
+        if wallet_address:
+            query = query.eq("user_wallet", wallet_address)
+        rows = (await asyncio.to_thread(query.execute)).data
+        return [{field: row.get(field) for field in AGENT_LIST_FIELDS} for row in rows]
+
+
+class ChatRepository(_AgentStoreRepository):
+    """Chat metadata (name, counters, owner) and the per-agent chat listings"""
+
+    entity = "chats"
+
+    def __init__(self, policy: TierPolicy = CHAT_POLICY):
+        super().__init__(policy, get_local_db())
+        # Chat rows written to Supabase by earlier versions are removed on delete
+        supabase = get_supabase()
+        self.legacy_database = supabase if supabase is not self.database else None
+
+    async def get(self, chat_id: str) -> ReadResult:
+        """
+        Returns:
+            ReadResult with the chat dict (no messages) as value; its tier is where the messages are
+        """
+        async def from_redis():
+            return await cache_service.get_chat(chat_id) or None
+
+        async def from_database():
+            query = self.database.table("chats").select("*").eq("id", chat_id)
+            rows = (await asyncio.to_thread(query.execute)).data
+            return rows[0] if rows else None
+
+        async def from_local():
+            chat_data = local_chats.get(chat_id)
+            return dict(chat_data) if chat_data is not None else None
+
+        return await self._read("get", {"redis": from_redis, "database": from_database, "local": from_local})
+
+    async def page(
+        self,
+        agent_id: str,
+        wallet_address: Optional[str],
+        cursor: Optional[str],
+        limit: Optional[int],
+        summary: bool
+    ) -> ReadResult:
+        """
+        One page of an agent's chats, most recently active first
+        Returns:
+            ReadResult with ([(chat dict, messages)], next_cursor) as value (messages are [] for summaries)
+        """
+        async def from_redis():
+            # The wallet index when a wallet is given, otherwise the global agent index;
+            # both are sorted sets ordered by last activity
+            chat_ids, next_cursor = await cache_service.get_chat_page(agent_id, wallet_address, cursor, limit)
+            # All chats (and their messages unless summarizing) in one round trip
+            loaded = await cache_service.get_chats_bulk(chat_ids, include_messages=not summary)
+            rows = []
+            for chat_id in chat_ids:
+                chat_data, messages_data = loaded.get(chat_id, (None, []))
+                if chat_data and self._belongs(chat_data, agent_id, wallet_address):
+                    rows.append((chat_data, messages_data))
+            return rows, next_cursor
+
+        async def from_database():
+            query = self.database.table("chats").select("*").eq("agent_id", agent_id)
+            if wallet_address:
+                query = query.eq("user_wallet", wallet_address)
+            page, next_cursor = self._paginate((await asyncio.to_thread(query.execute)).data, cursor, limit)
+            if summary:
+                return [(chat_data, []) for chat_data in page], next_cursor
+            return [
+                (chat_data, (await asyncio.to_thread(self.database.message_page, chat_data["id"], None))[0])
+                for chat_data in page
+            ], next_cursor
+
+        async def from_local():
+            chats = [dict(chat_data) for _, chat_data in local_chats.items() if self._belongs(chat_data, agent_id, wallet_address)]
+            page, next_cursor = self._paginate(chats, cursor, limit)
+            return [
+                (chat_data, [] if summary else local_messages.get(chat_data["id"], []))
+                for chat_data in page
+            ], next_cursor
+
+        return await self._read("page", {"redis": from_redis, "database": from_database, "local": from_local})
+
+    async def create(self, chat_data: dict) -> List[str]:
+        async def to_redis():
+            # The cache_service helpers report Redis errors as False; raise so the
+            # fallback tier takes the chat instead of it being lost
+            if not await cache_service.save_chat(chat_data):
+                raise Exception(f"Redis write of chat {chat_data['id']} failed")
+            # No messages key yet - an empty Redis list simply doesn't exist.
+            # Add to the wallet chat index and the global agent chat index
+            # (one pipelined ZADD; the global index serves lookups without a wallet)
+            listed = await cache_service.add_chat_to_list(
+                chat_data["agent_id"], chat_data["user_wallet"], chat_data["id"],
+                datetime.fromisoformat(chat_data["timestamp"])
+            )
+            if not listed:
+                # Don't leave a chat behind that no listing can reach
+                await cache_service.delete_chat(chat_data["id"])
+                raise Exception(f"Redis index update for chat {chat_data['id']} failed")
+
+        async def to_database():
+            await asyncio.to_thread(self.database.table("chats").insert(chat_data).execute)
+
+        async def to_local():
+            local_chats[chat_data["id"]] = chat_data
+            local_messages[chat_data["id"]] = []
+
+        return await self._write("create", {"redis": to_redis, "database": to_database, "local": to_local})
+
+    async def update(self, chat_id: str, changes: dict, tier: str) -> List[str]:
+        """
+        Update edited fields only - message_count/last_message are maintained by
+        MessageRepository.append and must not be overwritten
+        Args:
+            tier: Where the chat was found. A chat held by a fallback tier is updated
+                there only, so no tier ends up with a partial copy of it
+        """
+        async def to_redis():
+            if not await cache_service.save_chat({"id": chat_id, **changes}):
+                raise Exception(f"Redis write of chat {chat_id} failed")
+
+        async def to_database():
+            await asyncio.to_thread(self.database.table("chats").update(changes).eq("id", chat_id).execute)
+
+        async def to_local():
+            chat_data = local_chats.get(chat_id)
+            if chat_data is not None:
+                local_chats[chat_id] = {**chat_data, **changes}
+
+        writers = {"redis": to_redis, "database": to_database, "local": to_local}
+        if tier not in self.policy.write:
+            try:
+                await self._call(tier, "update", writers[tier])
+                return [tier]
+            except Exception as e:
+                print(f"Error writing chats to {tier}: {e}")
+                return []
+        return await self._write("update", writers)
+
+    async def delete(self, agent_id: str, wallet_address: Optional[str], chat_ids: List[str]) -> List[str]:
+        """Delete chats and their messages from every tier (one call per tier for the whole batch)"""
+        async def from_redis():
+            # Chats, messages and index entries in one pipeline
+            await cache_service.purge_chats(agent_id, wallet_address, chat_ids)
+
+        async def from_database():
+            await asyncio.to_thread(self.database.table("messages").delete().in_("chat_id", chat_ids).execute)
+            await asyncio.to_thread(self.database.table("chats").delete().in_("id", chat_ids).execute)
+
+        async def from_local():
+            for chat_id in chat_ids:
+                local_chats.pop(chat_id, None)
+                local_messages.pop(chat_id, None)
+
+        deleted = await self._delete("delete", {"redis": from_redis, "database": from_database, "local": from_local})
+        if self.legacy_database is not None:
+            try:
+                # Messages first (CASCADE would handle them, but explicit is clearer);
+                # one entity keeps the two deletes in order
+                entity = f"chats:agent:{agent_id}"
+                await write_behind.delete("messages", {"chat_id": chat_ids}, entity=entity)
+                await write_behind.delete("chats", {"id": chat_ids}, entity=entity)
+            except Exception:
+                # Legacy Supabase rows are best effort; the chats are gone from every tier
+                pass
+        return deleted
+
+    @staticmethod
+    def _belongs(chat_data: dict, agent_id: str, wallet_address: Optional[str]) -> bool:
+        return chat_data.get("agent_id") == agent_id and (
+            not wallet_address or chat_data.get("user_wallet") == wallet_address
+        )
+
+    @staticmethod
+    def _paginate(chats: List[dict], cursor: Optional[str], limit: Optional[int]) -> Tuple[List[dict], Optional[str]]:
+        """Apply the Redis index ordering and cursor rules to chats read from another tier"""
+        def activity(chat_data: dict) -> float:
+            # Last message time, or creation time for chats without messages
+            timestamp = chat_data.get("last_activity") or chat_data.get("timestamp")
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            return chat_activity_score(timestamp)
+
+        ranked = sorted(((activity(chat), chat["id"], chat) for chat in chats), key=lambda item: item[:2], reverse=True)
+        max_score, after_id = decode_chat_cursor(cursor)
+        if after_id is not None:
+            ranked = [item for item in ranked if (item[0], item[1]) < (max_score, after_id)]
+        if limit is None or len(ranked) <= limit:
+            return [chat for _, _, chat in ranked], None
+        page = ranked[:limit]
+        return [chat for _, _, chat in page], encode_chat_cursor(page[-1][0], page[-1][1])
+
+
+class MessageRepository(_AgentStoreRepository):
+    """Chat histories, appended to and read by seq"""
+
+    entity = "messages"
+
+    def __init__(self, policy: TierPolicy = MESSAGE_POLICY):
+        super().__init__(policy, get_local_db())
+
+    async def append(
+        self,
+        chat_id: str,
+        message: dict,
+        last_message: str,
+        now: datetime,
+        tier: Optional[str] = None
+    ) -> List[str]:
+        """
+        Append a message and bump its chat's message_count, last_message and activity
+        Args:
+            tier: Where the chat was found. A chat held by a fallback tier gets its
+                messages there, next to the ones it already has
+        """
+        async def to_redis():
+            # RPUSH the message and bump the chat's counters in place (HINCRBY
+            # message_count + HSET last_message) in one round trip - no re-read
+            # of the chat. A failed pipeline (CacheError) raises so the fallback
+            # tier keeps the message
+            chat_meta = await cache_service.record_chat_message(chat_id, last_message, now, message)
+            if chat_meta:
+                # Move the chat to the top of its listings (a missed move only affects ordering)
+                await cache_service.touch_chat(chat_meta["agent_id"], chat_meta["user_wallet"], chat_id, now)
+
+        async def to_database():
+            # Message, message_count and last_message in one transaction
+            await asyncio.to_thread(self.database.append_message, message, last_message, now.isoformat())
+
+        async def to_local():
+            local_messages.append(chat_id, message)
+            chat_data = local_chats.get(chat_id)
+            if chat_data is not None:
+                local_chats[chat_id] = {
+                    **chat_data,
+                    "message_count": len(local_messages.get(chat_id, [])),
+                    "last_message": last_message,
+                    "last_activity": now.isoformat()
+                }
+
+        writers = {"redis": to_redis, "database": to_database, "local": to_local}
+        if tier is not None and tier not in self.policy.write:
+            try:
+                await self._call(tier, "append", writers[tier])
+                return [tier]
+            except Exception as e:
+                print(f"Error writing messages to {tier}: {e}")
+                return []
+        return await self._write("append", writers)
+
+    async def all(self, chat_id: str, tier: str) -> List[dict]:
+        """Every message of a chat, from the tier the chat was found in"""
+        async def read():
+            if tier == "redis":
+                return await cache_service.get_messages(chat_id)
+            if tier == "database":
+                return (await asyncio.to_thread(self.database.message_page, chat_id, None))[0]
+            return local_messages.get(chat_id, [])
+
+        return await self._call(tier, "all", read, read=True)
+
+    async def page(
+        self,
+        chat_id: str,
+        tier: str,
+        limit: int,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[dict], int, int]:
+        """(messages, seq of the first one, total) from the chat's tier - see CacheService.get_message_page"""
+        async def read():
+            if tier == "redis":
+                return await cache_service.get_message_page(chat_id, limit, before, after)
+            if tier == "database":
+                return await asyncio.to_thread(self.database.message_page, chat_id, limit, before, after)
+            stored = local_messages.get(chat_id, [])
+            total = len(stored)
+            if after is not None:
+                first, end = after + 1, after + 1 + limit
+            elif before is not None:
+                first, end = max(0, before - limit), max(0, before)
+            else:
+                first, end = max(0, total - limit), total
+            first = max(0, first)
+            return (stored[first:end] if limit > 0 else []), first, total
+
+        return await self._call(tier, "page", read, read=True)
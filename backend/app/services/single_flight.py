@@ -0,0 +1,127 @@
+"""
+Request coalescing for cache-miss loaders
+
+- SingleFlight: within one process, concurrent callers asking for the same
+  key share a single in-flight load instead of each running the loader.
+- DistributedLock: a Redis lock (SET NX PX + token-checked release) that
+  extends the same protection across workers. Callers that lose the race
+  wait for the winner to fill the cache rather than querying the database.
+
+CacheService.get_or_load combines both with the cache read/write.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import uuid
+
+# Delete the lock only if it still holds our token (it may have expired and
+# been taken by another worker in the meantime)
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async loads per key (one event loop)
+
+    Usage:
+        flight = SingleFlight()
+        value = await flight.do("user:agents:abc", load_agents)
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.loads = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run loader() once for all concurrent callers with the same key
+        Args:
+            key: Coalescing key (usually the cache key)
+            loader: Coroutine function producing the value
+        Returns:
+            The loader's result (its exception is raised to every caller)
+        """
+        task = self._calls.get(key)
+        if task is None:
+            # Run as its own task so the load survives the first caller being cancelled
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            self.loads += 1
+        else:
+            self.coalesced += 1
+        # shield: one cancelled waiter must not cancel the shared load
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved so a failure nobody awaited isn't logged
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class DistributedLock:
+    """
+    Best-effort Redis mutex for one key (not a fencing lock - keep critical sections short)
+
+    Args:
+        client: Async Redis client (upstash-redis or the RESP adapter)
+        key: Lock key
+        ttl_ms: Lock expiry, so a crashed holder can't block others forever
+    """
+
+    def __init__(self, client: Any, key: str, ttl_ms: int = 10000):
+        self._client = client
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+
+    async def acquire(self) -> bool:
+        """Try once to take the lock; True if we now hold it"""
+        self.acquired = bool(await self._client.set(self.key, self.token, px=self.ttl_ms, nx=True))
+        return self.acquired
+
+    async def release(self):
+        if not self.acquired:
+            return
+        self.acquired = False
+        try:
+            await self._client.eval(RELEASE_SCRIPT, keys=[self.key], args=[self.token])
+        except Exception as e:
+            # The lock expires on its own - only log
+            print(f"Error releasing lock '{self.key}': {e}")
+
+
+async def wait_for_value(
+    read: Callable[[], Awaitable[Any]],
+    timeout: float,
+    initial_delay: float = 0.025,
+    max_delay: float = 0.2
+) -> Optional[Any]:
+    """
+    Poll read() with exponential backoff until it returns something other than None
+    Returns:
+        The value, or None if the timeout elapsed first
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial_delay
+    while True:
+        value = await read()
+        if value is not None:
+            return value
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
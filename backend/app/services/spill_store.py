@@ -0,0 +1,305 @@
+"""
+Bounded in-process store that spills to local disk
+
+AgentService keeps its own copy of every agent, chat and message so it can
+serve them when Redis is unavailable. SpillStore holds the most recently
+used of those entries in memory, within an entry count and an approximate
+byte budget shared by all namespaces; least recently used entries are moved
+to a SQLite file on local disk and promoted back when they are read again.
+Worker memory therefore stays flat no matter how much traffic a process has
+served, while nothing it stored is lost.
+
+Each process spills to its own file, removed by close(), matching the
+per-worker lifetime of the data it holds. If the file can't be written the
+store keeps working and evicted entries are dropped instead.
+
+Namespaces created with spill=False (e.g. agents, which carry API keys)
+never touch disk: their evicted entries are dropped.
+
+Values must be JSON-serializable. Treat values returned by get() as
+read-only and write changes back with set() or append(), which keep the
+byte accounting accurate.
+
+Environment:
+    LOCAL_STORE_MAX_BYTES: memory budget for all namespaces (default 32MB)
+    LOCAL_STORE_MAX_ENTRIES: entries kept in memory (default 10000)
+    LOCAL_STORE_DIR: directory for spill files (default .local_store)
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import json
+import os
+import sqlite3
+import threading
+
+from app.services.local_cache import _estimate_size
+
+_MISSING = object()
+
+
+class SpillStore:
+    """
+    LRU key/value store bounded by entries and bytes, with evicted entries kept on disk
+
+    Usage:
+        chats = local_store.namespace("chats")
+        chats["chat-1"] = {"name": "Research"}
+        local_store.namespace("messages").append("chat-1", {"role": "user", "content": "hi"})
+
+    Args:
+        max_bytes: Approximate memory budget for all values
+        max_entries: Maximum entries held in memory
+        directory: Where the spill file is created (on first eviction)
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_entries: int = 10000, directory: str = ".local_store"):
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_entries = max(1, int(max_entries))
+        self.directory = directory
+        self.path = os.path.join(directory, f"spill.{os.getpid()}.sqlite3")
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        # Keys currently on disk, so lookups of unknown keys never touch SQLite
+        self._on_disk: Set[Tuple[str, str]] = set()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_failed = False
+        self._memory_only: Set[str] = set()
+        self._lock = threading.RLock()
+        self.spills = 0
+        self.promotions = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls) -> "SpillStore":
+        """A SpillStore configured from LOCAL_STORE_* variables"""
+        return cls(
+            max_bytes=int(os.getenv("LOCAL_STORE_MAX_BYTES", str(32 * 1024 * 1024))),
+            max_entries=int(os.getenv("LOCAL_STORE_MAX_ENTRIES", "10000")),
+            directory=os.getenv("LOCAL_STORE_DIR", ".local_store"),
+        )
+
+    def namespace(self, name: str, spill: bool = True) -> "SpillNamespace":
+        """
+        A dict-like view of one namespace (e.g. 'agents', 'chats', 'messages')
+        Args:
+            name: Namespace name
+            spill: False to drop evicted entries instead of writing them to disk
+        """
+        if not spill:
+            self._memory_only.add(name)
+        return SpillNamespace(self, name)
+
+    # ============================================
+    # Operations
+    # ============================================
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """Value for key (promoted back into memory if it had spilled), or default"""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+                return entry[0]
+            value = self._take_from_disk(namespace, key)
+            if value is _MISSING:
+                return default
+            self.promotions += 1
+            self._put(namespace, key, value, _estimate_size(value))
+            return value
+
+    def set(self, namespace: str, key: str, value: Any):
+        with self._lock:
+            self._drop_from_disk(namespace, key)
+            self._put(namespace, key, value, _estimate_size(value))
+
+    def append(self, namespace: str, key: str, item: Any):
+        """Append item to the list stored under key (created if missing), accounting only for the new item"""
+        with self._lock:
+            items = self.get(namespace, key)
+            if items is None:
+                self._put(namespace, key, [item], _estimate_size([item]))
+                return
+            items.append(item)
+            entry = self._entries.pop((namespace, key), None)
+            if entry is None:
+                # Spilled again on promotion (over budget on its own) - store the updated list
+                self._drop_from_disk(namespace, key)
+                self._put(namespace, key, items, _estimate_size(items))
+            else:
+                self._bytes -= entry[1]
+                self._put(namespace, key, items, entry[1] + _estimate_size(item))
+
+    def pop(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop((namespace, key), None)
+            if entry is not None:
+                self._bytes -= entry[1]
+                self._drop_from_disk(namespace, key)
+                return entry[0]
+            value = self._take_from_disk(namespace, key)
+            return default if value is _MISSING else value
+
+    def contains(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            return (namespace, key) in self._entries or (namespace, key) in self._on_disk
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        """Snapshot of every (key, value) in a namespace, memory first (spilled entries are not promoted)"""
+        with self._lock:
+            items = [(key, value) for (space, key), (value, _) in self._entries.items() if space == namespace]
+            if any(space == namespace for space, _ in self._on_disk):
+                try:
+                    rows = self._db.execute("SELECT key, value FROM entries WHERE namespace = ?", (namespace,)).fetchall()
+                    items.extend((key, json.loads(value)) for key, value in rows)
+                except sqlite3.Error as e:
+                    print(f"Error reading local spill store: {e}")
+            return items
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            keys = set(self._entries) | self._on_disk
+            return sum(1 for space, _ in keys if space == namespace)
+
+    def close(self):
+        """Close and delete the spill file"""
+        with self._lock:
+            self._entries.clear()
+            self._on_disk.clear()
+            self._bytes = 0
+            if self._db is None:
+                return
+            self._db.close()
+            self._db = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "spilled_entries": len(self._on_disk),
+                "spills": self.spills,
+                "promotions": self.promotions,
+                "dropped": self.dropped,
+                "spill_file": self.path if self._db is not None else None,
+            }
+
+    # ============================================
+    # Internals
+    # ============================================
+
+    def _put(self, namespace: str, key: str, value: Any, size: int):
+        previous = self._entries.pop((namespace, key), None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[(namespace, key)] = (value, size)
+        self._bytes += size
+        # Evict least recently used entries (possibly this one, if it alone is over budget)
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            (space, evicted), (evicted_value, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._spill(space, evicted, evicted_value)
+
+    def _spill(self, namespace: str, key: str, value: Any):
+        db = None if namespace in self._memory_only else self._open()
+        if db is None:
+            self.dropped += 1
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+            self._on_disk.add((namespace, key))
+            self.spills += 1
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Error spilling '{namespace}:{key}' to disk: {e}")
+            self.dropped += 1
+
+    def _take_from_disk(self, namespace: str, key: str) -> Any:
+        if (namespace, key) not in self._on_disk:
+            return _MISSING
+        try:
+            row = self._db.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            self._drop_from_disk(namespace, key)
+            return _MISSING if row is None else json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"Error reading local spill store: {e}")
+            return _MISSING
+
+    def _drop_from_disk(self, namespace: str, key: str):
+        if (namespace, key) not in self._on_disk:
+            return
+        self._on_disk.discard((namespace, key))
+        try:
+            self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            print(f"Error writing local spill store: {e}")
+
+    def _open(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None or self._disk_failed:
+            return self._db
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # A file with our name belongs to a dead process that reused the pid
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            # Scratch data for this process only - no journal or fsync needed
+            db.execute("PRAGMA journal_mode = OFF")
+            db.execute("PRAGMA synchronous = OFF")
+            db.execute(
+                "CREATE TABLE entries (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            self._db = db
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️  Local spill store unavailable ({e}); evicted entries will be dropped")
+            self._disk_failed = True
+        return self._db
+
+
+class SpillNamespace:
+    """Dict-like view of one SpillStore namespace"""
+
+    def __init__(self, store: SpillStore, name: str):
+        self._store = store
+        self.name = name
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._store.get(self.name, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._store.get(self.name, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._store.set(self.name, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return self._store.contains(self.name, key)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        return self._store.pop(self.name, key, default)
+
+    def append(self, key: str, item: Any):
+        self._store.append(self.name, key, item)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return iter(self._store.items(self.name))
+
+    def __len__(self) -> int:
+        return self._store.count(self.name)
+
+
+# Global store for AgentService's local copies
+local_store = SpillStore.from_env()
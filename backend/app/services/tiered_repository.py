@@ -0,0 +1,285 @@
+"""
+Tiered storage with per-entity read/write policies
+
+AgentService entities can live in up to three tiers:
+- local: this worker's bounded SpillStore namespaces (no network)
+- redis: the shared cache (cache_service)
+- database: Supabase or the local SQLite store, depending on the entity
+
+A repository supplies, per operation, one callable per tier that can serve
+it; TieredRepository decides which of them run according to a TierPolicy:
+- read: tiers tried in order, the first hit wins. The system of record is
+  the first available tier in `write`; after a clean miss there the other
+  write-through tiers aren't asked (they only hold copies of it), but the
+  fallback tiers and the local tier still are - they hold what was written
+  while the system of record was down
+- write: write-through tiers, every available one is written
+- fallback: when the system of record is unavailable or its write fails,
+  the first available of these tiers takes the write instead
+- backfill: on a hit in a later tier, copy the value into the earlier write
+  tiers that missed it (read-through)
+
+Policies are overridden per entity with REPOSITORY_POLICY_<ENTITY>, e.g.
+    REPOSITORY_POLICY_CHATS="read=redis,database,local write=database,redis fallback=local"
+
+Every tier call is timed and counted per entity/tier/operation; see
+repository_metrics.snapshot() (served by GET /api/v1/cache/metrics).
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+
+TIERS = ("local", "redis", "database")
+REMOTE_TIERS = ("redis", "database")
+
+TierCall = Callable[[], Awaitable[Any]]
+
+
+class TierPolicy:
+    """
+    Which tiers an entity reads from and writes to
+
+    Args:
+        read: Tiers to read from, in order
+        write: Write-through tiers (the first available one is the system of record)
+        fallback: Tiers that take a write when the system of record can't (first available wins)
+        backfill: Copy values found in a later tier into the earlier write tiers
+    """
+
+    def __init__(
+        self,
+        read: Sequence[str],
+        write: Sequence[str],
+        fallback: Sequence[str] = (),
+        backfill: bool = False
+    ):
+        for tier in (*read, *write, *fallback):
+            if tier not in TIERS:
+                raise ValueError(f"Unknown storage tier '{tier}' (expected one of {', '.join(TIERS)})")
+        self.read = tuple(read)
+        self.write = tuple(write)
+        self.fallback = tuple(fallback)
+        self.backfill = backfill
+
+    @classmethod
+    def parse(cls, spec: str, default: "TierPolicy") -> "TierPolicy":
+        """
+        Parse 'read=a,b write=c fallback=d backfill=true' (fields not given keep the default)
+        Raises:
+            ValueError: On unknown fields or tiers
+        """
+        fields: Dict[str, Any] = {
+            "read": default.read, "write": default.write,
+            "fallback": default.fallback, "backfill": default.backfill,
+        }
+        for part in spec.replace(";", " ").split():
+            name, _, value = part.partition("=")
+            if name not in fields:
+                raise ValueError(f"Unknown repository policy field '{name}'")
+            if name == "backfill":
+                fields[name] = value.lower() == "true"
+            else:
+                fields[name] = tuple(tier.strip() for tier in value.split(",") if tier.strip())
+        return cls(**fields)
+
+    @classmethod
+    def from_env(cls, entity: str, default: "TierPolicy") -> "TierPolicy":
+        """The policy for an entity from REPOSITORY_POLICY_<ENTITY>, or the default"""
+        spec = os.getenv(f"REPOSITORY_POLICY_{entity.upper()}", "").strip()
+        if not spec:
+            return default
+        try:
+            return cls.parse(spec, default)
+        except ValueError as e:
+            print(f"⚠️  Ignoring REPOSITORY_POLICY_{entity.upper()}: {e}")
+            return default
+
+    def describe(self) -> Dict[str, Any]:
+        return {"read": list(self.read), "write": list(self.write), "fallback": list(self.fallback), "backfill": self.backfill}
+
+
+class ReadResult:
+    """Outcome of a tiered read"""
+    __slots__ = ("value", "tier", "failed")
+
+    def __init__(self, value: Any = None, tier: Optional[str] = None, failed: bool = False):
+        self.value = value
+        self.tier = tier      # Tier that served the value (None on a miss)
+        self.failed = failed  # Some tier errored, so a miss isn't conclusive
+
+
+class RepositoryMetrics:
+    """Per entity/tier call counters and latency (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._policies: Dict[str, TierPolicy] = {}
+
+    def register(self, entity: str, policy: TierPolicy):
+        self._policies[entity] = policy
+
+    def record(self, entity: str, tier: str, operation: str, seconds: float, outcome: str):
+        """
+        Args:
+            outcome: 'hit' or 'miss' for reads, 'ok' for writes, 'error' for failures
+        """
+        with self._lock:
+            stats = self._stats.get((entity, tier))
+            if stats is None:
+                stats = self._stats[(entity, tier)] = {
+                    "calls": 0, "hits": 0, "misses": 0, "writes": 0, "errors": 0, "seconds": 0.0, "operations": {}
+                }
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["operations"][operation] = stats["operations"].get(operation, 0) + 1
+            stats[{"hit": "hits", "miss": "misses", "ok": "writes"}.get(outcome, "errors")] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot: Dict[str, Any] = {
+                entity: {"policy": policy.describe(), "tiers": {}} for entity, policy in self._policies.items()
+            }
+            for (entity, tier), stats in sorted(self._stats.items()):
+                lookups = stats["hits"] + stats["misses"]
+                snapshot.setdefault(entity, {"tiers": {}})["tiers"][tier] = {
+                    "calls": stats["calls"],
+                    "hits": stats["hits"],
+                    "misses": stats["misses"],
+                    "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else None,
+                    "writes": stats["writes"],
+                    "errors": stats["errors"],
+                    "mean_ms": round(stats["seconds"] * 1000 / stats["calls"], 3),
+                    "operations": dict(stats["operations"]),
+                }
+            return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+repository_metrics = RepositoryMetrics()
+
+
+class TieredRepository:
+    """
+    Base class running operations across tiers according to a TierPolicy
+
+    Subclasses set `entity` and implement available(tier), then build each
+    operation from per-tier callables passed to _read / _write / _delete.
+    """
+
+    entity = ""
+
+    def __init__(self, policy: TierPolicy):
+        self.policy = policy
+        repository_metrics.register(self.entity, policy)
+
+    def available(self, tier: str) -> bool:
+        raise NotImplementedError
+
+    def system_of_record(self) -> Optional[str]:
+        """The first available write tier (where a clean miss is conclusive)"""
+        return next((tier for tier in self.policy.write if self.available(tier)), None)
+
+    async def _call(self, tier: str, operation: str, call: TierCall, read: bool = False) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except Exception:
+            repository_metrics.record(self.entity, tier, operation, time.perf_counter() - started, "error")
+            raise
+        outcome = ("hit" if result is not None else "miss") if read else "ok"
+        repository_metrics.record(self.entity, tier, operation, time.perf_counter() - started, outcome)
+        return result
+
+    async def _read(
+        self,
+        operation: str,
+        readers: Dict[str, TierCall],
+        fill: Optional[Dict[str, Callable[[Any], Awaitable[Any]]]] = None
+    ) -> ReadResult:
+        """
+        Try readers in policy order and return the first hit
+        Args:
+            operation: Name recorded in the metrics
+            readers: Tier -> callable returning the value or None
+            fill: Tier -> callable storing a value, used for backfill
+        """
+        record = self.system_of_record()
+        failed = False
+        record_missed = False
+        missed: List[str] = []
+        for tier in self.policy.read:
+            if tier not in readers or not self.available(tier):
+                continue
+            if record_missed and tier in REMOTE_TIERS and tier not in self.policy.fallback:
+                continue
+            try:
+                value = await self._call(tier, operation, readers[tier], read=True)
+            except Exception as e:
+                print(f"Error reading {self.entity} from {tier}: {e}")
+                failed = True
+                continue
+            if value is not None:
+                if self.policy.backfill and fill:
+                    await self._backfill(operation, value, missed, fill)
+                return ReadResult(value, tier, failed)
+            missed.append(tier)
+            if tier == record:
+                record_missed = True
+        return ReadResult(None, None, failed)
+
+    async def _backfill(self, operation: str, value: Any, missed: List[str], fill: Dict[str, Callable[[Any], Awaitable[Any]]]):
+        for tier in missed:
+            if tier in self.policy.write and tier in fill:
+                try:
+                    await self._call(tier, f"{operation}:backfill", lambda: fill[tier](value))
+                except Exception as e:
+                    print(f"Error backfilling {self.entity} into {tier}: {e}")
+
+    async def _write(self, operation: str, writers: Dict[str, TierCall]) -> List[str]:
+        """
+        Write through the policy's write tiers, falling back if the system of record can't take it
+        Returns:
+            Tiers written
+        """
+        record = self.system_of_record()
+        written: List[str] = []
+        record_failed = record is None
+        for tier in self.policy.write:
+            if tier not in writers or not self.available(tier):
+                continue
+            try:
+                await self._call(tier, operation, writers[tier])
+                written.append(tier)
+            except Exception as e:
+                print(f"Error writing {self.entity} to {tier}: {e}")
+                if tier == record:
+                    record_failed = True
+        if record_failed:
+            for tier in self.policy.fallback:
+                if tier in writers and tier not in written and self.available(tier):
+                    try:
+                        await self._call(tier, operation, writers[tier])
+                        written.append(tier)
+                        break
+                    except Exception as e:
+                        print(f"Error writing {self.entity} to {tier}: {e}")
+        return written
+
+    async def _delete(self, operation: str, deleters: Dict[str, TierCall]) -> List[str]:
+        """Delete from every available tier the entity may have been written to"""
+        tiers = dict.fromkeys((*self.policy.write, *self.policy.fallback, *self.policy.read))
+        deleted: List[str] = []
+        for tier in tiers:
+            if tier not in deleters or not self.available(tier):
+                continue
+            try:
+                await self._call(tier, operation, deleters[tier])
+                deleted.append(tier)
+            except Exception as e:
+                print(f"Error deleting {self.entity} from {tier}: {e}")
+        return deleted
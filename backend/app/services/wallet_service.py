@@ -3,6 +3,7 @@ from datetime import datetime
 from app.db.database import get_supabase
 from app.models.schemas import WalletBalance, Earnings, StakingInfo, StakingCreate
 from app.core.config import settings
+from app.services.write_behind import write_behind
 import logging
 
 logger = logging.getLogger(__name__)
@@ -99,42 +100,25 @@ class WalletService:
         
         try:
             self._check_supabase()
-            self.supabase.table("staking").insert({
+            # Both writes are journaled and applied in order in the background;
+            # capsule caches (and marketplace listings) are dropped once the
+            # stake update reaches Supabase
+            await write_behind.insert("staking", {
                 "capsule_id": staking.capsule_id,
                 "wallet_address": wallet_address,
                 "stake_amount": staking.stake_amount,
                 "staked_at": staking_info.staked_at.isoformat()
-            }).execute()
+            }, entity=f"staking:{staking.capsule_id}:{wallet_address}")
             
-            # Update capsule stake amount
-            # Get current stake amount
             logger.info(f"Updating capsule {staking.capsule_id} with stake amount {staking.stake_amount}")
-            capsule_result = self.supabase.table("capsules").select("stake_amount").eq("id", staking.capsule_id).single().execute()
-            current_stake = 0.0
-            if capsule_result.data:
-                current_stake = float(capsule_result.data.get("stake_amount", 0) or 0)
-                logger.info(f"Current stake for capsule {staking.capsule_id}: {current_stake}")
-            else:
-                logger.warning(f"Capsule {staking.capsule_id} not found when trying to update stake")
-            
-            new_stake = current_stake + staking.stake_amount
-            logger.info(f"Updating capsule {staking.capsule_id}: current_stake={current_stake}, adding={staking.stake_amount}, new_stake={new_stake}")
-            
-            # Update capsule with new stake amount
-            update_result = self.supabase.table("capsules").update({
-                "stake_amount": new_stake,
-                "updated_at": datetime.now().isoformat()
-            }).eq("id", staking.capsule_id).execute()
-            
-            if update_result.data:
-                logger.info(f"Capsule stake updated successfully. Updated capsule: {update_result.data}")
-                # Verify the update
-                verify_result = self.supabase.table("capsules").select("stake_amount").eq("id", staking.capsule_id).single().execute()
-                if verify_result.data:
-                    verified_stake = float(verify_result.data.get("stake_amount", 0) or 0)
-                    logger.info(f"Verified stake amount for capsule {staking.capsule_id}: {verified_stake}")
-            else:
-                logger.error(f"Capsule stake update returned no data. Update may have failed.")
+            await write_behind.increment(
+                "capsules",
+                {"id": staking.capsule_id},
+                "stake_amount",
+                staking.stake_amount,
+                values={"updated_at": datetime.now().isoformat()},
+                entity=f"capsule:{staking.capsule_id}"
+            )
         except Exception as e:
             logger.error(f"Error creating staking: {e}", exc_info=True)
             import traceback
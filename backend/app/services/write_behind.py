@@ -0,0 +1,504 @@
+"""
+Write-behind journal for Supabase writes
+
+Request handlers append inserts, updates, deletes and counter increments to a local
+append-only journal (one JSON line per operation) and return immediately.
+A background task flushes the journal to Supabase in batches:
+
+- Ordering: operations are queued per entity (e.g. `capsule:{id}`) and
+  applied strictly in order within an entity; independent entities are
+  flushed concurrently, and inserts into the same table in one round go out
+  as a single bulk insert.
+- Coalescing: consecutive increments of the same column collapse into one
+  update, so a burst of queries costs one round trip.
+- Increments are applied atomically in the database (`col = col + n`, the
+  write_behind_increment function) and are idempotent: every increment
+  carries an operation ID that the function records in the same
+  transaction, so replaying or retrying one that already committed adds
+  nothing, and workers incrementing the same row never lose an update.
+- Retry: a failed operation blocks only its own entity and is retried with
+  exponential backoff; after WRITE_BEHIND_MAX_ATTEMPTS it is moved to the
+  `.failed` file next to the journal.
+- Durability: every operation is on disk before the request returns and is
+  acknowledged in the journal once applied. Unacknowledged operations are
+  replayed on the next start (delivery is at-least-once), and close()
+  flushes what it can on shutdown.
+
+Each worker process claims its own journal file in WRITE_BEHIND_DIR (with
+an exclusive file lock), so restarted workers pick up where crashed ones
+stopped. Ordering is therefore per entity within one worker only: writes to
+the same entity from two workers can reach Supabase in either order. An
+update or increment that matches no row (e.g. it overtook the insert from
+another worker) fails and is retried rather than silently dropped.
+
+Environment:
+    WRITE_BEHIND_ENABLED: false to write to Supabase inline (default true)
+    WRITE_BEHIND_DIR: journal directory (default .write_behind)
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS: flush cadence (default 0.5)
+    WRITE_BEHIND_BATCH_SIZE: pending operations that trigger an early flush (default 100)
+    WRITE_BEHIND_MAX_ATTEMPTS: attempts before an operation is dead-lettered (default 8)
+    WRITE_BEHIND_FSYNC: fsync each append (default false; flush to the OS only)
+    WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS: time allowed for the final flush (default 10)
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from app.db.database import get_supabase
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    fcntl = None  # type: ignore
+    FCNTL_AVAILABLE = False
+
+MAX_JOURNAL_SLOTS = 64
+
+Listener = Callable[[List[dict]], Awaitable[None]]
+
+
+class WriteBehindJournal:
+    """
+    Durable, ordered, batched queue of Supabase writes
+
+    Usage:
+        await write_behind.insert("earnings", row, entity=f"earnings:{wallet}")
+        await write_behind.increment("capsules", {"id": capsule_id}, "query_count", 1)
+
+    Args:
+        directory: Where journal files live
+        enabled: False applies every write inline (the old synchronous behavior)
+        flush_interval: Seconds between background flushes
+        batch_size: Pending operations that trigger a flush before the interval
+        max_attempts: Attempts before an operation is dead-lettered
+        fsync: fsync the journal after every append
+        shutdown_timeout: Seconds close() spends flushing
+    """
+
+    def __init__(
+        self,
+        directory: str = ".write_behind",
+        enabled: bool = True,
+        flush_interval: float = 0.5,
+        batch_size: int = 100,
+        max_attempts: int = 8,
+        fsync: bool = False,
+        shutdown_timeout: float = 10.0
+    ):
+        self.directory = directory
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.fsync = fsync
+        self.shutdown_timeout = shutdown_timeout
+        self.path: Optional[str] = None
+        self._file = None
+        self._seq = 0
+        self._queues: Dict[str, Deque[dict]] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._pending = 0
+        self._listeners: Dict[str, List[Listener]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.applied = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    @classmethod
+    def from_env(cls) -> "WriteBehindJournal":
+        """Create a journal configured from WRITE_BEHIND_* environment variables"""
+        return cls(
+            directory=os.getenv("WRITE_BEHIND_DIR", ".write_behind"),
+            enabled=os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true",
+            flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_SECONDS", "0.5")),
+            batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100")),
+            max_attempts=int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "8")),
+            fsync=os.getenv("WRITE_BEHIND_FSYNC", "false").lower() == "true",
+            shutdown_timeout=float(os.getenv("WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+        )
+
+    # ============================================
+    # Lifecycle
+    # ============================================
+
+    async def start(self):
+        """Claim a journal file, replay anything left unapplied and start the flusher"""
+        if not self.enabled or self._task is not None:
+            return
+        if self._file is None and not self._open_journal():
+            print("⚠️  Write-behind journal unavailable, writing to Supabase inline")
+            self.enabled = False
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        if self._pending:
+            print(f"Replaying {self._pending} unapplied write(s) from {self.path}")
+            self._wakeup.set()
+
+    async def close(self):
+        """Stop the flusher and flush pending writes (anything left is replayed on next start)"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await asyncio.wait_for(self.flush(wait_for_retries=True), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Write-behind shutdown flush timed out, {self._pending} write(s) left in {self.path}")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open_journal(self) -> bool:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            slots = range(MAX_JOURNAL_SLOTS) if FCNTL_AVAILABLE else range(1)
+            for slot in slots:
+                path = os.path.join(self.directory, f"journal.{slot}.jsonl")
+                handle = open(path, "a+", encoding="utf-8")
+                if FCNTL_AVAILABLE:
+                    try:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # Another live worker owns this journal
+                        handle.close()
+                        continue
+                self._file, self.path = handle, path
+                self._replay()
+                return True
+        except OSError as e:
+            print(f"Error opening write-behind journal: {e}")
+        return False
+
+    def _replay(self):
+        """Re-queue operations from a previous run that were never acknowledged"""
+        self._file.seek(0)
+        operations: Dict[int, dict] = {}
+        for line in self._file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn final line from a crash mid-append
+            if "ack" in record:
+                for seq in record["ack"]:
+                    operations.pop(seq, None)
+                    self._seq = max(self._seq, seq)
+            else:
+                operations[record["seq"]] = record
+                self._seq = max(self._seq, record["seq"])
+        for seq in sorted(operations):
+            self._queue(operations[seq])
+        if not operations:
+            self._truncate()
+
+    # ============================================
+    # Submitting writes
+    # ============================================
+
+    async def insert(self, table: str, row: dict, entity: Optional[str] = None):
+        """
+        Queue an insert
+        Args:
+            table: Supabase table
+            row: Row to insert (JSON-serializable)
+            entity: Ordering key; writes to the same entity are applied in order
+        """
+        await self._submit({"op": "insert", "table": table, "row": row}, entity or f"{table}:{row.get('id', '*')}")
+
+    async def update(self, table: str, values: dict, match: Dict[str, Any], entity: Optional[str] = None):
+        """Queue `UPDATE table SET values WHERE match` (equality filters)"""
+        await self._submit({"op": "update", "table": table, "values": values, "match": match}, entity or self._entity(table, match))
+
+    async def increment(
+        self,
+        table: str,
+        match: Dict[str, Any],
+        column: str,
+        amount: float = 1,
+        values: Optional[dict] = None,
+        entity: Optional[str] = None
+    ):
+        """
+        Queue an increment of a numeric column (applied atomically and at most once)
+        Args:
+            table: Supabase table
+            match: Equality filters selecting a single row
+            column: Column to increment
+            amount: Amount to add (consecutive increments are summed)
+            values: Other columns to set in the same update (e.g. updated_at)
+            entity: Ordering key (defaults to table plus match)
+        """
+        await self._submit(
+            {"op": "increment", "table": table, "match": match, "column": column, "amount": amount, "values": values or {}},
+            entity or self._entity(table, match)
+        )
+
+    async def delete(self, table: str, match: Dict[str, Any], entity: Optional[str] = None):
+        """Queue `DELETE FROM table WHERE match` (list values match with IN, for batched deletes)"""
+        await self._submit({"op": "delete", "table": table, "match": match}, entity or self._entity(table, match))
+
+    def on_applied(self, table: str, listener: Listener):
+        """Call listener(operations) after writes to table reach Supabase (e.g. to drop caches)"""
+        self._listeners.setdefault(table, []).append(listener)
+
+    @staticmethod
+    def _entity(table: str, match: Dict[str, Any]) -> str:
+        return f"{table}:" + ",".join(f"{k}={v}" for k, v in sorted(match.items()))
+
+    async def _submit(self, operation: dict, entity: str):
+        if get_supabase() is None:
+            raise Exception("Supabase not configured")
+        operation["entity"] = entity
+        # Identifies the operation across replays and retries (increments are applied once per ID)
+        operation["op_id"] = uuid.uuid4().hex
+        if not self.enabled:
+            # Inline mode: apply now and let the caller see any error
+            await asyncio.to_thread(self._apply, get_supabase(), operation)
+            await self._notify([operation])
+            return
+        if self._task is None:
+            await self.start()
+            if not self.enabled:
+                return await self._submit(operation, entity)
+        self._seq += 1
+        operation["seq"] = self._seq
+        operation["attempts"] = 0
+        operation["queued_at"] = datetime.now().isoformat()
+        self._append(operation)
+        self._queue(operation)
+        if self._pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _append(self, record: dict):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _queue(self, operation: dict):
+        operation.setdefault("op_id", uuid.uuid4().hex)  # Journals written before operation IDs
+        self._queues.setdefault(operation["entity"], deque()).append(operation)
+        self._pending += 1
+
+    def _truncate(self):
+        self._file.seek(0)
+        self._file.truncate()
+
+    # ============================================
+    # Flushing
+    # ============================================
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing write-behind journal: {e}")
+
+    async def flush(self, wait_for_retries: bool = False) -> int:
+        """
+        Apply every ready operation, one round per entity queue position
+        Args:
+            wait_for_retries: Ignore retry backoff, one attempt per entity (used on shutdown)
+        Returns:
+            Number of operations applied
+        """
+        if not self._pending or self._flush_lock is None:
+            return 0
+        client = get_supabase()
+        if client is None:
+            return 0
+        applied: List[dict] = []
+        held: Set[str] = set()  # entities whose head failed during this flush
+        async with self._flush_lock:
+            while True:
+                now = time.monotonic()
+                ready = [
+                    entity for entity, queue in self._queues.items()
+                    if queue and entity not in held
+                    and (wait_for_retries or self._retry_at.get(entity, 0) <= now)
+                ]
+                if not ready:
+                    break
+                heads = [self._coalesce(self._queues[entity]) for entity in ready]
+                failures = await self._apply_round(client, heads)
+                acked: List[int] = []
+                for entity, operation in zip(ready, heads):
+                    error = failures.get(id(operation))
+                    if error is None:
+                        acked.extend(self._done(entity))
+                        applied.append(operation)
+                    elif self._retry(entity, operation, error):
+                        acked.extend(self._done(entity))
+                    else:
+                        held.add(entity)
+                if acked:
+                    self._append({"ack": acked})
+            if not self._pending:
+                self._truncate()
+        self.applied += len(applied)
+        await self._notify(applied)
+        return len(applied)
+
+    def _coalesce(self, queue: Deque[dict]) -> dict:
+        """Fold consecutive increments of the same column into the head operation"""
+        head = queue[0]
+        if head["op"] != "increment":
+            return head
+        head.setdefault("merged", [])
+        # Each merged increment keeps its own ID, so a replay that merges differently
+        # still applies every one exactly once
+        head.setdefault("ops", [{"id": head["op_id"], "amount": head["amount"]}])
+        while len(queue) > 1:
+            following = queue[1]
+            if (following["op"] != "increment" or following["table"] != head["table"]
+                    or following["match"] != head["match"] or following["column"] != head["column"]):
+                break
+            queue.remove(following)
+            self._pending -= 1
+            head["amount"] += following["amount"]
+            head["values"].update(following["values"])
+            head["merged"].append(following["seq"])
+            head["ops"].append({"id": following["op_id"], "amount": following["amount"]})
+        return head
+
+    def _done(self, entity: str) -> List[int]:
+        """Pop an entity's head operation; returns the sequence numbers it covered"""
+        queue = self._queues[entity]
+        operation = queue.popleft()
+        self._pending -= 1
+        self._retry_at.pop(entity, None)
+        if not queue:
+            del self._queues[entity]
+        return [operation["seq"], *operation.get("merged", [])]
+
+    def _retry(self, entity: str, operation: dict, error: Exception) -> bool:
+        """Schedule a retry; True if the operation was dead-lettered instead"""
+        operation["attempts"] += 1
+        self.failed += 1
+        if operation["attempts"] < self.max_attempts:
+            delay = min(self.flush_interval * 2 ** operation["attempts"], 60.0)
+            self._retry_at[entity] = time.monotonic() + delay
+            print(f"Write-behind {operation['op']} on {operation['table']} failed (attempt {operation['attempts']}), retrying in {delay:.1f}s: {error}")
+            return False
+        print(f"❌ Write-behind {operation['op']} on {operation['table']} dead-lettered after {operation['attempts']} attempts: {error}")
+        try:
+            with open(f"{self.path}.failed", "a", encoding="utf-8") as failed:
+                failed.write(json.dumps({**operation, "error": str(error)}, default=str) + "\n")
+        except OSError as e:
+            print(f"Error writing dead letter: {e}")
+        self.dead_lettered += 1
+        return True
+
+    async def _apply_round(self, client: Any, operations: List[dict]) -> Dict[int, Exception]:
+        """Apply one operation per entity (inserts bulked per table); returns failures by id()"""
+        inserts: Dict[str, List[dict]] = {}
+        others: List[dict] = []
+        for operation in operations:
+            if operation["op"] == "insert":
+                inserts.setdefault(operation["table"], []).append(operation)
+            else:
+                others.append(operation)
+        groups: List[Tuple[str, Any]] = [("insert", group) for group in inserts.values()]
+        groups.extend(("single", operation) for operation in others)
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self._apply_group, client, kind, target) for kind, target in groups
+        ], return_exceptions=True)
+        failures: Dict[int, Exception] = {}
+        for (kind, target), result in zip(groups, results):
+            if isinstance(result, BaseException):
+                for operation in (target if kind == "insert" else [target]):
+                    failures[id(operation)] = result
+            elif result:
+                failures.update(result)
+        return failures
+
+    def _apply_group(self, client: Any, kind: str, target: Any) -> Dict[int, Exception]:
+        if kind == "single":
+            self._apply(client, target)
+            return {}
+        try:
+            client.table(target[0]["table"]).insert([operation["row"] for operation in target]).execute()
+            return {}
+        except Exception:
+            if len(target) == 1:
+                raise
+        # One bad row fails the whole bulk insert - retry row by row to isolate it
+        failures: Dict[int, Exception] = {}
+        for operation in target:
+            try:
+                self._apply(client, operation)
+            except Exception as e:
+                failures[id(operation)] = e
+        return failures
+
+    @staticmethod
+    def _apply(client: Any, operation: dict):
+        if operation["op"] == "increment":
+            # col = col + n in one statement; raises if no row matches
+            client.rpc("write_behind_increment", {
+                "p_table": operation["table"],
+                "p_column": operation["column"],
+                "p_match": operation["match"],
+                "p_values": operation["values"],
+                "p_ops": operation.get("ops") or [{"id": operation["op_id"], "amount": operation["amount"]}],
+            }).execute()
+            return
+        table = client.table(operation["table"])
+        if operation["op"] == "insert":
+            table.insert(operation["row"]).execute()
+            return
+        if operation["op"] == "update":
+            query = table.update(operation["values"])
+        else:
+            query = table.delete()
+        for key, value in operation["match"].items():
+            query = query.in_(key, value) if isinstance(value, list) else query.eq(key, value)
+        result = query.execute()
+        if operation["op"] == "update" and not result.data:
+            # The row may not exist yet (its insert went through another worker's journal)
+            raise Exception(f"no {operation['table']} row matches {operation['match']}")
+
+    async def _notify(self, operations: List[dict]):
+        by_table: Dict[str, List[dict]] = {}
+        for operation in operations:
+            if operation["table"] in self._listeners:
+                by_table.setdefault(operation["table"], []).append(operation)
+        for table, batch in by_table.items():
+            for listener in self._listeners[table]:
+                try:
+                    await listener(batch)
+                except Exception as e:
+                    print(f"Error in write-behind listener for '{table}': {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "journal": self.path,
+            "pending": self._pending,
+            "entities": len(self._queues),
+            "applied": self.applied,
+            "failed_attempts": self.failed,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+write_behind = WriteBehindJournal.from_env()
@@ -0,0 +1,106 @@
+"""
+Benchmark cache codecs on realistic chat histories
+Run this from the backend directory: python benchmark_cache_codec.py
+
+Compares encode/decode throughput and stored payload size for every codec
+configuration the installed libraries allow (json, orjson, msgpack, each
+with and without zstd), against the legacy json.dumps/json.loads path.
+
+Options:
+    --messages 10,50,200   chat sizes to test (messages per history)
+    --seconds 0.5          time budget per measurement
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app.services.cache_codec import (
+    CacheCodec, MSGPACK_AVAILABLE, ORJSON_AVAILABLE, ZSTD_AVAILABLE
+)
+
+WORDS = (
+    "solana wallet stake capsule agent memory query price token market "
+    "the a to of and is in for on with that this how what why can you "
+    "please explain summary research deploy contract devnet balance sol"
+).split()
+
+
+def make_history(count: int, seed: int = 7) -> list:
+    """Build a chat history shaped like AgentService messages"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    messages = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        length = rng.randint(8, 40) if role == "user" else rng.randint(60, 400)
+        messages.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "role": role,
+            "content": " ".join(rng.choice(WORDS) for _ in range(length)),
+            "timestamp": (start + timedelta(seconds=30 * i)).isoformat(),
+        })
+    return messages
+
+
+def measure(fn, budget: float) -> float:
+    """Operations per second of fn() within the time budget"""
+    runs = 0
+    began = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - began
+        if elapsed >= budget:
+            return runs / elapsed
+
+
+def configurations() -> list:
+    configs = [("legacy json", None)]
+    formats = ["json"] + (["orjson"] if ORJSON_AVAILABLE else []) + (["msgpack"] if MSGPACK_AVAILABLE else [])
+    for format in formats:
+        configs.append((format, CacheCodec(format=format, compression="none")))
+        if ZSTD_AVAILABLE:
+            configs.append((f"{format}+zstd", CacheCodec(format=format, compression="zstd", compress_min_bytes=1024)))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", default="10,50,200")
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print("Cache codec benchmark")
+    print(f"orjson: {ORJSON_AVAILABLE}  msgpack: {MSGPACK_AVAILABLE}  zstandard: {ZSTD_AVAILABLE}")
+    print("=" * 78)
+
+    for count in (int(n) for n in args.messages.split(",")):
+        history = make_history(count)
+        print(f"\n{count} messages")
+        print(f"{'codec':<16}{'bytes':>10}{'ratio':>8}{'encode/s':>12}{'decode/s':>12}{'MB/s dec':>10}")
+        baseline = None
+        for name, codec in configurations():
+            if codec is None:
+                encode, decode = json.dumps, json.loads
+            else:
+                encode, decode = codec.encode, codec.decode
+            stored = encode(history)
+            assert decode(stored) == history, f"{name} did not round-trip"
+            size = len(stored.encode("utf-8"))
+            baseline = baseline or size
+            enc = measure(lambda: encode(history), args.seconds)
+            dec = measure(lambda: decode(stored), args.seconds)
+            print(
+                f"{name:<16}{size:>10}{size / baseline:>8.2f}{enc:>12.0f}{dec:>12.0f}"
+                f"{dec * baseline / 1e6:>10.1f}"
+            )
+
+    print("\nratio = stored size relative to legacy JSON; MB/s dec = logical JSON MB decoded per second")
+
+
+if __name__ == "__main__":
+    main()
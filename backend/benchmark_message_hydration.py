@@ -0,0 +1,107 @@
+"""
+Benchmark turning stored chat messages into API responses
+Run this from the backend directory: python benchmark_message_hydration.py
+
+Compares the per-message cost of the previous path (fromisoformat and
+Message(**data) for every stored message, then FastAPI dumping the models
+and validating them again against response_model before rendering) with
+the current one (AgentService._to_messages hydrating the whole list in one
+pydantic-core call, and the route serializing it straight to JSON).
+
+Message.model_construct is included for reference: in pydantic v2 it runs
+in Python and is no faster than validating in pydantic-core.
+
+Options:
+    --messages 10,50,200   chat sizes to test (messages per history)
+    --seconds 0.5          time budget per measurement
+"""
+import argparse
+import json
+from datetime import datetime
+from typing import List
+
+from pydantic import TypeAdapter
+
+from benchmark_cache_codec import make_history, measure
+from app.models.schemas import Message, MessageRole
+from app.services.agent_service import AgentService
+
+MESSAGES = TypeAdapter(List[Message])
+
+
+def hydrate_validated(history: list) -> List[Message]:
+    """The previous _to_message: full validation of every field"""
+    messages = []
+    for seq, msg_data in enumerate(history):
+        msg_data = {**msg_data, "seq": seq}
+        if isinstance(msg_data.get("timestamp"), str):
+            msg_data["timestamp"] = datetime.fromisoformat(msg_data["timestamp"])
+        messages.append(Message(**msg_data))
+    return messages
+
+
+def hydrate_constructed(history: list) -> List[Message]:
+    """model_construct per message, skipping validation entirely"""
+    messages = []
+    for seq, msg_data in enumerate(history):
+        messages.append(Message.model_construct(
+            id=msg_data["id"],
+            role=MessageRole(msg_data["role"]),
+            content=msg_data["content"],
+            timestamp=datetime.fromisoformat(msg_data["timestamp"]),
+            seq=seq
+        ))
+    return messages
+
+
+def hydrate_bulk(history: list) -> List[Message]:
+    return AgentService._to_messages(history)
+
+
+def respond_validated(messages: List[Message]) -> bytes:
+    """What FastAPI 0.109 does with a returned model list and a response_model"""
+    dumped = [message.model_dump(by_alias=True) for message in messages]
+    validated = MESSAGES.validate_python(dumped)
+    return json.dumps(MESSAGES.dump_python(validated, mode="json")).encode("utf-8")
+
+
+def respond_direct(messages: List[Message]) -> bytes:
+    return MESSAGES.dump_json(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", default="10,50,200")
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print("Message hydration benchmark (microseconds per message)")
+    print("=" * 78)
+
+    for count in (int(n) for n in args.messages.split(",")):
+        history = make_history(count)
+        expected = json.loads(respond_validated(hydrate_validated(history)))
+        for hydrate in (hydrate_constructed, hydrate_bulk):
+            assert json.loads(respond_direct(hydrate(history))) == expected, f"{hydrate.__name__} disagrees"
+
+        print(f"\n{count} messages")
+        print(f"{'path':<14}{'hydrate':>12}{'respond':>12}{'total':>12}{'speedup':>10}")
+        baseline = None
+        for name, hydrate, respond in (
+            ("previous", hydrate_validated, respond_validated),
+            ("construct", hydrate_constructed, respond_direct),
+            ("current", hydrate_bulk, respond_direct),
+        ):
+            messages = hydrate(history)
+            build = 1e6 / measure(lambda: hydrate(history), args.seconds) / count
+            render = 1e6 / measure(lambda: respond(messages), args.seconds) / count
+            total = build + render
+            baseline = baseline or total
+            print(f"{name:<14}{build:>12.2f}{render:>12.2f}{total:>12.2f}{baseline / total:>9.1f}x")
+
+    print("\nhydrate = stored dict -> Message; respond = Message list -> response body")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import logging
 import os
 
-from app.api.v1 import agents, marketplace, capsules, wallet, auth, preferences
+from app.api.v1 import agents, marketplace, capsules, wallet, auth, preferences, cache, metrics
 from app.core.config import settings
 from app.db.database import init_db, get_supabase
 
@@ -30,6 +31,22 @@ async def lifespan(app: FastAPI):
     logger.info("Starting SolMind API...")
     await init_db()
     
+    # Background flusher for journaled Supabase writes (replays leftovers from a crash)
+    from app.services.write_behind import write_behind
+    await write_behind.start()
+    
+    # Background workers storing chat memories after responses
+    from app.services.memory_ingestion import memory_ingestion
+    await memory_ingestion.start()
+    
+    # Keep-alive connection pools to LLM providers, shared by all requests
+    from app.services.http_clients import provider_clients
+    provider_clients.start()
+    
+    # Tokenizer for the conversation context budget (may download its encoding file)
+    from app.services.context_builder import load_token_encoding
+    await asyncio.to_thread(load_token_encoding)
+    
     # Initialize memory service (warm up)
     try:
         from app.services.memory_service import MemoryService
@@ -44,6 +61,16 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     logger.info("Shutting down SolMind API...")
+    # Store queued chat memories before anything else shuts down
+    await memory_ingestion.close()
+    await write_behind.close()
+    await provider_clients.aclose()
+    from app.services.pregeneration import pregeneration
+    pregeneration.close()
+    from app.services.spill_store import local_store
+    local_store.close()
+    from app.services.cache_service import cache_service
+    await cache_service.aclose()
 
 
 app = FastAPI(
@@ -60,6 +87,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "X-Wallet-Address"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],
 )
 
 # Include routers
@@ -69,6 +97,8 @@ app.include_router(capsules.router, prefix="/api/v1/capsules", tags=["Capsules"]
 app.include_router(marketplace.router, prefix="/api/v1/marketplace", tags=["Marketplace"])
 app.include_router(wallet.router, prefix="/api/v1/wallet", tags=["Wallet"])
 app.include_router(preferences.router, prefix="/api/v1", tags=["Preferences"])
+app.include_router(cache.router, prefix="/api/v1/cache", tags=["Cache"])
+app.include_router(metrics.router, prefix="/api/v1/metrics", tags=["Metrics"])
 
 
 @app.get("/")
@@ -0,0 +1,44 @@
+"""
+One-time migration of chat storage to native Redis data types
+Run this from the backend directory: python migrate_redis_messages.py
+
+Older deployments stored every chat's history as a single JSON array under
+`messages:{chat_id}`, chat metadata as a JSON blob under `chat:{chat_id}`,
+and chat list indexes (`agent:chats:{agent_id}`,
+`chats:agent:{agent_id}:wallet:{wallet}`) as JSON arrays of IDs. The cache
+service now keeps messages as Redis lists, chat metadata as hashes and chat
+indexes as sorted sets scored by last activity. Legacy keys are converted
+lazily on first access, but this script converts all of them up front.
+"""
+import asyncio
+
+from dotenv import load_dotenv
+
+# Load environment variables before the cache service reads them
+load_dotenv()
+
+from app.services.cache_service import cache_service
+
+print("=" * 60)
+print("Redis chat storage migration")
+print("=" * 60)
+
+if not cache_service.redis_available:
+    print("❌ Redis is not available - nothing to migrate")
+    print("   Run python check_redis.py to diagnose the connection")
+    raise SystemExit(1)
+
+
+async def main():
+    try:
+        chats = await cache_service.migrate_all_legacy_chats()
+        print(f"✅ Migrated {chats} chat(s) to hash metadata")
+        messages = await cache_service.migrate_all_legacy_messages()
+        print(f"✅ Migrated {messages} chat(s) to list storage")
+        indexes = await cache_service.migrate_all_legacy_chat_indexes()
+        print(f"✅ Migrated {indexes} chat index(es) to sorted sets")
+    finally:
+        await cache_service.aclose()
+
+
+asyncio.run(main())
@@ -0,0 +1,2 @@
+-- Per-agent opt-in to the completion cache (app/services/completion_cache.py)
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS completion_cache BOOLEAN DEFAULT false;
@@ -0,0 +1,58 @@
+-- Idempotent, atomic counter increments for the write-behind journal (app/services/write_behind.py)
+
+-- Journaled increments already applied; a replayed or retried increment whose
+-- operation ID is listed here adds nothing. Rows can be pruned once they are
+-- older than any journal that could still replay them.
+CREATE TABLE IF NOT EXISTS write_behind_ops (
+  op_id TEXT PRIMARY KEY,
+  applied_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_write_behind_ops_applied_at ON write_behind_ops(applied_at);
+
+-- Add the amounts of the operations in p_ops ([{"id": ..., "amount": ...}]) that
+-- weren't applied before to p_column (col = col + n, in one statement) and set
+-- p_values on the row matching p_match. Raises if no row matches, so the
+-- journal retries the increment instead of recording it as applied.
+CREATE OR REPLACE FUNCTION write_behind_increment(
+  p_table TEXT,
+  p_column TEXT,
+  p_match JSONB,
+  p_values JSONB,
+  p_ops JSONB
+)
+RETURNS INTEGER AS $$
+DECLARE
+  amount NUMERIC := 0;
+  op JSONB;
+  assignments TEXT;
+  conditions TEXT;
+  updated INTEGER;
+BEGIN
+  IF (p_table, p_column) NOT IN (('capsules', 'query_count'), ('capsules', 'stake_amount')) THEN
+    RAISE EXCEPTION 'write_behind_increment: %.% is not a journaled counter', p_table, p_column;
+  END IF;
+
+  FOR op IN SELECT * FROM jsonb_array_elements(p_ops) LOOP
+    INSERT INTO write_behind_ops (op_id) VALUES (op->>'id') ON CONFLICT DO NOTHING;
+    IF FOUND THEN
+      amount := amount + (op->>'amount')::NUMERIC;
+    END IF;
+  END LOOP;
+
+  SELECT string_agg(format('%I = %L', key, value), ' AND ') INTO conditions FROM jsonb_each_text(p_match);
+  IF conditions IS NULL THEN
+    RAISE EXCEPTION 'write_behind_increment: empty match';
+  END IF;
+  SELECT format('%I = COALESCE(%I, 0) + %s', p_column, p_column, amount)
+    || COALESCE(string_agg(format(', %I = %L', key, value), ''), '')
+    INTO assignments FROM jsonb_each_text(COALESCE(p_values, '{}'::JSONB));
+
+  EXECUTE format('UPDATE %I SET %s WHERE %s', p_table, assignments, conditions);
+  GET DIAGNOSTICS updated = ROW_COUNT;
+  IF updated = 0 THEN
+    RAISE EXCEPTION 'write_behind_increment: no % row matches %', p_table, p_match USING ERRCODE = 'P0002';
+  END IF;
+  RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from app.services.cache_codec import MSGPACK_AVAILABLE, TAG_PREFIX, ZSTD_AVAILABLE, CacheCodec
+
+
+VALUE = {"id": "a1", "name": "Agent", "count": 3, "score": 0.5, "tags": ["x", "y"], "owner": None, "on": True}
+LARGE = {"messages": [{"role": "user", "content": "hello " * 20, "seq": i} for i in range(50)]}
+
+
+def tag(encoded):
+    return encoded[len(TAG_PREFIX):].partition(":")[0] if encoded.startswith(TAG_PREFIX) else None
+
+
+needs_msgpack = pytest.mark.skipif(not MSGPACK_AVAILABLE, reason="msgpack not installed")
+needs_zstd = pytest.mark.skipif(not ZSTD_AVAILABLE, reason="zstandard not installed")
+
+
+@pytest.mark.parametrize("format", ["json", "orjson"])
+def test_json_formats_write_plain_json(format):
+    codec = CacheCodec(format=format)
+
+    encoded = codec.encode(VALUE)
+
+    assert json.loads(encoded) == VALUE
+    assert codec.decode(encoded) == VALUE
+
+
+@needs_msgpack
+def test_msgpack_round_trip_is_tagged():
+    codec = CacheCodec(format="msgpack")
+
+    encoded = codec.encode(VALUE)
+
+    assert tag(encoded) == "m"
+    assert codec.decode(encoded) == VALUE
+
+
+@needs_zstd
+@pytest.mark.parametrize("format", ["orjson", pytest.param("msgpack", marks=needs_msgpack)])
+def test_compression_applies_only_above_the_threshold(format):
+    codec = CacheCodec(format=format, compression="zstd", compress_min_bytes=1024)
+
+    small, large = codec.encode(VALUE), codec.encode(LARGE)
+
+    assert tag(small) == ("m" if format == "msgpack" else None)
+    assert tag(large) == ("mz" if format == "msgpack" else "z")
+    assert len(large) < len(json.dumps(LARGE))
+    assert (codec.decode(small), codec.decode(large)) == (VALUE, LARGE)
+
+
+@needs_zstd
+def test_every_codec_reads_what_the_others_wrote():
+    writers = [CacheCodec(format="json"), CacheCodec(format="orjson", compression="zstd", compress_min_bytes=1)]
+    if MSGPACK_AVAILABLE:
+        writers.append(CacheCodec(format="msgpack", compression="zstd", compress_min_bytes=1))
+
+    for writer in writers:
+        for reader in writers:
+            assert reader.decode(writer.encode(LARGE)) == LARGE
+
+
+def test_untagged_legacy_values_read_as_before():
+    codec = CacheCodec(format="orjson")
+
+    # json.dumps output from older versions (with spaces), bytes, and non-JSON text
+    assert codec.decode(json.dumps(VALUE)) == VALUE
+    assert codec.decode(json.dumps(VALUE).encode("utf-8")) == VALUE
+    assert codec.decode("not json") == "not json"
+    assert codec.decode("~1unknown:abc") == "~1unknown:abc"
+    assert codec.decode(42) == 42
+
+
+def test_compression_is_off_unless_configured(monkeypatch):
+    monkeypatch.delenv("CACHE_COMPRESSION", raising=False)
+    assert CacheCodec.from_env().compression == "none"
+
+    monkeypatch.setenv("CACHE_COMPRESSION", "zstd")
+    assert CacheCodec.from_env().compression == ("zstd" if ZSTD_AVAILABLE else "none")
@@ -0,0 +1,106 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import completion_cache as completion_cache_module
+from app.services.cache_service import CacheService
+from app.services.completion_cache import CompletionCache, replay_chunks
+
+
+AGENT = SimpleNamespace(model="model-a", api_key="key", completion_cache=True)
+BASE = [{"role": "system", "content": "You answer questions about Solana."}]
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    service = CacheService()
+    # Always exercise the in-memory store, whatever REDIS_URL says
+    service.redis_available = False
+    service.redis = service._aredis = None
+    monkeypatch.setattr(completion_cache_module, "cache_service", service)
+    return service
+
+
+def semantic_cache():
+    cache = CompletionCache(semantic=True)
+
+    async def embed(agent_config, text):
+        # Every question embeds to the same direction: any indexed question in scope matches
+        return [1.0, 0.0]
+
+    cache._embed = embed
+    return cache
+
+
+def prompt(question, system=BASE, history=()):
+    return [*system, *history, {"role": "user", "content": question}]
+
+
+def lookup(cache, messages, agent_id="a1", agent=AGENT, base_prompt=BASE):
+    return asyncio.run(cache.lookup(agent_id, agent, messages, base_prompt))
+
+
+def test_exact_key_ignores_whitespace_and_case():
+    cache = CompletionCache()
+
+    assert lookup(cache, prompt("What is  Solana?")).key == lookup(cache, prompt("what is solana?")).key
+
+
+@pytest.mark.parametrize("change", ["agent", "model", "system", "history"])
+def test_exact_key_covers_agent_model_and_the_whole_prompt(change):
+    cache = CompletionCache()
+    messages = prompt("What is Solana?")
+    changed = {
+        "agent": lambda: lookup(cache, messages, agent_id="a2"),
+        "model": lambda: lookup(cache, messages, agent=SimpleNamespace(model="model-b", api_key="key")),
+        "system": lambda: lookup(cache, prompt("What is Solana?", system=[{"role": "system", "content": "Be terse."}])),
+        "history": lambda: lookup(cache, prompt("What is Solana?", history=[{"role": "user", "content": "hi"}])),
+    }[change]
+
+    assert changed().key != lookup(cache, messages).key
+
+
+def test_stored_answer_is_an_exact_hit():
+    cache = CompletionCache()
+    miss = lookup(cache, prompt("What is Solana?"))
+    asyncio.run(cache.store(miss, "A blockchain."))
+
+    hit = lookup(cache, prompt("what is solana?"))
+
+    assert (miss.content, hit.content, hit.tier) == (None, "A blockchain.", "exact")
+
+
+def test_semantic_scope_ignores_history_and_retrieved_context():
+    cache = semantic_cache()
+    memory = [{"role": "system", "content": BASE[0]["content"] + "\n\nRelevant context from memory:\nfacts"}]
+
+    plain = lookup(cache, prompt("What is Solana?"))
+    with_context = lookup(cache, prompt("What is Solana?", system=memory, history=[{"role": "user", "content": "hi"}]))
+
+    assert plain.key != with_context.key
+    assert plain.scope == with_context.scope
+
+
+@pytest.mark.parametrize("agent_id, agent, base_prompt, expected", [
+    ("a1", AGENT, BASE, "semantic"),
+    ("a2", AGENT, BASE, None),
+    ("a1", SimpleNamespace(model="model-b", api_key="key"), BASE, None),
+    ("a1", AGENT, [{"role": "system", "content": "Be terse."}], None),
+])
+def test_semantic_hits_stay_within_agent_model_and_base_prompt(agent_id, agent, base_prompt, expected):
+    cache = semantic_cache()
+    asyncio.run(cache.store(lookup(cache, prompt("What is Solana?")), "A blockchain."))
+
+    result = lookup(cache, prompt("Tell me about Solana", system=base_prompt), agent_id, agent, base_prompt)
+
+    assert result.tier == expected
+
+
+def test_replay_chunks_rebuild_the_answer():
+    answer = "word " * 40
+
+    chunks = replay_chunks(answer, size=16)
+
+    assert "".join(chunks) == answer
+    assert all(len(chunk) >= 16 for chunk in chunks[:-1])
@@ -0,0 +1,102 @@
+from app.services.context_builder import MESSAGE_OVERHEAD_TOKENS, SUMMARY_HEADING, ContextBuilder
+
+
+def history(count, tokens=10, first_seq=0):
+    """Alternating user/assistant turns with cached token counts"""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}", "seq": i, "tokens": tokens}
+        for i in range(first_seq, first_seq + count)
+    ]
+
+
+def turn(messages, question="new question"):
+    return [{"role": "system", "content": "be brief", "tokens": 2}] + messages + [
+        {"role": "user", "content": question, "tokens": 3}
+    ]
+
+
+def sent_seqs(context, messages):
+    contents = {m["content"]: m.get("seq") for m in messages}
+    return [contents.get(m["content"]) for m in context.messages if m["role"] != "system"]
+
+
+def test_budget_for_prefers_exact_then_longest_prefix():
+    builder = ContextBuilder(1000, {"gpt-4o": 5000, "gpt-4*": 2000, "gpt-*": 1500})
+
+    assert builder.budget_for("gpt-4o") == 5000
+    assert builder.budget_for("gpt-4-turbo") == 2000
+    assert builder.budget_for("gpt-3.5") == 1500
+    assert builder.budget_for("claude") == 1000
+
+
+def test_everything_is_sent_when_it_fits():
+    messages = turn(history(6))
+
+    context = ContextBuilder(1000).build(messages, "m")
+
+    assert sent_seqs(context, messages) == [0, 1, 2, 3, 4, 5, None]
+    assert context.dropped == [] and context.unsummarized == []
+    assert context.history_sent == 6
+
+
+def test_oldest_turns_are_dropped_to_fit_the_budget():
+    per_message = 10 + MESSAGE_OVERHEAD_TOKENS
+    fixed = (2 + MESSAGE_OVERHEAD_TOKENS) + (3 + MESSAGE_OVERHEAD_TOKENS)
+    messages = turn(history(6))
+
+    context = ContextBuilder(fixed + 3 * per_message).build(messages, "m")
+
+    assert sent_seqs(context, messages) == [3, 4, 5, None]
+    assert [m["seq"] for m in context.dropped] == [0, 1, 2]
+    assert context.input_tokens == fixed + 3 * per_message <= context.budget
+
+
+def test_new_message_is_sent_even_over_budget():
+    messages = turn(history(2), question="x" * 400)
+
+    context = ContextBuilder(10).build(messages, "m")
+
+    assert context.messages[-1]["content"] == "x" * 400
+    assert len(context.dropped) == 2
+
+
+def test_summary_covers_dropped_turns():
+    messages = turn(history(6))
+
+    context = ContextBuilder(60).build(messages, "m", summary="earlier talk", summary_seq=1)
+
+    assert context.messages[0]["content"] == "be brief" + SUMMARY_HEADING + "earlier talk"
+    assert [m["seq"] for m in context.dropped] == [0, 1, 2, 3]
+    # Turns up to summary_seq are already in the summary
+    assert [m["seq"] for m in context.unsummarized] == [2, 3]
+    assert context.input_tokens <= 60
+
+
+def test_summary_is_left_out_when_nothing_is_dropped():
+    messages = turn(history(4))
+
+    context = ContextBuilder(1000).build(messages, "m", summary="earlier talk", summary_seq=3)
+
+    assert context.messages[0]["content"] == "be brief"
+    assert context.unloaded is None
+
+
+def test_turns_before_the_loaded_history_are_reported_unloaded():
+    # Only seqs 50..53 were loaded; nothing after seq 9 is summarized
+    messages = turn(history(4, first_seq=50))
+
+    context = ContextBuilder(1000).build(messages, "m", summary="earlier talk", summary_seq=9)
+    unsummarized_chat = ContextBuilder(1000).build(messages, "m")
+
+    assert context.unloaded == (9, 50)
+    assert unsummarized_chat.unloaded == (-1, 50)
+    # The summary is still sent: the window doesn't start at the first message
+    assert SUMMARY_HEADING in context.messages[0]["content"]
+
+
+def test_loaded_history_contiguous_with_the_summary_has_no_gap():
+    messages = turn(history(4, first_seq=10))
+
+    context = ContextBuilder(1000).build(messages, "m", summary="earlier talk", summary_seq=9)
+
+    assert context.unloaded is None
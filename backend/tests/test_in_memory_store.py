@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import local_cache
+from app.services.local_cache import InMemoryStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(local_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_keys_expire_after_their_ttl(clock):
+    store = InMemoryStore()
+    store.set("a", 1, ttl_seconds=10)
+    store.set("b", 2)
+
+    clock.now += 9
+    assert store.get("a") == 1
+    clock.now += 2
+
+    assert store.get("a") is None
+    assert store.get("b") == 2
+    assert store.stats()["expirations"] == 1
+
+
+def test_expired_keys_are_swept_on_write(clock):
+    store = InMemoryStore()
+    for i in range(3):
+        store.set(f"k{i}", i, ttl_seconds=5)
+
+    clock.now += 6
+    store.set("fresh", 1)
+
+    assert store.stats()["entries"] == 1
+
+
+def test_set_without_ttl_clears_the_old_expiry(clock):
+    store = InMemoryStore()
+    store.set("a", 1, ttl_seconds=5)
+    store.set("a", 2)
+
+    clock.now += 6
+
+    assert store.get("a") == 2
+
+
+def test_lru_evicts_the_least_recently_used_key():
+    store = InMemoryStore(max_entries=2, eviction="lru")
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")
+
+    store.set("c", 3)
+
+    assert (store.get("a"), store.get("b"), store.get("c")) == (1, None, 3)
+    assert store.stats()["evictions"] == 1
+
+
+def test_lfu_evicts_the_least_frequently_used_key():
+    store = InMemoryStore(max_entries=2, eviction="lfu")
+    store.set("a", 1)
+    store.set("b", 2)
+    for _ in range(3):
+        store.get("b")
+    store.get("a")
+
+    store.set("c", 3)
+
+    assert (store.get("a"), store.get("b"), store.get("c")) == (None, 2, 3)
+
+
+def test_byte_budget_evicts_but_keeps_the_key_being_written():
+    store = InMemoryStore(max_bytes=100)
+    store.set("small", "x")
+
+    store.set("large", "y" * 500)
+
+    assert store.get("small") is None
+    assert store.get("large") == "y" * 500
+
+
+def test_lists_and_hashes_count_against_the_entry_budget():
+    store = InMemoryStore(max_entries=2)
+    store.rpush("messages:c1", {"id": "m1"})
+    store.hset("chat:c1", values={"name": "chat"})
+
+    store.set("other", 1)
+
+    assert store.llen("messages:c1") == 0
+    assert store.hgetall("chat:c1") == {"name": "chat"}
+
+
+def test_clear_pattern_removes_only_matching_keys():
+    store = InMemoryStore()
+    for key in ("chat:1", "chat:2", "chats:agent:a", "user:agents:w"):
+        store.set(key, 1)
+
+    assert store.clear_pattern("chat:*") == 2
+    assert sorted(store.keys_matching("*")) == ["chats:agent:a", "user:agents:w"]
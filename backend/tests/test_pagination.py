@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.cache_service import CacheService, chat_activity_score
+from app.services.repositories import ChatRepository
+
+
+@pytest.fixture
+def cache():
+    service = CacheService()
+    # Always exercise the in-memory store, whatever REDIS_URL says
+    service.redis_available = False
+    service.redis = service._aredis = None
+    return service
+
+
+def seqs(messages):
+    return [message["seq"] for message in messages]
+
+
+def test_message_page_cursors(cache):
+    async def run():
+        for i in range(10):
+            await cache.add_message("c1", {"id": f"m{i}", "content": str(i)})
+        return (
+            await cache.get_message_page("c1", 4),
+            await cache.get_message_page("c1", 4, before=6),
+            await cache.get_message_page("c1", 4, before=2),
+            await cache.get_message_page("c1", 3, after=5),
+            await cache.get_message_page("c1", 4, after=8),
+        )
+
+    latest, older, oldest, newer, last = asyncio.run(run())
+
+    assert (seqs(latest[0]), latest[1], latest[2]) == ([6, 7, 8, 9], 6, 10)
+    assert (seqs(older[0]), older[1]) == ([2, 3, 4, 5], 2)
+    assert (seqs(oldest[0]), oldest[1]) == ([0, 1], 0)
+    assert (seqs(newer[0]), newer[1]) == ([6, 7, 8], 6)
+    assert seqs(last[0]) == [9]
+    assert [m["id"] for m in latest[0]] == ["m6", "m7", "m8", "m9"]
+
+
+def test_chat_page_walks_every_chat_once_by_activity(cache):
+    base = datetime(2026, 1, 1)
+    activity = {
+        "a": base,
+        "b": base + timedelta(minutes=5),
+        "c": base + timedelta(minutes=5),  # Same score as b, ordered by ID
+        "d": base + timedelta(minutes=9),
+        "e": base + timedelta(minutes=1),
+    }
+
+    async def run():
+        for chat_id, when in activity.items():
+            await cache.add_chat_to_list("agent", "w1", chat_id, when)
+        pages, cursor = [], None
+        while True:
+            page, cursor = await cache.get_chat_page("agent", "w1", cursor, 2)
+            pages.append(page)
+            if cursor is None:
+                return pages, await cache.get_chat_page("agent", "w1")
+
+    pages, everything = asyncio.run(run())
+
+    assert pages == [["d", "c"], ["b", "e"], ["a"]]
+    assert everything == (["d", "c", "b", "e", "a"], None)
+
+
+def test_chat_page_rejects_a_malformed_cursor(cache):
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_chat_page("agent", "w1", "not-a-cursor", 2))
+
+
+def test_fallback_tier_pages_follow_the_index_rules():
+    base = datetime(2026, 1, 1)
+    chats = [
+        {"id": "a", "timestamp": base.isoformat(), "last_activity": (base + timedelta(hours=2)).isoformat()},
+        {"id": "b", "timestamp": (base + timedelta(hours=1)).isoformat()},
+        {"id": "c", "timestamp": base + timedelta(minutes=30)},
+    ]
+
+    first, cursor = ChatRepository._paginate(chats, None, 2)
+    rest, end = ChatRepository._paginate(chats, cursor, 2)
+
+    # Ranked by last activity, falling back to creation time
+    assert [chat["id"] for chat in first] == ["a", "b"]
+    assert cursor == f"{int(chat_activity_score(base + timedelta(hours=1)))}:b"
+    assert ([chat["id"] for chat in rest], end) == (["c"], None)
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import DistributedLock, SingleFlight, wait_for_value
+
+
+class FakeRedis:
+    """SET NX and the token-checked release script, without expiry"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, px=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, keys, args):
+        if self.values.get(keys[0]) == args[0]:
+            del self.values[keys[0]]
+            return 1
+        return 0
+
+
+def test_concurrent_callers_share_one_load():
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        results = await asyncio.gather(*[flight.do("k", load) for _ in range(3)])
+        return results, flight.in_flight()
+
+    results, in_flight = asyncio.run(run())
+
+    assert results == ["value"] * 3
+    assert (len(calls), flight.loads, flight.coalesced, in_flight) == (1, 1, 2, 0)
+
+
+def test_failed_load_reaches_every_caller_and_is_not_cached():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def load():
+        return "value"
+
+    async def run():
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        return results, await flight.do("k", load)
+
+    results, retried = asyncio.run(run())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == "value"
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("k", load))
+        second = asyncio.ensure_future(flight.do("k", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == ("value", True)
+
+
+def test_lock_is_exclusive_until_released():
+    redis = FakeRedis()
+    first, second = DistributedLock(redis, "lock:k"), DistributedLock(redis, "lock:k")
+
+    async def run():
+        taken = (await first.acquire(), await second.acquire())
+        await first.release()
+        return taken, await second.acquire()
+
+    assert asyncio.run(run()) == ((True, False), True)
+
+
+def test_release_leaves_a_lock_taken_over_by_another_worker():
+    redis = FakeRedis()
+    expired, current = DistributedLock(redis, "lock:k"), DistributedLock(redis, "lock:k")
+
+    async def run():
+        await expired.acquire()
+        del redis.values["lock:k"]  # TTL ran out
+        await current.acquire()
+        await expired.release()
+
+    asyncio.run(run())
+
+    assert redis.values == {"lock:k": current.token}
+
+
+@pytest.mark.parametrize("appears_after, expected", [(2, "value"), (None, None)])
+def test_wait_for_value_polls_until_the_value_appears(appears_after, expected):
+    reads = []
+
+    async def read():
+        reads.append(1)
+        return "value" if appears_after is not None and len(reads) > appears_after else None
+
+    result = asyncio.run(wait_for_value(read, timeout=0.1, initial_delay=0.001))
+
+    assert result == expected
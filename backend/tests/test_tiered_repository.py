@@ -0,0 +1,124 @@
+import asyncio
+
+from app.services.tiered_repository import TIERS, TierPolicy, TieredRepository
+
+
+CHAT_LIKE = TierPolicy(read=("redis", "database", "local"), write=("redis",), fallback=("database", "local"))
+
+
+class FakeRepository(TieredRepository):
+    """Dict-backed tiers that can be taken down or made to fail"""
+
+    entity = "test"
+
+    def __init__(self, policy: TierPolicy, down=(), failing=()):
+        super().__init__(policy)
+        self.down = set(down)
+        self.failing = set(failing)
+        self.stores = {tier: {} for tier in TIERS}
+        self.calls = []
+
+    def available(self, tier: str) -> bool:
+        return tier not in self.down
+
+    def _tier_call(self, tier, action):
+        async def call():
+            self.calls.append(tier)
+            if tier in self.failing:
+                raise ConnectionError(f"{tier} is failing")
+            return action()
+        return call
+
+    def get(self, key):
+        readers = {tier: self._tier_call(tier, lambda tier=tier: self.stores[tier].get(key)) for tier in TIERS}
+        fill = {tier: self._filler(tier, key) for tier in TIERS}
+        return asyncio.run(self._read("get", readers, fill))
+
+    def put(self, key, value):
+        writers = {
+            tier: self._tier_call(tier, lambda tier=tier: self.stores[tier].__setitem__(key, value))
+            for tier in TIERS
+        }
+        return asyncio.run(self._write("put", writers))
+
+    def _filler(self, tier, key):
+        async def fill(value):
+            self.stores[tier][key] = value
+        return fill
+
+
+def test_read_returns_first_hit_in_policy_order():
+    repo = FakeRepository(CHAT_LIKE)
+    repo.stores["redis"]["a"] = "from redis"
+    repo.stores["database"]["a"] = "from database"
+
+    result = repo.get("a")
+
+    assert (result.value, result.tier, result.failed) == ("from redis", "redis", False)
+    assert repo.calls == ["redis"]
+
+
+def test_clean_miss_in_system_of_record_still_reads_fallback_tiers():
+    # Written to the database fallback while Redis was down
+    repo = FakeRepository(CHAT_LIKE)
+    repo.stores["database"]["a"] = "fallback copy"
+
+    result = repo.get("a")
+
+    assert (result.value, result.tier, result.failed) == ("fallback copy", "database", False)
+    assert repo.calls == ["redis", "database"]
+
+
+def test_clean_miss_in_system_of_record_skips_write_through_copies():
+    policy = TierPolicy(read=("redis", "database", "local"), write=("redis", "database"))
+    repo = FakeRepository(policy)
+    repo.stores["database"]["a"] = "stale copy"
+
+    result = repo.get("a")
+
+    assert result.value is None and not result.failed
+    assert repo.calls == ["redis", "local"]
+
+
+def test_failing_tier_makes_a_miss_inconclusive():
+    repo = FakeRepository(CHAT_LIKE, failing={"redis"})
+
+    result = repo.get("a")
+
+    assert result.value is None
+    assert result.failed
+    assert repo.calls == ["redis", "database", "local"]
+
+
+def test_backfill_copies_a_later_hit_into_missed_write_tiers():
+    policy = TierPolicy(read=("local", "database"), write=("database", "local"), backfill=True)
+    repo = FakeRepository(policy)
+    repo.stores["database"]["a"] = "value"
+
+    result = repo.get("a")
+
+    assert result.tier == "database"
+    assert repo.stores["local"]["a"] == "value"
+
+
+def test_write_goes_to_every_write_tier_and_not_the_fallback():
+    policy = TierPolicy(read=("redis", "local"), write=("redis", "local"), fallback=("database",))
+    repo = FakeRepository(policy)
+
+    assert repo.put("a", 1) == ["redis", "local"]
+    assert "a" not in repo.stores["database"]
+
+
+def test_failed_system_of_record_write_goes_to_the_first_fallback():
+    repo = FakeRepository(CHAT_LIKE, failing={"redis"})
+
+    assert repo.put("a", 1) == ["database"]
+    assert repo.stores["database"] == {"a": 1}
+    assert repo.stores["local"] == {}
+
+
+def test_unavailable_system_of_record_skips_to_an_available_fallback():
+    repo = FakeRepository(CHAT_LIKE, down={"redis", "database"})
+
+    assert repo.put("a", 1) == ["local"]
+    assert repo.get("a").tier == "local"
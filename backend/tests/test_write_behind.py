@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.db.sqlite_store import SQLiteStore
+from app.services import write_behind as write_behind_module
+from app.services.write_behind import WriteBehindJournal
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / "solmind.db"))
+    store.table("capsules").insert({"id": "c1", "name": "research", "creator_wallet": "w1"}).execute()
+    monkeypatch.setattr(write_behind_module, "get_supabase", lambda: store)
+    return store
+
+
+def journal(tmp_path, **kwargs):
+    # Long flush interval: the tests flush explicitly
+    return WriteBehindJournal(str(tmp_path / "journal"), flush_interval=3600, **kwargs)
+
+
+def capsule(store):
+    return store.table("capsules").select("query_count, stake_amount").eq("id", "c1").single().execute().data
+
+
+def crash(wb):
+    """Stop a journal without flushing or acknowledging anything"""
+    wb._task.cancel()
+    wb._file.close()
+
+
+def test_consecutive_increments_are_coalesced_into_one_update(tmp_path, store):
+    async def run():
+        wb = journal(tmp_path)
+        for _ in range(3):
+            await wb.increment("capsules", {"id": "c1"}, "query_count")
+        await wb.increment("capsules", {"id": "c1"}, "stake_amount", 2.5)
+        applied = await wb.flush()
+        await wb.close()
+        return applied
+
+    # Three query_count increments in one update, then the stake
+    assert asyncio.run(run()) == 2
+    assert capsule(store) == {"query_count": 3, "stake_amount": 2.5}
+
+
+def test_applied_operations_are_acknowledged(tmp_path, store):
+    async def run():
+        wb = journal(tmp_path)
+        await wb.update("capsules", {"name": "renamed"}, {"id": "c1"})
+        await wb.flush()
+        await wb.close()
+        replayed = journal(tmp_path)
+        await replayed.start()
+        pending = replayed.stats()["pending"]
+        await replayed.close()
+        return wb.path, pending
+
+    path, pending = asyncio.run(run())
+
+    assert pending == 0
+    assert os.path.getsize(path) == 0
+
+
+def test_unacknowledged_operations_are_replayed(tmp_path, store):
+    async def run():
+        wb = journal(tmp_path)
+        await wb.increment("capsules", {"id": "c1"}, "query_count", 2)
+        await wb.update("capsules", {"name": "renamed"}, {"id": "c1"})
+        crash(wb)
+        replayed = journal(tmp_path)
+        await replayed.start()
+        pending = replayed.stats()["pending"]
+        await replayed.flush()
+        await replayed.close()
+        return pending
+
+    assert asyncio.run(run()) == 2
+    assert capsule(store)["query_count"] == 2
+    assert store.table("capsules").select("name").eq("id", "c1").single().execute().data["name"] == "renamed"
+
+
+def test_replayed_increments_are_applied_once(tmp_path, store):
+    async def run():
+        wb = journal(tmp_path)
+        for _ in range(3):
+            await wb.increment("capsules", {"id": "c1"}, "query_count")
+        records = [json.loads(line) for line in open(wb.path)]
+        await wb.flush()
+        # A crash between the update and its ack replays the same operations,
+        # this time without the first one to merge them into
+        for record in records[1:]:
+            wb._queue(record)
+        await wb.flush()
+        await wb.close()
+
+    asyncio.run(run())
+
+    assert capsule(store)["query_count"] == 3
+
+
+def test_update_matching_no_row_is_retried_then_dead_lettered(tmp_path, store):
+    async def run():
+        wb = journal(tmp_path, max_attempts=2)
+        await wb.update("capsules", {"name": "renamed"}, {"id": "missing"})
+        await wb.flush()
+        retrying = wb.stats()
+        await wb.flush(wait_for_retries=True)
+        await wb.close()
+        return wb.path, retrying, wb.stats()
+
+    path, retrying, done = asyncio.run(run())
+
+    assert (retrying["pending"], retrying["failed_attempts"], retrying["dead_lettered"]) == (1, 1, 0)
+    assert (done["pending"], done["dead_lettered"]) == (0, 1)
+    with open(f"{path}.failed") as failed:
+        assert json.loads(failed.readline())["match"] == {"id": "missing"}
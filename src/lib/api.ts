@@ -84,7 +84,8 @@ export class ApiClient {
 
   // Chats
   async getChats(agentId: string) {
-    return this.request(`/api/v1/agents/${encodeURIComponent(agentId)}/chats`);
+    // Metadata only - messages are loaded when a chat is opened
+    return this.request(`/api/v1/agents/${encodeURIComponent(agentId)}/chats/summaries`);
   }
 
   async createChat(agentId: string, chat: { name: string; memory_size?: string; web_search_enabled?: boolean }) {